@@ -0,0 +1,134 @@
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Benchmark the exists notification task against a fake Nova
+
+Creates active reservations in a temporary SQLite database and runs
+notify_exists with a fake Nova that sleeps for a fixed latency on
+every server listing, once serially and once with the configured
+lookup concurrency. Notifications are discarded.
+
+Run from the top of the repository:
+
+    python tools/bench_notify_exists.py [reservations] [latency_ms]
+"""
+
+import datetime
+import os
+import sys
+import tempfile
+import threading
+import time
+from unittest import mock
+
+from oslo_config import cfg
+
+from warre.common import config
+from warre.common import rpc
+from warre.extensions import db
+from warre import models
+from warre.worker import manager as worker_manager
+
+
+CONF = cfg.CONF
+
+
+class FakeServers:
+    def __init__(self, latency, in_use):
+        self.latency = latency
+        self.in_use = in_use
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def list(self, search_opts):
+        with self._lock:
+            self.calls += 1
+        time.sleep(self.latency)
+        key = (search_opts["tenant_id"], search_opts["flavor"])
+        return [object()] if key in self.in_use else []
+
+
+class FakeNova:
+    """Stand in for a novaclient Client with a fixed request latency"""
+
+    def __init__(self, latency, in_use):
+        self.servers = FakeServers(latency, in_use)
+
+
+def populate(count):
+    flavor = models.Flavor(
+        name="bench", vcpu=1, memory_mb=1024, disk_gb=10, slots=count
+    )
+    db.session.add(flavor)
+    db.session.commit()
+    start = datetime.datetime.utcnow() - datetime.timedelta(days=1)
+    end = start + datetime.timedelta(days=30)
+    in_use = set()
+    for i in range(count):
+        reservation = models.Reservation(
+            flavor_id=flavor.id,
+            start=start,
+            end=end,
+            status=models.Reservation.ACTIVE,
+        )
+        reservation.project_id = f"project-{i % 500}"
+        reservation.user_id = "bench"
+        # Blazar creates a compute flavor per lease
+        reservation.compute_flavor = f"compute-{i}"
+        if i % 2:
+            in_use.add((reservation.project_id, reservation.compute_flavor))
+        db.session.add(reservation)
+    db.session.commit()
+    return in_use
+
+
+def run(manager, concurrency, latency, in_use):
+    CONF.set_override("nova_lookup_concurrency", concurrency, group="worker")
+    nova = FakeNova(latency, in_use)
+    manager.notifier = mock.Mock()
+    with mock.patch("warre.common.clients.get_novaclient", return_value=nova):
+        start = time.perf_counter()
+        manager.notify_exists()
+        elapsed = time.perf_counter() - start
+    return elapsed, nova.servers.calls, manager.notifier.info.call_count
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    latency = (float(sys.argv[2]) if len(sys.argv) > 2 else 5) / 1000
+    fd, path = tempfile.mkstemp(suffix=".db")
+    os.close(fd)
+    try:
+        config.init(conf_file="warre/tests/etc/warre.conf")
+        CONF.set_override("connection", f"sqlite:///{path}", group="database")
+        rpc.init()
+        manager = worker_manager.Manager()
+        with manager.app.app_context():
+            db.create_all()
+            in_use = populate(count)
+
+        print(f"reservations: {count}, nova latency: {latency * 1000:g} ms")
+        for concurrency in (1, CONF.worker.nova_lookup_concurrency, 32):
+            elapsed, calls, notifications = run(
+                manager, concurrency, latency, in_use
+            )
+            print(
+                f"concurrency {concurrency:>3}: {elapsed:8.2f} s, "
+                f"{calls} nova calls, {notifications} notifications"
+            )
+    finally:
+        os.unlink(path)
+
+
+if __name__ == "__main__":
+    main()
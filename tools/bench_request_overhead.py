@@ -0,0 +1,85 @@
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Measure the per request cost of setting up the API manager
+
+Compares GET /v1/flavors/ when every request builds its own manager,
+RPC client, Keystone session and Blazar client (as resources used to)
+with the process wide manager. No service is contacted, only the
+client construction is measured.
+
+Run from the top of the repository:
+
+    python tools/bench_request_overhead.py [requests]
+"""
+
+import sys
+import time
+from unittest import mock
+
+from oslo_context import context
+
+from warre import app
+from warre.common import keystone
+from warre.extensions import db
+from warre import manager
+
+
+def eager_manager():
+    keystone.reset()
+    mgr = manager.Manager()
+    mgr.worker_api
+    mgr.blazar
+    return mgr
+
+
+def run(client, count):
+    environ = {
+        keystone.REQUEST_CONTEXT_ENV: context.RequestContext(
+            roles=["member"], project_id="bench", user_id="bench"
+        )
+    }
+    start = time.perf_counter()
+    for i in range(count):
+        response = client.get("/v1/flavors/", environ_base=environ)
+        assert response.status_code == 200, response.status_code
+    return (time.perf_counter() - start) / count
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    application = app.create_app(
+        {
+            "TESTING": True,
+            "SQLALCHEMY_DATABASE_URI": "sqlite://",
+            "SQLALCHEMY_TRACK_MODIFICATIONS": False,
+        },
+        conf_file="warre/tests/etc/warre.conf",
+    )
+    with application.app_context():
+        db.create_all()
+        client = application.test_client()
+        run(client, 10)
+
+        with mock.patch.object(manager, "get_manager", eager_manager):
+            before = run(client, count)
+        after = run(client, count)
+
+    print(f"requests:           {count}")
+    print(f"per request setup:  {before * 1000:.3f} ms/request")
+    print(f"process wide:       {after * 1000:.3f} ms/request")
+    print(f"saved:              {(before - after) * 1000:.3f} ms/request")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Compare the listing serializers of reservations and maintenance windows
+
+Loads a page of reservations and of maintenance windows from an
+in-memory SQLite database and dumps them, once as ORM instances with
+schema.dump() and once as column tuples with the row schema, checking
+both give the same JSON. Query and dump times are reported separately,
+the row schema reads the flavors of maintenance windows while dumping.
+
+Run from the top of the repository:
+
+    python tools/bench_serialization.py [items] [rounds]
+"""
+
+import datetime
+import json
+import sys
+import time
+
+from sqlalchemy import orm
+
+from warre.api.v1.schemas import maintenancewindow as window_schemas
+from warre.api.v1.schemas import reservation as reservation_schemas
+from warre import app
+from warre.extensions import db
+from warre import models
+
+
+def populate(count):
+    flavors = [
+        models.Flavor(
+            name=f"bench.{i}",
+            vcpu=4,
+            memory_mb=4096,
+            disk_gb=30,
+            slots=count,
+            extra_specs={"resources:VGPU": "1"},
+        )
+        for i in range(10)
+    ]
+    db.session.add_all(flavors)
+    start = datetime.datetime(2021, 1, 1)
+    for i in range(count):
+        reservation = models.Reservation(
+            flavor_id=flavors[i % len(flavors)].id,
+            start=start + datetime.timedelta(hours=i),
+            end=start + datetime.timedelta(hours=i + 24),
+        )
+        reservation.project_id = f"project-{i % 50}"
+        reservation.user_id = "bench"
+        reservation.status = models.Reservation.ALLOCATED
+        db.session.add(reservation)
+        window = models.MaintenanceWindow(
+            start=start + datetime.timedelta(days=i),
+            end=start + datetime.timedelta(days=i, hours=4),
+        )
+        window.flavors = flavors[: 1 + i % 3]
+        db.session.add(window)
+    db.session.commit()
+
+
+def timed(rounds, load, dump):
+    loading = dumping = 0.0
+    for i in range(rounds):
+        # Each listing runs in a fresh session, like a request
+        db.session.remove()
+        start = time.perf_counter()
+        items = load()
+        middle = time.perf_counter()
+        data = dump(items)
+        loading += middle - start
+        dumping += time.perf_counter() - middle
+    return loading / rounds, dumping / rounds, data
+
+
+def compare(name, rounds, query, eager, schema, row_schema):
+    orm_load, orm_dump, expected = timed(
+        rounds, lambda: query().options(eager).all(), schema.dump
+    )
+    row_load, row_dump, results = timed(
+        rounds,
+        lambda: row_schema.select(query()).all(),
+        row_schema.dump,
+    )
+    assert json.dumps(expected) == json.dumps(results), name
+    print(f"{name}:")
+    for label, load, dump in (
+        ("schema.dump", orm_load, orm_dump),
+        ("row schema", row_load, row_dump),
+    ):
+        print(
+            f"  {label:<12} query {load * 1000:8.2f} ms, "
+            f"dump {dump * 1000:8.2f} ms, "
+            f"total {(load + dump) * 1000:8.2f} ms"
+        )
+    print(
+        f"  speedup      {(orm_load + orm_dump) / (row_load + row_dump):.1f}x"
+    )
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    rounds = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    application = app.create_app(
+        {
+            "TESTING": True,
+            "SQLALCHEMY_DATABASE_URI": "sqlite://",
+            "SQLALCHEMY_TRACK_MODIFICATIONS": False,
+        },
+        conf_file="warre/tests/etc/warre.conf",
+    )
+    with application.app_context():
+        db.create_all()
+        populate(count)
+        print(f"items: {count}, rounds: {rounds}")
+        compare(
+            "reservations",
+            rounds,
+            lambda: db.session.query(models.Reservation).order_by(
+                models.Reservation.created_at, models.Reservation.id
+            ),
+            orm.joinedload(models.Reservation.flavor),
+            reservation_schemas.reservations,
+            reservation_schemas.reservationrows,
+        )
+        compare(
+            "maintenance windows",
+            rounds,
+            lambda: db.session.query(models.MaintenanceWindow).order_by(
+                models.MaintenanceWindow.start, models.MaintenanceWindow.id
+            ),
+            orm.selectinload(models.MaintenanceWindow.flavors),
+            window_schemas.maintenancewindows,
+            window_schemas.maintenancewindowrows,
+        )
+
+
+if __name__ == "__main__":
+    main()
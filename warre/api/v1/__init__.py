@@ -11,6 +11,7 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+from warre.api.v1.resources import archivedreservation
 from warre.api.v1.resources import flavor
 from warre.api.v1.resources import flavorproject
 from warre.api.v1.resources import limits
@@ -22,6 +23,9 @@ def initialize_resources(api):
     api.add_resource(flavor.FlavorList, "/v1/flavors/")
     api.add_resource(flavor.Flavor, "/v1/flavors/<id>/")
     api.add_resource(flavor.FlavorFreeSlot, "/v1/flavors/<id>/freeslots/")
+    api.add_resource(flavor.FlavorNextSlot, "/v1/flavors/<id>/nextslot/")
+    api.add_resource(flavor.FlavorUtilization, "/v1/flavors/<id>/utilization/")
+    api.add_resource(flavor.FreeSlotList, "/v1/freeslots/")
 
     api.add_resource(flavorproject.FlavorProjectList, "/v1/flavorprojects/")
     api.add_resource(flavorproject.FlavorProject, "/v1/flavorprojects/<id>/")
@@ -37,4 +41,13 @@ def initialize_resources(api):
     api.add_resource(reservation.ReservationList, "/v1/reservations/")
     api.add_resource(reservation.Reservation, "/v1/reservations/<id>/")
 
+    api.add_resource(
+        archivedreservation.ArchivedReservationList,
+        "/v1/archivedreservations/",
+    )
+    api.add_resource(
+        archivedreservation.ArchivedReservation,
+        "/v1/archivedreservations/<id>/",
+    )
+
     api.add_resource(limits.Limits, "/v1/limits/")
@@ -0,0 +1,88 @@
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import flask_restful
+from flask_restful import inputs
+from flask_restful import reqparse
+from oslo_policy import policy
+from oslo_utils import timeutils
+
+from warre.api.v1.resources import base
+from warre.api.v1.schemas import archivedreservation as schemas
+from warre.common import policies
+from warre.extensions import db
+from warre import models
+
+
+class ArchivedReservationList(base.Resource):
+    POLICY_PREFIX = policies.ARCHIVEDRESERVATION_PREFIX
+    schema = schemas.archivedreservations
+    SORT_KEYS = (models.ReservationArchive.end, models.ReservationArchive.id)
+
+    def get(self, **kwargs):
+        try:
+            self.authorize("list")
+        except policy.PolicyNotAuthorized:
+            flask_restful.abort(403, message="Not authorised")
+
+        parser = reqparse.RequestParser()
+        parser.add_argument("limit", type=int, location="args")
+        parser.add_argument("marker", type=str, location="args")
+        parser.add_argument("with_count", type=inputs.boolean, location="args")
+        parser.add_argument("project_id", type=str, location="args")
+        parser.add_argument("flavor_id", type=str, location="args")
+        parser.add_argument("status", type=str, location="args")
+        parser.add_argument(
+            "end_after", type=inputs.datetime_from_iso8601, location="args"
+        )
+        parser.add_argument(
+            "end_before", type=inputs.datetime_from_iso8601, location="args"
+        )
+        args = parser.parse_args()
+
+        query = db.session.query(models.ReservationArchive)
+        for key in ("project_id", "flavor_id", "status"):
+            if args.get(key):
+                query = query.filter_by(**{key: args.get(key)})
+        if args.get("end_after"):
+            query = query.filter(
+                models.ReservationArchive.end
+                >= timeutils.normalize_time(args.get("end_after"))
+            )
+        if args.get("end_before"):
+            query = query.filter(
+                models.ReservationArchive.end
+                < timeutils.normalize_time(args.get("end_before"))
+            )
+
+        # The archive only grows, always page with a marker
+        args["marker"] = args.get("marker") or ""
+        return self.paginate(query, args)
+
+
+class ArchivedReservation(base.Resource):
+    POLICY_PREFIX = policies.ARCHIVEDRESERVATION_PREFIX
+    schema = schemas.archivedreservation
+
+    def get(self, id):
+        try:
+            self.authorize("get")
+        except policy.PolicyNotAuthorized:
+            flask_restful.abort(403, message="Not authorised")
+
+        reservation = (
+            db.session.query(models.ReservationArchive)
+            .filter_by(id=id)
+            .first_or_404()
+        )
+        return self.schema.dump(reservation)
@@ -11,9 +11,17 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import base64
+import datetime
+import hashlib
+import json
+from urllib import parse
+
 import flask
 from flask import request
 import flask_restful
+import sqlalchemy as sa
+from werkzeug import http
 
 from warre.common import keystone
 from warre import manager
@@ -23,9 +31,53 @@ from warre import quota
 API_LIMIT = 1000
 
 
+def _encode_marker(values):
+    data = json.dumps(
+        [
+            v.isoformat() if isinstance(v, datetime.datetime) else v
+            for v in values
+        ]
+    )
+    return base64.urlsafe_b64encode(data.encode()).decode()
+
+
+def _decode_marker(marker, columns):
+    try:
+        values = json.loads(base64.urlsafe_b64decode(marker.encode()))
+        if len(values) != len(columns):
+            raise ValueError("Wrong number of values")
+        return [
+            datetime.datetime.fromisoformat(v)
+            if column.type.python_type is datetime.datetime
+            else v
+            for v, column in zip(values, columns)
+        ]
+    except (TypeError, ValueError, NotImplementedError):
+        raise ValueError(f"Invalid marker {marker}")
+
+
+def _after(columns, values):
+    """Filter for the rows sorting after values by columns
+
+    Expanded rather than a row value comparison so it can use the
+    leading columns of an index on every backend.
+    """
+    clauses = []
+    for i, column in enumerate(columns):
+        equal = [columns[j] == values[j] for j in range(i)]
+        clauses.append(sa.and_(*equal, column > values[i]))
+    return sa.or_(*clauses)
+
+
 class Resource(flask_restful.Resource):
+    # Unique sort key of the listing, used to page with a marker
+    SORT_KEYS = ()
+    # Row schema of the listing, to page column tuples instead of
+    # instances dumped with schema
+    row_schema = None
+
     def __init__(self):
-        self.manager = manager.Manager()
+        self.manager = manager.get_manager()
 
     def authorize(self, rule, target={}, do_raise=True):
         rule = self.POLICY_PREFIX % rule
@@ -35,8 +87,26 @@ class Resource(flask_restful.Resource):
         )
 
     def check_limit(self, resource, delta=1):
+        self.check_limits({resource: delta})
+
+    def check_limits(self, deltas):
         enforcer = quota.get_enforcer()
-        enforcer.enforce(self.context.project_id, {resource: delta})
+        enforcer.enforce(self.context.project_id, deltas)
+
+    def conditional(self, version, build):
+        """Respond with build() unless the client's copy is current
+
+        version - JSON serializable values that change whenever the
+            response would, usually flavor versions. Hashed with the
+            request URL into a strong ETag, when it matches If-None-Match
+            a 304 is returned without calling build.
+        """
+        data = json.dumps([request.full_path, version], default=str)
+        etag = hashlib.sha1(data.encode()).hexdigest()
+        headers = {"ETag": http.quote_etag(etag)}
+        if request.if_none_match.contains(etag):
+            return flask.Response(status=304, headers=headers)
+        return build(), 200, headers
 
     @property
     def context(self):
@@ -45,13 +115,51 @@ class Resource(flask_restful.Resource):
     def paginate(self, query, args):
         limit = args.get("limit") or API_LIMIT
         limit = max(1, min(limit, API_LIMIT))
+        if self.row_schema is not None:
+            query = self.row_schema.select(query)
+        if args.get("marker") is not None:
+            return self._paginate_marker(query, args, limit)
 
         items = query.paginate(per_page=limit)
         response = {
-            "results": self.schema.dump(items.items),
+            "results": self._dump(items.items),
             "total": items.total,
         }
 
         if items.has_next:
             response["next"] = f"{request.base_url}?page={items.next_num}"
         return response
+
+    def _dump(self, items):
+        if self.row_schema is None:
+            return self.schema.dump(items)
+        return self.row_schema.dump(items)
+
+    def _paginate_marker(self, query, args, limit):
+        """Page by the sort key of the last item of the previous page
+
+        Unlike page numbers this needs no OFFSET, so every page costs the
+        same, and the total is only counted when with_count is set. An
+        empty marker starts from the first page.
+        """
+        columns = self.SORT_KEYS
+        response = {}
+        if args.get("with_count"):
+            response["total"] = query.order_by(None).count()
+
+        if args.get("marker"):
+            try:
+                values = _decode_marker(args.get("marker"), columns)
+            except ValueError as err:
+                flask_restful.abort(400, message=str(err))
+            query = query.filter(_after(columns, values))
+
+        items = query.order_by(None).order_by(*columns).limit(limit + 1).all()
+        response["results"] = self._dump(items[:limit])
+
+        if len(items) > limit:
+            last = items[limit - 1]
+            marker = _encode_marker([getattr(last, c.key) for c in columns])
+            params = {**request.args, "marker": marker}
+            response["next"] = f"{request.base_url}?{parse.urlencode(params)}"
+        return response
@@ -13,7 +13,9 @@
 
 from datetime import datetime
 from datetime import timedelta
+import json
 
+import flask
 from flask import request
 import flask_restful
 from flask_restful import inputs
@@ -34,25 +36,58 @@ from warre import models
 LOG = logging.getLogger(__name__)
 
 
+def _this_minute():
+    # Default start of free slot queries, truncated to the minute so
+    # requests within a minute get the same free slots and ETag. The
+    # first free slot may therefore start up to a minute in the past.
+    return datetime.utcnow().replace(second=0, microsecond=0)
+
+
+def _ended(end):
+    # Flavors have no free slots once they end
+    return end is not None and end < datetime.utcnow()
+
+
 class FlavorList(base.Resource):
     POLICY_PREFIX = policies.FLAVOR_PREFIX
     schema = schemas.flavors
+    row_schema = schemas.flavorrows
+    SORT_KEYS = (
+        models.Flavor.name,
+        models.Flavor.memory_mb,
+        models.Flavor.id,
+    )
+
+    @staticmethod
+    def _listed(query):
+        """Read the listed attributes of the flavors a query returns
+
+        The listing ETag is made from them. Flavor versions would do but
+        change with every reservation of the flavors, which the listing
+        does not show.
+        """
+        rows = schemas.flavorrows.select(query.order_by(models.Flavor.id))
+        return [tuple(row) for row in rows]
 
     def _get_all_flavors(self):
         return db.session.query(models.Flavor)
 
     def _get_flavors(self):
+        # Filter on the projects with a subquery rather than a join, so
+        # each flavor is one row whatever its grants and pages are full
+        granted = db.select(models.FlavorProject.flavor_id).where(
+            models.FlavorProject.project_id == self.context.project_id
+        )
         return (
             db.session.query(models.Flavor)
-            .join(models.FlavorProject, isouter=True)
-            .filter(models.Flavor.active == True)
+            .filter(models.Flavor.active == True)  # noqa
             .filter(
-                db.or_(  # noqa
-                    models.FlavorProject.project_id == self.context.project_id,
-                    models.Flavor.is_public == True,
+                db.or_(
+                    models.Flavor.id.in_(granted),
+                    models.Flavor.is_public == True,  # noqa
                 )
             )
-        )  # noqa
+        )
 
     def get(self, **kwargs):
         try:
@@ -62,6 +97,8 @@ class FlavorList(base.Resource):
 
         parser = reqparse.RequestParser()
         parser.add_argument("limit", type=int, location="args")
+        parser.add_argument("marker", type=str, location="args")
+        parser.add_argument("with_count", type=inputs.boolean, location="args")
         parser.add_argument(
             "all_projects", type=inputs.boolean, location="args"
         )
@@ -90,7 +127,9 @@ class FlavorList(base.Resource):
             query = query.filter(models.Flavor.active == args.get("active"))
 
         query = query.order_by(models.Flavor.name, models.Flavor.memory_mb)
-        return self.paginate(query, args)
+        return self.conditional(
+            self._listed(query), lambda: self.paginate(query, args)
+        )
 
     def post(self, **kwargs):
         try:
@@ -145,7 +184,9 @@ class Flavor(base.Resource):
         except policy.PolicyNotAuthorized:
             flask_restful.abort(403, message="Not authorised")
 
-        return self.schema.dump(flavor)
+        return self.conditional(
+            flavor.version, lambda: self.schema.dump(flavor)
+        )
 
     def patch(self, id):
         try:
@@ -188,15 +229,18 @@ class FlavorFreeSlot(Flavor):
         parser.add_argument(
             "start",
             type=inputs.date,
-            default=datetime.utcnow(),
+            default=_this_minute(),
             location="args",
         )
         parser.add_argument(
             "end",
             type=inputs.date,
-            default=datetime.utcnow() + timedelta(days=365),
+            default=_this_minute() + timedelta(days=365),
             location="args",
         )
+        parser.add_argument(
+            "instance_count", type=inputs.positive, default=1, location="args"
+        )
         args = parser.parse_args()
 
         try:
@@ -210,7 +254,190 @@ class FlavorFreeSlot(Flavor):
         start = args.start
         end = args.end
 
-        free_slots = self.manager.flavor_free_slots(
-            self.context, flavor, start, end
+        def build():
+            free_slots = self.manager.flavor_free_slots(
+                self.context,
+                flavor,
+                start,
+                end,
+                instance_count=args.instance_count,
+            )
+            return self.schema.dump(free_slots)
+
+        version = [flavor.version, _ended(flavor.end)]
+        return self.conditional(
+            [version, start, end, args.instance_count], build
+        )
+
+
+class FlavorNextSlot(Flavor):
+    schema = schemas.freeslot
+
+    def get(self, id, **kwargs):
+        parser = reqparse.RequestParser()
+        parser.add_argument(
+            "duration_hours",
+            type=inputs.positive,
+            required=True,
+            location="args",
+        )
+        parser.add_argument(
+            "instance_count", type=inputs.positive, default=1, location="args"
+        )
+        parser.add_argument(
+            "not_before", type=inputs.datetime_from_iso8601, location="args"
+        )
+        args = parser.parse_args()
+
+        try:
+            self.authorize("get")
+        except policy.PolicyNotAuthorized:
+            flask_restful.abort(403, message="Not authorised")
+
+        flavor = self._get_flavor(id)
+
+        try:
+            slot = self.manager.flavor_next_slot(
+                self.context,
+                flavor,
+                timedelta(hours=args.duration_hours),
+                instance_count=args.instance_count,
+                not_before=utils.normalise_time(args.not_before),
+            )
+        except exceptions.InvalidReservation as err:
+            return {"error_message": str(err)}, 400
+        if slot is None:
+            flask_restful.abort(404, message="No available slot")
+        return self.schema.dump(slot)
+
+
+class FlavorUtilization(Flavor):
+    schema = schemas.utilization
+
+    RESOLUTIONS = {
+        "step": None,
+        "hour": timedelta(hours=1),
+        "day": timedelta(days=1),
+    }
+
+    def get(self, id, **kwargs):
+        parser = reqparse.RequestParser()
+        parser.add_argument(
+            "start",
+            type=inputs.date,
+            default=datetime.utcnow(),
+            location="args",
+        )
+        parser.add_argument(
+            "end",
+            type=inputs.date,
+            default=datetime.utcnow() + timedelta(days=365),
+            location="args",
+        )
+        parser.add_argument(
+            "resolution",
+            type=str,
+            choices=tuple(self.RESOLUTIONS),
+            default="step",
+            location="args",
+        )
+        args = parser.parse_args()
+
+        try:
+            self.authorize("utilization")
+        except policy.PolicyNotAuthorized:
+            flask_restful.abort(403, message="Not authorised")
+
+        if args.end <= args.start:
+            return {"error_message": "End must be after start"}, 400
+
+        flavor = self._get_flavor(id)
+        points = self.manager.flavor_utilization(
+            self.context,
+            flavor,
+            args.start,
+            args.end,
+            resolution=self.RESOLUTIONS[args.resolution],
+        )
+
+        # Long ranges have many points, stream them rather than building
+        # the whole response in memory
+        def generate():
+            yield "["
+            for i, point in enumerate(points):
+                if i:
+                    yield ","
+                yield json.dumps(self.schema.dump(point))
+            yield "]"
+
+        return flask.Response(
+            flask.stream_with_context(generate()),
+            mimetype="application/json",
+        )
+
+
+class FreeSlotList(FlavorList):
+    schema = schemas.freeslots
+    row_schema = None
+
+    def get(self, **kwargs):
+        try:
+            self.authorize("list")
+        except policy.PolicyNotAuthorized:
+            flask_restful.abort(403, message="Not authorised")
+
+        parser = reqparse.RequestParser()
+        parser.add_argument("category", type=str, location="args")
+        parser.add_argument("availability_zone", type=str, location="args")
+        parser.add_argument(
+            "start",
+            type=inputs.date,
+            default=_this_minute(),
+            location="args",
+        )
+        parser.add_argument(
+            "end",
+            type=inputs.date,
+            default=_this_minute() + timedelta(days=365),
+            location="args",
+        )
+        parser.add_argument(
+            "instance_count", type=inputs.positive, default=1, location="args"
+        )
+        args = parser.parse_args()
+
+        query = self._get_flavors()
+        if args.get("category"):
+            query = query.filter(
+                models.Flavor.category == args.get("category")
+            )
+        az = args.get("availability_zone")
+        if az:
+            query = query.filter(models.Flavor.availability_zone == az)
+
+        def build():
+            free_slots = self.manager.flavors_free_slots(
+                self.context,
+                query.all(),
+                args.start,
+                args.end,
+                instance_count=args.instance_count,
+            )
+            return {
+                flavor_id: self.schema.dump(slots)
+                for flavor_id, slots in free_slots.items()
+            }
+
+        version = [
+            (flavor_id, flavor_version, _ended(flavor_end))
+            for flavor_id, flavor_version, flavor_end in (
+                query.with_entities(
+                    models.Flavor.id,
+                    models.Flavor.version,
+                    models.Flavor.end,
+                ).order_by(models.Flavor.id)
+            )
+        ]
+        return self.conditional(
+            [version, args.start, args.end, args.instance_count], build
         )
-        return self.schema.dump(free_slots)
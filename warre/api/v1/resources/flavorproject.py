@@ -13,10 +13,12 @@
 
 from flask import request
 import flask_restful
+from flask_restful import inputs
 from flask_restful import reqparse
 import marshmallow
 from oslo_log import log as logging
 from oslo_policy import policy
+from sqlalchemy import orm
 
 from warre.api.v1.resources import base
 from warre.api.v1.schemas import flavorproject as schemas
@@ -32,6 +34,7 @@ LOG = logging.getLogger(__name__)
 class FlavorProjectList(base.Resource):
     POLICY_PREFIX = policies.FLAVORPROJECT_PREFIX
     schema = schemas.flavorprojects
+    SORT_KEYS = (models.FlavorProject.id,)
 
     def _get_flavorprojects(self):
         return db.session.query(models.FlavorProject)
@@ -44,6 +47,8 @@ class FlavorProjectList(base.Resource):
 
         parser = reqparse.RequestParser()
         parser.add_argument("limit", type=int, location="args")
+        parser.add_argument("marker", type=str, location="args")
+        parser.add_argument("with_count", type=inputs.boolean, location="args")
         parser.add_argument("project_id", type=str, location="args")
         parser.add_argument("flavor_id", type=str, location="args")
         args = parser.parse_args()
@@ -56,6 +61,7 @@ class FlavorProjectList(base.Resource):
         if flavor_id:
             query = query.filter_by(flavor_id=flavor_id)
 
+        query = query.options(orm.joinedload(models.FlavorProject.flavor))
         return self.paginate(query, args)
 
     def post(self, **kwargs):
@@ -38,10 +38,7 @@ class Limits(base.Resource):
         else:
             project_id = self.context.project_id
 
-        total_reservations = quota.get_usage_by_project(
-            project_id, "reservation"
-        )
-        total_hours = quota.get_usage_by_project(project_id, "hours")
+        usage = quota.get_usage(project_id, ["reservation", "hours"])
 
         enforcer = quota.get_enforcer()
         try:
@@ -58,8 +55,8 @@ class Limits(base.Resource):
         absolute = {
             "maxHours": limits.get("hours"),
             "maxReservations": limits.get("reservation"),
-            "totalHoursUsed": total_hours,
-            "totalReservationsUsed": total_reservations,
+            "totalHoursUsed": usage["hours"],
+            "totalReservationsUsed": usage["reservation"],
         }
 
         return {"absolute": absolute}
@@ -15,6 +15,7 @@ import datetime
 
 from flask import request
 import flask_restful
+from flask_restful import inputs
 from flask_restful import reqparse
 import marshmallow
 from oslo_log import log as logging
@@ -53,6 +54,8 @@ def _has_conflicting_reservation(start, end, flavor_ids):
 class MaintenanceWindowList(base.Resource):
     POLICY_PREFIX = policies.MAINTENANCEWINDOW_PREFIX
     schema = schemas.maintenancewindows
+    row_schema = schemas.maintenancewindowrows
+    SORT_KEYS = (models.MaintenanceWindow.start, models.MaintenanceWindow.id)
 
     def get(self, **kwargs):
         try:
@@ -62,6 +65,8 @@ class MaintenanceWindowList(base.Resource):
 
         parser = reqparse.RequestParser()
         parser.add_argument("limit", type=int, location="args")
+        parser.add_argument("marker", type=str, location="args")
+        parser.add_argument("with_count", type=inputs.boolean, location="args")
         args = parser.parse_args()
 
         query = db.session.query(models.MaintenanceWindow).order_by(
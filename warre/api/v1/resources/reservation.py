@@ -37,6 +37,8 @@ LOG = logging.getLogger(__name__)
 class ReservationList(base.Resource):
     POLICY_PREFIX = policies.RESERVATION_PREFIX
     schema = schemas.reservations
+    row_schema = schemas.reservationrows
+    SORT_KEYS = (models.Reservation.created_at, models.Reservation.id)
 
     def _get_reservations(self, project_id=None):
         query = db.session.query(models.Reservation)
@@ -52,6 +54,8 @@ class ReservationList(base.Resource):
 
         parser = reqparse.RequestParser()
         parser.add_argument("limit", type=int, location="args")
+        parser.add_argument("marker", type=str, location="args")
+        parser.add_argument("with_count", type=inputs.boolean, location="args")
         parser.add_argument(
             "all_projects", type=inputs.boolean, location="args"
         )
@@ -74,11 +78,6 @@ class ReservationList(base.Resource):
         if not data:
             return {"error_message": "No input data provided"}, 400
 
-        try:
-            self.check_limit("reservation")
-        except limit_exceptions.ProjectOverLimit as e:
-            return {"error_message": str(e)}, 413
-
         try:
             reservation = schemas.reservationcreate.load(data)
         except exceptions.FlavorDoesNotExist:
@@ -91,8 +90,12 @@ class ReservationList(base.Resource):
         reservation.start = utils.normalise_time(reservation.start)
 
         try:
-            self.check_limit(
-                "hours", reservation.total_hours * reservation.instance_count
+            self.check_limits(
+                {
+                    "reservation": 1,
+                    "hours": reservation.total_hours
+                    * reservation.instance_count,
+                }
             )
         except limit_exceptions.ProjectOverLimit as e:
             return {"error_message": str(e)}, 413
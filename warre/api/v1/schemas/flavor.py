@@ -11,6 +11,7 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+from warre.api.v1.schemas import rows
 from warre.extensions import ma
 from warre import models
 
@@ -20,6 +21,7 @@ class FlavorSchema(ma.SQLAlchemyAutoSchema):
         model = models.Flavor
         load_instance = True
         datetimeformat = "%Y-%m-%dT%H:%M:%S+00:00"
+        exclude = ("version",)
 
 
 class FlavorFreeSlotSchema(ma.Schema):
@@ -30,12 +32,22 @@ class FlavorFreeSlotSchema(ma.Schema):
         datetimeformat = "%Y-%m-%dT%H:%M:%S+00:00"
 
 
+class FlavorUtilizationSchema(ma.Schema):
+    start = ma.DateTime()
+    occupied = ma.Integer()
+    peak = ma.Integer()
+    mean = ma.Float()
+
+    class Meta:
+        datetimeformat = "%Y-%m-%dT%H:%M:%S+00:00"
+
+
 class FlavorCreateSchema(ma.SQLAlchemyAutoSchema):
     class Meta:
         model = models.Flavor
         load_instance = True
         datetimeformat = "%Y-%m-%dT%H:%M:%S%z"
-        exclude = ("id",)
+        exclude = ("id", "version")
 
 
 class FlavorUpdateSchema(ma.SQLAlchemyAutoSchema):
@@ -43,11 +55,21 @@ class FlavorUpdateSchema(ma.SQLAlchemyAutoSchema):
         model = models.Flavor
         load_instance = True
         datetimeformat = "%Y-%m-%dT%H:%M:%S%z"
-        exclude = ("id", "vcpu", "memory_mb", "disk_gb", "properties")
+        exclude = (
+            "id",
+            "vcpu",
+            "memory_mb",
+            "disk_gb",
+            "properties",
+            "version",
+        )
 
 
 flavor = FlavorSchema()
 flavors = FlavorSchema(many=True)
 flavorcreate = FlavorCreateSchema()
 flavorupdate = FlavorUpdateSchema(partial=True)
+freeslot = FlavorFreeSlotSchema()
 freeslots = FlavorFreeSlotSchema(many=True)
+utilization = FlavorUtilizationSchema()
+flavorrows = rows.RowSchema(flavors, models.Flavor)
@@ -11,6 +11,7 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+from warre.api.v1.schemas import rows
 from warre.extensions import ma
 from warre import models
 
@@ -49,3 +50,6 @@ maintenancewindow = MaintenanceWindowSchema()
 maintenancewindows = MaintenanceWindowSchema(many=True)
 maintenancewindowcreate = MaintenanceWindowCreateSchema()
 maintenancewindowupdate = MaintenanceWindowUpdateSchema(partial=True)
+maintenancewindowrows = rows.RowSchema(
+    maintenancewindows, models.MaintenanceWindow
+)
@@ -12,6 +12,7 @@
 #    under the License.
 
 from warre.api.v1.schemas import flavor
+from warre.api.v1.schemas import rows
 from warre.extensions import ma
 from warre import models
 
@@ -55,3 +56,4 @@ reservation = ReservationSchema()
 reservations = ReservationSchema(many=True)
 reservationcreate = ReservationCreateSchema()
 reservationupdate = ReservationUpdateSchema()
+reservationrows = rows.RowSchema(reservations, models.Reservation)
@@ -0,0 +1,141 @@
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import collections
+
+from marshmallow import fields
+import sqlalchemy as sa
+
+from warre.extensions import db
+
+
+# Fields whose dump is the database value as is
+_PLAIN_FIELDS = (fields.String, fields.Boolean, fields.Raw)
+
+_COLUMN = 0
+_ONE = 1
+_MANY = 2
+
+
+def _converter(field):
+    """Return the function dumping a non null value, None for as is"""
+    if type(field) in _PLAIN_FIELDS:
+        return None
+    if type(field) is fields.Integer and not field.as_string:
+        return None
+    if type(field) is fields.DateTime:
+        data_format = field.format or field.DEFAULT_FORMAT
+        if data_format not in field.SERIALIZATION_FUNCS:
+            return lambda value: value.strftime(data_format)
+    return lambda value: field._serialize(value, None, None)
+
+
+class RowSchema:
+    """Dump column tuples the way a model schema dumps instances
+
+    Compiled once from a marshmallow schema of a model: every dumped
+    field is mapped to a column, so a listing can select plain column
+    tuples instead of loading ORM instances and dump them without going
+    through marshmallow for each field of each object. The output is
+    the same as schema.dump(), keys in the same order.
+
+    Nested fields are supported one level deep. A nested object is
+    read with an outer join in the same row, a nested list with one
+    extra query for all the rows dumped at once.
+    """
+
+    def __init__(self, schema, model, prefix=""):
+        self.model = model
+        self.columns = []
+        self.joins = []
+        self._fields = []
+
+        (pk,) = sa.inspect(model).primary_key
+        self._pk_column = pk
+        self._pk = None
+        for name, field in schema.dump_fields.items():
+            key = field.data_key or name
+            attribute = getattr(model, field.attribute or name)
+            if isinstance(field, fields.Nested):
+                if prefix:
+                    raise ValueError(f"{name} is nested too deep")
+                target = attribute.property.mapper.class_
+                nested = RowSchema(field.schema, target, f"{name}__")
+                if field.many or field.schema.many:
+                    self._fields.append((key, _MANY, attribute, nested))
+                    continue
+                self.joins.append(attribute)
+                self._fields.append((key, _ONE, len(self.columns), nested))
+                self.columns.extend(nested.columns)
+                continue
+            if attribute.property.columns[0] is pk:
+                self._pk = len(self.columns)
+            self._fields.append(
+                (key, _COLUMN, len(self.columns), _converter(field))
+            )
+            self.columns.append(attribute.label(prefix + attribute.key))
+
+        if self._pk is None:
+            # Always read the primary key, to tell rows apart
+            self._pk = len(self.columns)
+            self.columns.append(pk.label(f"{prefix}_pk"))
+
+    def select(self, query):
+        """Turn a query of model instances into one of column tuples
+
+        The query must return each instance once, unlike a query of
+        instances its rows are not made unique.
+        """
+        for relationship in self.joins:
+            query = query.outerjoin(relationship)
+        return query.with_entities(*self.columns)
+
+    def _children(self, rows):
+        """Read the nested lists of rows, by field and parent key"""
+        children = {}
+        pks = [row[self._pk] for row in rows]
+        for key, kind, attribute, nested in self._fields:
+            if kind is not _MANY:
+                continue
+            by_parent = collections.defaultdict(list)
+            if pks:
+                query = (
+                    db.session.query(self._pk_column, *nested.columns)
+                    .select_from(self.model)
+                    .join(attribute)
+                    .filter(self._pk_column.in_(pks))
+                )
+                for row in query:
+                    by_parent[row[0]].append(nested._dump(row, 1, None))
+            children[key] = by_parent
+        return children
+
+    def _dump(self, row, offset, children):
+        if row[offset + self._pk] is None:
+            return None
+        data = {}
+        for key, kind, index, arg in self._fields:
+            if kind is _COLUMN:
+                value = row[offset + index]
+                if arg is not None and value is not None:
+                    value = arg(value)
+                data[key] = value
+            elif kind is _ONE:
+                data[key] = arg._dump(row, offset + index, None)
+            else:
+                data[key] = children[key].get(row[self._pk], [])
+        return data
+
+    def dump(self, rows):
+        children = self._children(rows)
+        return [self._dump(row, 0, children) for row in rows]
@@ -24,6 +24,8 @@ from werkzeug.middleware import dispatcher
 from warre.api import v1 as api_v1
 from warre.common import config
 from warre.common import keystone
+from warre.common import metrics
+from warre.common import profiling
 from warre.common import rpc
 from warre.common import sentry
 from warre import extensions
@@ -60,6 +62,8 @@ def create_app(test_config=None, conf_file=None, init_config=True):
         sentry.setup()
 
     api_bp = flask.Blueprint("api", __name__, url_prefix="/")
+    metrics.init_app(app)
+    profiling.init_app(app)
     register_extensions(app, api_bp)
     register_resources(extensions.api)
     register_blueprints(app)
@@ -74,7 +78,8 @@ def create_app(test_config=None, conf_file=None, init_config=True):
         {}, oslo_config_project='warre'
     )
     app.wsgi_app = dispatcher.DispatcherMiddleware(
-        app.wsgi_app, {'/healthcheck': hc_app}
+        app.wsgi_app,
+        {'/healthcheck': hc_app, '/metrics': metrics.make_wsgi_app()},
     )
 
     app.wsgi_app = http_proxy_to_wsgi.HTTPProxyToWSGI(app.wsgi_app)
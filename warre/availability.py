@@ -0,0 +1,290 @@
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import datetime
+import itertools
+from operator import itemgetter
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+ONE_MINUTE = datetime.timedelta(seconds=60)
+ONE_SECOND = datetime.timedelta(seconds=1)
+
+# Bucket counts from which bucketing is done with numpy, when available
+VECTORIZE_BUCKETS = 512
+
+
+class Timeline:
+    """Capacity change points of a flavor
+
+    Entries are (timestamp, delta, reservation_id) tuples sorted by
+    timestamp. Maintenance window entries have no reservation_id and a
+    delta of +1/-1, they are weighted by the flavor slots when the
+    events are generated so the timeline stays valid if slots change.
+
+    reserved and blocked are the reservation and maintenance window
+    occupancy before the first entry, used when a timeline only covers
+    part of a flavor's history.
+    """
+
+    def __init__(self, entries, reserved=0, blocked=0):
+        self.entries = entries
+        self.reserved = reserved
+        self.blocked = blocked
+
+    @classmethod
+    def from_intervals(cls, reservations, maintenance_windows):
+        entries = []
+        for r in reservations:
+            entries.append((r.start, r.instance_count, r.id))
+            entries.append((r.end, -r.instance_count, r.id))
+        for window in maintenance_windows:
+            entries.append((window.start, 1, None))
+            entries.append((window.end, -1, None))
+        entries.sort(key=itemgetter(0))
+        return cls(entries)
+
+    def events(self, slots, exclude=None, include_maintenance=True):
+        """Generate the weighted (timestamp, delta) events of the timeline
+
+        exclude - id of a reservation to leave out
+        include_maintenance - when False, leave out maintenance windows
+        """
+        baseline = self.reserved
+        if include_maintenance:
+            baseline += self.blocked * slots
+        if baseline:
+            yield datetime.datetime.min, baseline
+        for point, delta, reservation_id in self.entries:
+            if reservation_id is None:
+                if include_maintenance:
+                    yield point, delta * slots
+            elif reservation_id != exclude:
+                yield point, delta
+
+
+def build_events(reservations, maintenance_windows, slots):
+    """Collapse reservations and maintenance windows into weighted events
+
+    Each reservation contributes a (+instance_count, -instance_count) pair
+    and each maintenance window a (+slots, -slots) pair, so a window
+    occupies the whole flavor for its duration.
+
+    Returns a list of (timestamp, delta) tuples sorted by timestamp. The
+    sort is stable, events sharing a timestamp keep the order they were
+    given in.
+    """
+    return list(
+        Timeline.from_intervals(reservations, maintenance_windows).events(
+            slots
+        )
+    )
+
+
+def free_slots(events, slots, start, end, instance_count=1):
+    """Sweep a sorted event list and return the free slots in a range
+
+    A segment between two consecutive events is busy when fewer than
+    instance_count of the flavor slots are free during it. Free slots are
+    the gaps between busy segments, trimmed by a minute on each side that
+    touches one. Busy segments ending before start are ignored, so no
+    free slot starts before start.
+
+    events - (timestamp, delta) tuples sorted by timestamp, events
+        outside the range only contribute to the occupancy at its start
+    instance_count - how many slots must be free at once
+    """
+    # Occupancy at or above this leaves no room for the instances
+    threshold = slots - instance_count + 1
+    if threshold < 1:
+        return []
+
+    free = []
+    busy = False
+    start_free = start
+    occupied = 0
+    last_point = None
+    for point, delta in events:
+        if last_point is not None and last_point > end:
+            break
+        if (
+            last_point is not None
+            and occupied >= threshold
+            and point >= start
+            and last_point <= end
+        ):
+            busy = True
+            if last_point <= start <= point:
+                start_free = point
+            else:
+                diff = (last_point - start_free).total_seconds()
+                if start_free < last_point and diff > 60:
+                    if start_free != start:
+                        start_free += ONE_MINUTE
+                    free.append(
+                        {
+                            "start": start_free,
+                            "end": (last_point - ONE_SECOND).replace(second=0),
+                        }
+                    )
+                start_free = point
+        last_point = point
+        occupied += delta
+
+    if not busy:
+        return [{"start": start, "end": end}]
+
+    if start_free < end:
+        if start_free != start:
+            start_free += ONE_MINUTE
+        free.append({"start": start_free, "end": end})
+    return free
+
+
+def next_slot(events, slots, instance_count, duration, start, end=None):
+    """Sweep a sorted event list for the earliest slot of a duration
+
+    Finds the earliest time from start at which instance_count
+    instances fit in the flavor for the whole duration, stopping at the
+    first gap that is long enough. Busy segments are trimmed by a
+    minute like in free_slots, so the slot found is one that
+    free_slots would report.
+
+    end - latest time the slot may end, None for no limit
+    Returns the start of the slot or None when there is none.
+    """
+    # Occupancy at or above this leaves no room for the instances
+    threshold = slots - instance_count + 1
+    if threshold < 1:
+        return None
+
+    start_free = start
+    occupied = 0
+    last_point = None
+
+    def candidate():
+        return start_free if start_free == start else start_free + ONE_MINUTE
+
+    for point, delta in events:
+        if last_point is not None:
+            if end is not None and last_point > end:
+                break
+            if occupied >= threshold and point >= start:
+                if last_point <= start <= point:
+                    start_free = point
+                else:
+                    slot_start = candidate()
+                    slot_end = (last_point - ONE_SECOND).replace(second=0)
+                    if (
+                        start_free < last_point
+                        and slot_end - slot_start >= duration
+                    ):
+                        break
+                    start_free = point
+        last_point = point
+        occupied += delta
+
+    slot_start = candidate()
+    if end is not None and slot_start + duration > end:
+        return None
+    return slot_start
+
+
+def occupancy(events, start, end):
+    """Generate the occupancy step function of an event list in a range
+
+    Yields (timestamp, occupied) tuples, one for start and then one for
+    every change of occupancy up to end. Events sharing a timestamp are
+    applied together so zero length spikes are not reported.
+    """
+    occupied = 0
+    reported = None
+    for point, group in itertools.groupby(events, key=itemgetter(0)):
+        if point > end:
+            break
+        if point > start and reported is None:
+            reported = occupied
+            yield start, occupied
+        occupied += sum(delta for _, delta in group)
+        if point > start and occupied != reported:
+            reported = occupied
+            yield point, occupied
+    if reported is None:
+        yield start, occupied
+
+
+def buckets(steps, start, end, width):
+    """Bucket an occupancy step function into fixed width buckets
+
+    steps - (timestamp, occupied) tuples as generated by occupancy
+    Yields (bucket_start, peak, mean) tuples where peak is the highest
+    occupancy in the bucket and mean the time weighted average. The
+    last bucket is cut short at end.
+    """
+    count = -(-(end - start) // width)
+    if np is not None and count >= VECTORIZE_BUCKETS:
+        yield from _buckets_vectorized(list(steps), start, end, width, count)
+        return
+
+    steps = iter(steps)
+    value = next(steps)[1]
+    step = next(steps, None)
+    for i in range(count):
+        bucket_start = start + i * width
+        bucket_end = min(bucket_start + width, end)
+        while step is not None and step[0] <= bucket_start:
+            value = step[1]
+            step = next(steps, None)
+        peak = value
+        area = 0.0
+        point = bucket_start
+        while step is not None and step[0] < bucket_end:
+            area += value * (step[0] - point).total_seconds()
+            point, value = step
+            peak = max(peak, value)
+            step = next(steps, None)
+        area += value * (bucket_end - point).total_seconds()
+        yield (
+            bucket_start,
+            peak,
+            area / (bucket_end - bucket_start).total_seconds(),
+        )
+
+
+def _buckets_vectorized(steps, start, end, width, count):
+    seconds = width.total_seconds()
+    total = (end - start).total_seconds()
+    times = np.array([(t - start).total_seconds() for t, _ in steps])
+    values = np.array([v for _, v in steps], dtype=float)
+    edges = np.minimum(np.arange(count + 1) * seconds, total)
+
+    # Integral of the step function up to each step, then to each edge
+    cumulative = np.concatenate(
+        ([0.0], np.cumsum(values[:-1] * np.diff(times)))
+    )
+    index = np.searchsorted(times, edges, side="right") - 1
+    integral = cumulative[index] + values[index] * (edges - times[index])
+    means = np.diff(integral) / np.diff(edges)
+
+    # Peak is the value at the bucket start or of any step inside it
+    peaks = values[index[:-1]].copy()
+    inner = times[1:] < total
+    inside = np.floor_divide(times[1:][inner], seconds).astype(int)
+    np.maximum.at(peaks, inside, values[1:][inner])
+
+    for i in range(count):
+        yield start + i * width, int(peaks[i]), float(means[i])
@@ -15,8 +15,37 @@ import click
 from flask.cli import FlaskGroup
 
 from warre import app
+from warre import ledger
 
 
 @click.group(cls=FlaskGroup, create_app=app.create_app)
 def cli():
     """Management script for the Warre application."""
+
+
+@cli.command("rebuild-ledger")
+def rebuild_ledger():
+    """Rebuild the capacity ledger from reservations and windows."""
+    count = ledger.rebuild()
+    click.echo(f"Rebuilt capacity ledger with {count} rows")
+    _verify_ledger()
+
+
+@cli.command("verify-ledger")
+def verify_ledger():
+    """Verify the capacity ledger against reservations and windows."""
+    _verify_ledger()
+
+
+def _verify_ledger():
+    missing, unexpected = ledger.verify()
+    for row in missing:
+        click.echo(f"Missing: {row}", err=True)
+    for row in unexpected:
+        click.echo(f"Unexpected: {row}", err=True)
+    if missing or unexpected:
+        raise click.ClickException(
+            f"Capacity ledger mismatch, {len(missing)} missing and "
+            f"{len(unexpected)} unexpected rows"
+        )
+    click.echo("Capacity ledger is consistent")
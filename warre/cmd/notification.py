@@ -18,6 +18,7 @@ import cotyledon
 from cotyledon import oslo_config_glue
 from oslo_config import cfg
 
+from warre.common import metrics
 from warre.common import service
 from warre.notification import consumer
 
@@ -30,6 +31,7 @@ def main():
 
     sm = cotyledon.ServiceManager()
     sm.add(consumer.ConsumerService, workers=CONF.worker.workers, args=(CONF,))
+    metrics.add_service(sm, CONF.metrics.notification_port)
     oslo_config_glue.setup(sm, CONF, reload_method="mutate")
     sm.run()
 
@@ -18,6 +18,7 @@ import cotyledon
 from cotyledon import oslo_config_glue
 from oslo_config import cfg
 
+from warre.common import metrics
 from warre.common import service
 from warre.worker import consumer
 from warre.worker import manager
@@ -40,6 +41,7 @@ def main():
         workers=CONF.worker.workers,
         args=(CONF, m),
     )
+    metrics.add_service(sm, CONF.metrics.worker_port)
     oslo_config_glue.setup(sm, CONF, reload_method="mutate")
     sm.run()
 
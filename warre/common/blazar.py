@@ -17,6 +17,7 @@ from blazarclient import exception as blazar_exc
 from oslo_config import cfg
 
 from warre.common import keystone
+from warre.common import metrics
 
 
 CONF = cfg.CONF
@@ -26,13 +27,14 @@ LEASE_DATE_FORMAT = "%Y-%m-%d %H:%M"
 class BlazarClient:
     def __init__(self, session=None):
         if session is None:
-            session = keystone.KeystoneSession().get_session()
+            session = keystone.get_session()
         self.client = blazarclient.Client(
             session=session,
             service_type="reservation",
             interface=CONF.blazar.interface,
         )
 
+    @metrics.timed("blazar_create_lease")
     def create_lease(self, reservation):
         reservation_info = {
             "resource_type": "virtual:instance",
@@ -57,6 +59,7 @@ class BlazarClient:
         )
         return lease
 
+    @metrics.timed("blazar_delete_lease")
     def delete_lease(self, lease_id):
         try:
             self.client.lease.delete(lease_id)
@@ -64,6 +67,7 @@ class BlazarClient:
             if e.kwargs.get("code") != 404:
                 raise e
 
+    @metrics.timed("blazar_update_lease")
     def update_lease(self, lease_id, **kwargs):
         if "end_date" in kwargs:
             kwargs["end_date"] = kwargs["end_date"].strftime(LEASE_DATE_FORMAT)
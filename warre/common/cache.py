@@ -0,0 +1,142 @@
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import collections
+import threading
+import time
+
+import memcache
+from oslo_config import cfg
+from oslo_log import log as logging
+
+from warre.common import metrics
+
+
+CONF = cfg.CONF
+LOG = logging.getLogger(__name__)
+
+_CACHE = None
+
+
+class NullCache:
+    def get(self, key):
+        return None
+
+    def set(self, key, value):
+        pass
+
+
+class MemoryCache:
+    """Thread safe LRU cache with per entry expiry
+
+    Counts hits and misses, see stats. Named caches also export them as
+    the warre_cache_lookups Prometheus counter.
+    """
+
+    def __init__(self, max_entries, expiration_time, name=None):
+        self.max_entries = max_entries
+        self.expiration_time = expiration_time
+        self.hits = 0
+        self.misses = 0
+        self._hit_counter = self._miss_counter = None
+        if name:
+            self._hit_counter = metrics.CACHE_LOOKUPS.labels(name, "hit")
+            self._miss_counter = metrics.CACHE_LOOKUPS.labels(name, "miss")
+        self._data = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            hit, value = self._get(key)
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+        counter = self._hit_counter if hit else self._miss_counter
+        if counter is not None:
+            counter.inc()
+        return value
+
+    def _get(self, key):
+        try:
+            expires, value = self._data[key]
+        except KeyError:
+            return False, None
+        if expires < time.monotonic():
+            del self._data[key]
+            return False, None
+        self._data.move_to_end(key)
+        return True, value
+
+    def set(self, key, value):
+        expires = time.monotonic() + self.expiration_time
+        with self._lock:
+            self._data[key] = (expires, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def stats(self):
+        """Get the hit and miss counts, hit rate and number of entries"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "entries": len(self._data),
+            }
+
+
+class MemcachedCache:
+    def __init__(self, servers, expiration_time):
+        self.expiration_time = expiration_time
+        self.client = memcache.Client(servers)
+
+    def get(self, key):
+        try:
+            return self.client.get(key)
+        except Exception:
+            LOG.warning("Failed to get %s from memcached", key, exc_info=True)
+            return None
+
+    def set(self, key, value):
+        try:
+            self.client.set(key, value, time=self.expiration_time)
+        except Exception:
+            LOG.warning("Failed to set %s in memcached", key, exc_info=True)
+
+
+def get_cache():
+    """Get the process wide capacity timeline cache"""
+    global _CACHE
+    if _CACHE is None:
+        conf = CONF.capacity_cache
+        if conf.backend == "memcached":
+            _CACHE = MemcachedCache(
+                conf.memcached_servers, conf.expiration_time
+            )
+        elif conf.backend == "memory":
+            _CACHE = MemoryCache(conf.max_entries, conf.expiration_time)
+        else:
+            _CACHE = NullCache()
+    return _CACHE
+
+
+def reset():
+    global _CACHE
+    _CACHE = None
@@ -45,11 +45,65 @@ flask_opts = [
 database_opts = [
     cfg.StrOpt("connection"),
     cfg.IntOpt("connection_recycle_time", default=600),
+    cfg.BoolOpt(
+        "profile_sql",
+        default=False,
+        help="Log the SQL statements run by every API request, with "
+        "their duration and caller, and return a summary in the "
+        "X-Warre-SQL response header. Admins can profile single requests "
+        "with the X-Warre-Profile-SQL request header instead.",
+    ),
 ]
 
 worker_opts = [
     cfg.IntOpt("workers", default=1),
     cfg.IntOpt("periodic_task_interval", default=1800),
+    cfg.BoolOpt(
+        "periodic_task_coordination",
+        default=True,
+        help="Run each periodic task in only one worker per interval, "
+        "across all hosts. Workers coordinate through the database.",
+    ),
+    cfg.IntOpt(
+        "nova_lookup_concurrency",
+        default=8,
+        min=1,
+        help="How many Nova instance lookups the exists notification task "
+        "makes at once.",
+    ),
+    cfg.IntOpt(
+        "cleanup_batch_size",
+        default=1000,
+        min=1,
+        help="Number of old reservations or maintenance windows the "
+        "cleanup tasks delete per transaction.",
+    ),
+    cfg.IntOpt(
+        "user_notification_interval",
+        default=10,
+        min=1,
+        help="Seconds between runs of the task sending queued user "
+        "notifications.",
+    ),
+    cfg.IntOpt(
+        "user_notification_concurrency",
+        default=4,
+        min=1,
+        help="How many user notifications are sent at once.",
+    ),
+    cfg.IntOpt(
+        "user_notification_max_attempts",
+        default=10,
+        min=1,
+        help="Attempts to send a user notification before giving up.",
+    ),
+    cfg.IntOpt(
+        "user_notification_retry_delay",
+        default=60,
+        min=1,
+        help="Seconds before a failed user notification is retried, "
+        "doubled after every further failure.",
+    ),
 ]
 
 blazar_opts = [
@@ -71,6 +125,90 @@ warre_opts = [
         choices=["logging", "taynac"],
         help="User notification driver to use",
     ),
+    cfg.StrOpt(
+        "template_cache_dir",
+        help="Directory to cache compiled user notification templates in, "
+        "so new processes skip compiling them. Templates are always "
+        "compiled once per process.",
+    ),
+    cfg.IntOpt(
+        "admission_attempts",
+        default=5,
+        min=1,
+        help="How many times to check a reservation against flavor "
+        "capacity when concurrent reservations for the flavor keep "
+        "changing it.",
+    ),
+    cfg.IntOpt(
+        "bot_session_cache_size",
+        default=128,
+        min=1,
+        help="Maximum number of project scoped bot sessions the worker "
+        "keeps. Sessions reuse their token until it expires.",
+    ),
+    cfg.IntOpt(
+        "bot_session_cache_time",
+        default=3600,
+        help="Seconds before a cached bot session is discarded.",
+    ),
+    cfg.IntOpt(
+        "bot_grant_cache_size",
+        default=1024,
+        min=1,
+        help="Maximum number of projects the worker remembers the bot "
+        "user has a role in.",
+    ),
+    cfg.IntOpt(
+        "bot_grant_cache_time",
+        default=86400,
+        help="Seconds before the bot role grant in a project is checked "
+        "again.",
+    ),
+    cfg.IntOpt(
+        "limits_cache_time",
+        default=300,
+        min=0,
+        help="Seconds to cache the unified limits read from Keystone for. "
+        "0 reads them again for every quota check.",
+    ),
+]
+
+capacity_cache_opts = [
+    cfg.StrOpt(
+        "backend",
+        default="memory",
+        choices=["none", "memory", "memcached"],
+        help="Where to cache flavor capacity timelines. The memory backend "
+        "is per process, memcached shares timelines between processes.",
+    ),
+    cfg.ListOpt(
+        "memcached_servers",
+        default=["localhost:11211"],
+        help="Memcached servers to use with the memcached backend.",
+    ),
+    cfg.IntOpt(
+        "max_entries",
+        default=256,
+        help="Maximum number of timelines kept by the memory backend.",
+    ),
+    cfg.IntOpt(
+        "expiration_time",
+        default=3600,
+        help="Seconds before a cached timeline expires.",
+    ),
+]
+
+metrics_opts = [
+    cfg.PortOpt(
+        "worker_port",
+        help="Port the worker serves Prometheus metrics on. Metrics are "
+        "not served when unset.",
+    ),
+    cfg.PortOpt(
+        "notification_port",
+        help="Port the notification service serves Prometheus metrics on. "
+        "Metrics are not served when unset.",
+    ),
 ]
 
 sentry_opts = [
@@ -87,7 +225,9 @@ sentry_opts = [
     ),
 ]
 
+cfg.CONF.register_opts(metrics_opts, group="metrics")
 cfg.CONF.register_opts(sentry_opts, group="sentry")
+cfg.CONF.register_opts(capacity_cache_opts, group="capacity_cache")
 cfg.CONF.register_opts(warre_opts, group="warre")
 cfg.CONF.register_opts(blazar_opts, group="blazar")
 cfg.CONF.register_opts(worker_opts, group="worker")
@@ -131,6 +271,8 @@ def list_opts():
         ("database", database_opts),
         ("flask", flask_opts),
         ("sentry", sentry_opts),
+        ("metrics", metrics_opts),
+        ("capacity_cache", capacity_cache_opts),
         add_auth_opts(),
     ]
 
@@ -21,7 +21,9 @@ from oslo_log import log as logging
 LOG = logging.getLogger(__name__)
 
 REQUEST_CONTEXT_ENV = "oslo_context"
-_NOAUTH_PATHS = ["/", "/healthcheck"]
+_NOAUTH_PATHS = ["/", "/healthcheck", "/metrics"]
+
+_SESSIONS = {}
 
 
 class KeystoneSession:
@@ -56,6 +58,21 @@ class KeystoneSession:
         return self.get_auth().get_user_id(self.get_session())
 
 
+def get_session(section="service_auth"):
+    """Get the process wide Keystone session of a config section
+
+    A session holds the auth token and the HTTP connection pool, sharing
+    it avoids a token request and new connections for every client.
+    """
+    if section not in _SESSIONS:
+        _SESSIONS[section] = KeystoneSession(section).get_session()
+    return _SESSIONS[section]
+
+
+def reset():
+    _SESSIONS.clear()
+
+
 class KeystoneContext:
     def __init__(self, app):
         self.app = app
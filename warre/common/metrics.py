@@ -0,0 +1,142 @@
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Prometheus metrics
+
+The API serves metrics at /metrics. The worker and notification services
+serve them on [metrics] worker_port and notification_port.
+
+Services running several processes, including the API under a WSGI
+server with several processes, need the PROMETHEUS_MULTIPROC_DIR
+environment variable set to an empty directory, shared by the processes
+of a service and not by different services. Metrics are then collected
+from all the processes of the service. Only histograms and counters
+are used, so metrics of processes that exited stay valid.
+"""
+
+import functools
+import os
+import time
+
+import cotyledon
+import flask
+from oslo_config import cfg
+from oslo_log import log as logging
+import prometheus_client
+from prometheus_client import multiprocess
+
+
+CONF = cfg.CONF
+LOG = logging.getLogger(__name__)
+
+REQUEST_TIME = prometheus_client.Histogram(
+    "warre_api_request_duration_seconds",
+    "Time taken to handle API requests",
+    ["resource", "method", "status"],
+)
+OPERATION_TIME = prometheus_client.Histogram(
+    "warre_operation_duration_seconds",
+    "Time taken by operations, outcome is success or error",
+    ["operation", "outcome"],
+)
+LEASE_EVENT_LAG = prometheus_client.Histogram(
+    "warre_lease_event_lag_seconds",
+    "Time from a Blazar lease event to the reservation being updated",
+    ["event"],
+    buckets=(0.1, 0.5, 1, 2, 5, 10, 30, 60, 300, 900, float("inf")),
+)
+CACHE_LOOKUPS = prometheus_client.Counter(
+    "warre_cache_lookups",
+    "Lookups in named in memory caches, result is hit or miss",
+    ["cache", "result"],
+)
+
+
+def get_registry():
+    if "PROMETHEUS_MULTIPROC_DIR" in os.environ:
+        registry = prometheus_client.CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return registry
+    return prometheus_client.REGISTRY
+
+
+def make_wsgi_app():
+    return prometheus_client.make_wsgi_app(get_registry())
+
+
+def timed(operation):
+    """Record how long the decorated function takes"""
+
+    def decorator(f):
+        @functools.wraps(f)
+        def decorated(*args, **kwargs):
+            start = time.perf_counter()
+            outcome = "error"
+            try:
+                result = f(*args, **kwargs)
+                outcome = "success"
+                return result
+            finally:
+                OPERATION_TIME.labels(operation, outcome).observe(
+                    time.perf_counter() - start
+                )
+
+        return decorated
+
+    return decorator
+
+
+def init_app(app):
+    """Record the time taken by every request of a flask app"""
+
+    @app.before_request
+    def start_timer():
+        flask.g.metrics_start = time.perf_counter()
+
+    @app.after_request
+    def observe(response):
+        start = flask.g.pop("metrics_start", None)
+        if start is not None:
+            REQUEST_TIME.labels(
+                flask.request.endpoint or "unknown",
+                flask.request.method,
+                response.status_code,
+            ).observe(time.perf_counter() - start)
+        return response
+
+
+class MetricsService(cotyledon.Service):
+    """Serve the metrics of the processes of a cotyledon service"""
+
+    name = "metrics"
+
+    def __init__(self, worker_id, port):
+        super().__init__(worker_id)
+        self.port = port
+        self.server = None
+
+    def run(self):
+        LOG.info("Serving metrics on port %s", self.port)
+        self.server, _ = prometheus_client.start_http_server(
+            self.port, registry=get_registry()
+        )
+
+    def terminate(self):
+        if self.server:
+            self.server.shutdown()
+        super().terminate()
+
+
+def add_service(sm, port):
+    if port:
+        sm.add(MetricsService, workers=1, args=(port,))
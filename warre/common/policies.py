@@ -97,6 +97,14 @@ flavor_rules = [
         description="Delete flavor.",
         operations=[{"path": "/v1/flavors/{flavor_id}/", "method": "DELETE"}],
     ),
+    policy.DocumentedRuleDefault(
+        name=FLAVOR_PREFIX % "utilization",
+        check_str=f"rule:{ADMIN_OR_READER}",
+        description="Show the slot utilization of a flavor.",
+        operations=[
+            {"path": "/v1/flavors/{flavor_id}/utilization/", "method": "GET"}
+        ],
+    ),
 ]
 
 FLAVORPROJECT_PREFIX = "warre:flavorproject:%s"
@@ -248,6 +256,40 @@ reservation_rules = [
     ),
 ]
 
+ARCHIVEDRESERVATION_PREFIX = "warre:archivedreservation:%s"
+
+archivedreservation_rules = [
+    policy.DocumentedRuleDefault(
+        name=ARCHIVEDRESERVATION_PREFIX % "get",
+        check_str=f"rule:{ADMIN_OR_READER}",
+        description="Show archived reservation details.",
+        operations=[
+            {
+                "path": "/v1/archivedreservations/{reservation_id}/",
+                "method": "GET",
+            },
+        ],
+    ),
+    policy.DocumentedRuleDefault(
+        name=ARCHIVEDRESERVATION_PREFIX % "list",
+        check_str=f"rule:{ADMIN_OR_READER}",
+        description="List archived reservations.",
+        operations=[{"path": "/v1/archivedreservations/", "method": "GET"}],
+    ),
+]
+
+PROFILE_SQL = "warre:profile_sql"
+
+profiling_rules = [
+    policy.DocumentedRuleDefault(
+        name=PROFILE_SQL,
+        check_str="rule:admin_required",
+        description="Profile the SQL statements of a request with the "
+        "X-Warre-Profile-SQL header.",
+        operations=[{"path": "/v1/*", "method": "GET"}],
+    ),
+]
+
 
 def list_rules():
     return (
@@ -257,4 +299,6 @@ def list_rules():
         + maintenancewindow_rules
         + limits_rules
         + reservation_rules
+        + archivedreservation_rules
+        + profiling_rules
     )
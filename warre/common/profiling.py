@@ -0,0 +1,165 @@
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""SQL query profiling
+
+Records the SQL statements run by a thread, with their duration and
+the warre code that ran them. API requests are profiled when [database]
+profile_sql is set, or when an admin sends the PROFILE_HEADER request
+header. A summary is returned in the SUMMARY_HEADER response header and
+the statements are logged.
+"""
+
+import contextlib
+import os
+import threading
+import time
+import traceback
+
+import flask
+from oslo_config import cfg
+from oslo_log import log as logging
+from oslo_utils import strutils
+import sqlalchemy as sa
+
+from warre.common import keystone
+from warre.common import policies
+from warre import policy
+
+
+CONF = cfg.CONF
+LOG = logging.getLogger(__name__)
+
+PROFILE_HEADER = "X-Warre-Profile-SQL"
+SUMMARY_HEADER = "X-Warre-SQL"
+
+_PACKAGE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+_local = threading.local()
+
+
+class Query:
+    def __init__(self, statement, duration, caller):
+        self.statement = statement
+        self.duration = duration
+        self.caller = caller
+
+    def __repr__(self):
+        return (
+            f"{self.duration * 1000:.2f}ms {self.caller}: "
+            f"{' '.join(self.statement.split())}"
+        )
+
+
+class QueryCollector:
+    def __init__(self):
+        self.queries = []
+
+    @property
+    def count(self):
+        return len(self.queries)
+
+    @property
+    def duration(self):
+        return sum(q.duration for q in self.queries)
+
+    def summary(self):
+        return f"count={self.count}; time={self.duration * 1000:.2f}ms"
+
+
+@contextlib.contextmanager
+def collect():
+    """Record the statements run by this thread in the block
+
+    Yields the QueryCollector the statements are recorded in.
+    """
+    previous = getattr(_local, "collector", None)
+    collector = _local.collector = QueryCollector()
+    try:
+        yield collector
+    finally:
+        _local.collector = previous
+
+
+def _caller():
+    """Find the innermost warre frame outside this module"""
+    for frame in reversed(traceback.extract_stack()):
+        filename = os.path.abspath(frame.filename)
+        if filename.startswith(_PACKAGE_DIR) and filename != os.path.abspath(
+            __file__
+        ):
+            path = os.path.relpath(filename, os.path.dirname(_PACKAGE_DIR))
+            return f"{path}:{frame.lineno} in {frame.name}"
+    return "unknown"
+
+
+@sa.event.listens_for(sa.engine.Engine, "before_cursor_execute")
+def _before_cursor_execute(
+    conn, cursor, statement, parameters, context, executemany
+):
+    if getattr(_local, "collector", None) is not None:
+        conn.info.setdefault("profiling_start", []).append(time.perf_counter())
+
+
+@sa.event.listens_for(sa.engine.Engine, "after_cursor_execute")
+def _after_cursor_execute(
+    conn, cursor, statement, parameters, context, executemany
+):
+    collector = getattr(_local, "collector", None)
+    starts = conn.info.get("profiling_start")
+    if collector is None or not starts:
+        return
+    duration = time.perf_counter() - starts.pop()
+    collector.queries.append(Query(statement, duration, _caller()))
+
+
+def _requested():
+    if CONF.database.profile_sql:
+        return True
+    if not strutils.bool_from_string(
+        flask.request.headers.get(PROFILE_HEADER)
+    ):
+        return False
+    context = flask.request.environ.get(keystone.REQUEST_CONTEXT_ENV)
+    return context is not None and policy.get_enforcer().authorize(
+        policies.PROFILE_SQL, {}, context, do_raise=False
+    )
+
+
+def init_app(app):
+    """Profile the requests of a flask app when asked to"""
+
+    @app.before_request
+    def start_profiling():
+        if _requested():
+            flask.g.sql_collector = _local.collector = QueryCollector()
+
+    @app.after_request
+    def add_summary(response):
+        collector = flask.g.get("sql_collector")
+        if collector is not None:
+            response.headers[SUMMARY_HEADER] = collector.summary()
+        return response
+
+    @app.teardown_request
+    def stop_profiling(exc):
+        collector = flask.g.pop("sql_collector", None)
+        if collector is None:
+            return
+        _local.collector = None
+        LOG.info(
+            "%s %s ran SQL queries, %s:\n%s",
+            flask.request.method,
+            flask.request.path,
+            collector.summary(),
+            "\n".join(repr(q) for q in collector.queries),
+        )
@@ -0,0 +1,200 @@
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import collections
+
+from oslo_log import log as logging
+import sqlalchemy as sa
+
+from warre import availability
+from warre.extensions import db
+from warre import models
+
+
+LOG = logging.getLogger(__name__)
+
+Ledger = models.CapacityLedger
+
+
+def _filtered(query, flavor_ids, exclude, include_maintenance):
+    query = query.filter(Ledger.flavor_id.in_(flavor_ids))
+    if exclude:
+        query = query.filter(
+            sa.or_(
+                Ledger.reservation_id.is_(None),
+                Ledger.reservation_id != exclude,
+            )
+        )
+    if not include_maintenance:
+        query = query.filter(Ledger.reservation_id.isnot(None))
+    return query
+
+
+def read_timeline(
+    flavor_id, start=None, end=None, exclude=None, include_maintenance=True
+):
+    """Read the capacity timeline of a flavor from the ledger
+
+    When start is given the change points before it are summed up in the
+    database into the timeline baseline. When end is given only the
+    change points up to it are read, plus the first one after it which
+    closes the segment spanning end.
+
+    exclude - id of a reservation to leave out
+    include_maintenance - when False, leave out maintenance windows
+    """
+    return read_timelines(
+        [flavor_id],
+        start,
+        end,
+        exclude=exclude,
+        include_maintenance=include_maintenance,
+    )[flavor_id]
+
+
+def read_timelines(
+    flavor_ids, start=None, end=None, exclude=None, include_maintenance=True
+):
+    """Read the capacity timelines of several flavors at once
+
+    Works like read_timeline but with a fixed number of queries however
+    many flavors are read. Returns a dict of timelines by flavor id.
+    """
+    if not flavor_ids:
+        return {}
+    baselines = {}
+    if start is not None:
+        is_window = Ledger.reservation_id.is_(None)
+        baselines = {
+            flavor_id: (reserved, blocked)
+            for flavor_id, reserved, blocked in _filtered(
+                db.session.query(
+                    Ledger.flavor_id,
+                    sa.func.sum(sa.case((is_window, 0), else_=Ledger.delta)),
+                    sa.func.sum(sa.case((is_window, Ledger.delta), else_=0)),
+                ),
+                flavor_ids,
+                exclude,
+                include_maintenance,
+            )
+            .filter(Ledger.timestamp < start)
+            .group_by(Ledger.flavor_id)
+        }
+
+    query = _filtered(
+        db.session.query(
+            Ledger.flavor_id,
+            Ledger.timestamp,
+            Ledger.delta,
+            Ledger.reservation_id,
+        ),
+        flavor_ids,
+        exclude,
+        include_maintenance,
+    )
+    if start is not None:
+        query = query.filter(Ledger.timestamp >= start)
+    if end is not None:
+        after_end = (
+            _filtered(
+                db.session.query(
+                    Ledger.flavor_id,
+                    sa.func.min(Ledger.timestamp).label("timestamp"),
+                ),
+                flavor_ids,
+                exclude,
+                include_maintenance,
+            )
+            .filter(Ledger.timestamp > end)
+            .group_by(Ledger.flavor_id)
+            .subquery()
+        )
+        query = query.outerjoin(
+            after_end, after_end.c.flavor_id == Ledger.flavor_id
+        ).filter(
+            Ledger.timestamp <= sa.func.coalesce(after_end.c.timestamp, end)
+        )
+
+    entries = {flavor_id: [] for flavor_id in flavor_ids}
+    for flavor_id, timestamp, delta, reservation_id in query.order_by(
+        Ledger.timestamp, Ledger.id
+    ):
+        entries[flavor_id].append((timestamp, delta, reservation_id))
+    return {
+        flavor_id: availability.Timeline(
+            flavor_entries, *(baselines.get(flavor_id) or (0, 0))
+        )
+        for flavor_id, flavor_entries in entries.items()
+    }
+
+
+def _expected_rows():
+    reservations = db.session.query(models.Reservation).filter(
+        models.Reservation.status.in_(models.Reservation.EFFECTIVE_STATES)
+    )
+    for reservation in reservations.yield_per(1000):
+        yield from Ledger.for_reservation(reservation)
+    for window in db.session.query(models.MaintenanceWindow):
+        yield from Ledger.for_maintenance_window(window)
+
+
+def _row_key(row):
+    return (
+        row.flavor_id,
+        row.reservation_id,
+        row.maintenance_window_id,
+        row.timestamp,
+        row.delta,
+    )
+
+
+def rebuild():
+    """Replace the whole ledger with rows derived from the source tables
+
+    Returns the number of rows written.
+    """
+    db.session.query(Ledger).delete(synchronize_session=False)
+    count = 0
+    for row in _expected_rows():
+        db.session.add(row)
+        count += 1
+    # Invalidate any timeline cached from the previous ledger
+    db.session.query(models.Flavor).update(
+        {models.Flavor.version: models.Flavor.version + 1},
+        synchronize_session=False,
+    )
+    db.session.commit()
+    LOG.info("Rebuilt capacity ledger with %s rows", count)
+    return count
+
+
+def verify():
+    """Compare the ledger with the rows derived from the source tables
+
+    Returns a (missing, unexpected) tuple of lists of row keys, both are
+    empty when the ledger is consistent.
+    """
+    expected = collections.Counter(_row_key(row) for row in _expected_rows())
+    actual = collections.Counter(
+        _row_key(row)
+        for row in db.session.query(
+            Ledger.flavor_id,
+            Ledger.reservation_id,
+            Ledger.maintenance_window_id,
+            Ledger.timestamp,
+            Ledger.delta,
+        )
+    )
+    missing = list((expected - actual).elements())
+    unexpected = list((actual - expected).elements())
+    return missing, unexpected
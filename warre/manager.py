@@ -12,29 +12,80 @@
 #    under the License.
 
 import datetime
-from itertools import chain
-from operator import itemgetter
 
+from oslo_config import cfg
 from oslo_log import log as logging
 
+from warre import availability
 from warre.common import blazar
+from warre.common import cache
 from warre.common import exceptions
+from warre.common import metrics
 from warre.extensions import db
+from warre import ledger
 from warre import models
 from warre.worker import api as worker_api
 
+CONF = cfg.CONF
 LOG = logging.getLogger(__name__)
 
+_MANAGER = None
+
 
 class Manager:
     def __init__(self):
-        self.worker_api = worker_api.WorkerAPI()
-        self.blazar = blazar.BlazarClient()
-
+        self._worker_api = None
+        self._blazar = None
+
+    @property
+    def worker_api(self):
+        if self._worker_api is None:
+            self._worker_api = worker_api.WorkerAPI()
+        return self._worker_api
+
+    @property
+    def blazar(self):
+        if self._blazar is None:
+            self._blazar = blazar.BlazarClient()
+        return self._blazar
+
+    @metrics.timed("create_reservation")
     def create_reservation(
         self, context, reservation, bypass_maintenance=False
     ):
-        flavor = db.session.query(models.Flavor).get(reservation.flavor_id)
+        """Admit a reservation if its flavor has the capacity for it
+
+        Admissions are serialized per flavor by claiming the flavor
+        version the capacity check was made against, see _claim_flavor.
+        When a concurrent write to the flavor wins the race the check is
+        made again against the new state.
+        """
+        for attempt in range(CONF.warre.admission_attempts):
+            db.session.flush()
+            flavor = db.session.query(models.Flavor).get(reservation.flavor_id)
+            version = flavor.version
+            self._check_reservation(
+                context, flavor, reservation, bypass_maintenance
+            )
+            if self._claim_flavor(flavor, version):
+                break
+            LOG.info("Flavor %s changed during admission, retrying", flavor)
+            db.session.rollback()
+        else:
+            raise exceptions.InvalidReservation(
+                "Flavor is busy, please try again"
+            )
+
+        reservation.project_id = context.project_id
+        reservation.user_id = context.user_id
+        db.session.add(reservation)
+        db.session.commit()
+        self.worker_api.create_lease(context, reservation.id)
+        return reservation
+
+    def _check_reservation(
+        self, context, flavor, reservation, bypass_maintenance
+    ):
         if not flavor.active:
             raise exceptions.InvalidReservation("Flavor is not available")
 
@@ -92,6 +143,7 @@ class Manager:
             reservation.end,
             reservation,
             include_maintenance=not bypass_maintenance,
+            instance_count=reservation.instance_count,
         )
 
         if free_slots:
@@ -102,12 +154,25 @@ class Manager:
         else:
             raise exceptions.InvalidReservation("No capacity")
 
-        reservation.project_id = context.project_id
-        reservation.user_id = context.user_id
-        db.session.add(reservation)
-        db.session.commit()
-        self.worker_api.create_lease(context, reservation.id)
-        return reservation
+    def _claim_flavor(self, flavor, version):
+        """Bump the flavor version if it is still the given one
+
+        The UPDATE is a compare and swap, so of several admissions that
+        checked the same flavor version only one can succeed. It also
+        holds the flavor row lock until commit on databases with row
+        locking, admissions for other flavors are not affected.
+
+        Returns False when a concurrent write changed the flavor first.
+        """
+        claimed = (
+            db.session.query(models.Flavor)
+            .filter_by(id=flavor.id, version=version)
+            .update(
+                {models.Flavor.version: models.Flavor.version + 1},
+                synchronize_session=False,
+            )
+        )
+        return claimed == 1
 
     def delete_reservation(self, context, reservation):
         if reservation.lease_id:
@@ -134,32 +199,54 @@ class Manager:
                 f"{reservation.flavor.max_length_hours} hours"
             )
 
-        free_slots = self.flavor_free_slots(
-            context, reservation.flavor, reservation.end, new_end, reservation
-        )
+        for attempt in range(CONF.warre.admission_attempts):
+            db.session.flush()
+            flavor = reservation.flavor
+            version = flavor.version
+            free_slots = self.flavor_free_slots(
+                context,
+                flavor,
+                reservation.end,
+                new_end,
+                reservation,
+                instance_count=reservation.instance_count,
+            )
 
-        if free_slots:
-            f_start = free_slots[0].get("start")
-            f_end = free_slots[0].get("end")
-            if f_start != reservation.end or f_end < new_end:
+            if free_slots:
+                f_start = free_slots[0].get("start")
+                f_end = free_slots[0].get("end")
+                if f_start != reservation.end or f_end < new_end:
+                    raise exceptions.InvalidReservation("No capacity")
+            else:
                 raise exceptions.InvalidReservation("No capacity")
+
+            if self._claim_flavor(flavor, version):
+                break
+            LOG.info("Flavor %s changed during extension, retrying", flavor)
+            db.session.rollback()
         else:
-            raise exceptions.InvalidReservation("No capacity")
+            raise exceptions.InvalidReservation(
+                "Flavor is busy, please try again"
+            )
 
+        # Commit the extension before calling Blazar, so the flavor row
+        # locked by the claim is not held for the round trip
+        old_end = reservation.end
+        lease_id = reservation.lease_id
         reservation.end = new_end
+        db.session.add(reservation)
+        db.session.commit()
 
         try:
-            self.blazar.update_lease(
-                reservation.lease_id, end_date=reservation.end
-            )
+            self.blazar.update_lease(lease_id, end_date=new_end)
         except Exception:
-            LOG.exception("Failed to extend lease %s", reservation.lease_id)
-            raise exceptions.InvalidReservation("Failed to extend lease")
-        else:
-            db.session.add(reservation)
+            LOG.exception("Failed to extend lease %s", lease_id)
+            db.session.rollback()
+            reservation.end = old_end
             db.session.commit()
-            LOG.info("Updated %s", reservation)
-            return reservation
+            raise exceptions.InvalidReservation("Failed to extend lease")
+        LOG.info("Updated %s", reservation)
+        return reservation
 
     def delete_flavor(self, context, flavor):
         reservations = (
@@ -172,6 +259,24 @@ class Manager:
         db.session.delete(flavor)
         db.session.commit()
 
+    def get_timeline(self, flavor):
+        """Get the capacity timeline of a flavor
+
+        Timelines are cached by flavor id and version, any write touching
+        the flavor's reservations or maintenance windows bumps the version.
+        """
+        key = f"warre-timeline-{flavor.id}-{flavor.version}"
+        timeline_cache = cache.get_cache()
+        timeline = timeline_cache.get(key)
+        if timeline is None:
+            timeline = self._load_timeline(flavor)
+            timeline_cache.set(key, timeline)
+        return timeline
+
+    def _load_timeline(self, flavor):
+        return ledger.read_timeline(flavor.id)
+
+    @metrics.timed("flavor_free_slots")
     def flavor_free_slots(
         self,
         context,
@@ -180,126 +285,190 @@ class Manager:
         end,
         reservation=None,
         include_maintenance=True,
+        instance_count=1,
     ):
         """Get the free slots of a flavor
         Algorithm:
         1. Get slots from flavor table as the total resource
         2. Get all reservations of current flavor
-        3. Calculate the free slots
+        3. Sweep their weighted start/end events to find the free slots
+
+        Occupancy change points are read from the capacity ledger. With a
+        timeline cache the flavor's whole timeline is cached, see
+        get_timeline, otherwise only the change points in range are read.
 
         reservation - used to exclude an existing reservation when extending
         include_maintenance - when False, treat maintenance windows as not
             occupying any slots (admin bypass for testing during a window)
+        instance_count - only return slots where this many instances fit
         """
-        if not flavor.active:
+        available = self._available_range(flavor, start, end)
+        if available is None:
             return []
+        start, end = available
+
+        exclude = reservation.id if reservation else None
+        if CONF.capacity_cache.backend == "none":
+            timeline = ledger.read_timeline(
+                flavor.id,
+                start,
+                end,
+                exclude=exclude,
+                include_maintenance=include_maintenance,
+            )
+        else:
+            timeline = self.get_timeline(flavor)
+        events = timeline.events(
+            flavor.slots,
+            exclude=exclude,
+            include_maintenance=include_maintenance,
+        )
+        return availability.free_slots(
+            events, flavor.slots, start, end, instance_count=instance_count
+        )
+
+    def flavor_utilization(self, context, flavor, start, end, resolution=None):
+        """Get the slot occupancy of a flavor over a range
+
+        Uses the same timeline and sweep as flavor_free_slots. Maintenance
+        windows count as occupying all the flavor slots.
+
+        resolution - timedelta to bucket the occupancy by, None for the
+            raw step function
+        Returns a generator of dicts, with start and occupied for the step
+        function or start, peak and mean for buckets.
+        """
+        if CONF.capacity_cache.backend == "none":
+            timeline = ledger.read_timeline(flavor.id, start, end)
+        else:
+            timeline = self.get_timeline(flavor)
+        steps = availability.occupancy(
+            timeline.events(flavor.slots), start, end
+        )
+        if resolution is None:
+            return (
+                {"start": point, "occupied": occupied}
+                for point, occupied in steps
+            )
+        return (
+            {"start": point, "peak": peak, "mean": mean}
+            for point, peak, mean in availability.buckets(
+                steps, start, end, resolution
+            )
+        )
+
+    def flavor_next_slot(
+        self, context, flavor, duration, instance_count=1, not_before=None
+    ):
+        """Find the earliest slot of a duration for some instances
+
+        The flavor's timeline is swept from not_before, or now, up to the
+        flavor end until a long enough gap with room for instance_count
+        instances is found. Maintenance windows block the whole flavor.
+
+        Returns a dict with the slot start and end, or None when there is
+        no such slot.
+        """
+        if duration > datetime.timedelta(hours=flavor.max_length_hours):
+            raise exceptions.InvalidReservation(
+                "Reservation is too long, max allowed is "
+                f"{flavor.max_length_hours} hours"
+            )
+
+        now = datetime.datetime.utcnow().replace(second=0, microsecond=0)
+        start = max(not_before, now) if not_before else now
+        available = self._available_range(
+            flavor, start, flavor.end or datetime.datetime.max
+        )
+        if available is None:
+            return None
+        start, end = available
+
+        if CONF.capacity_cache.backend == "none":
+            timeline = ledger.read_timeline(flavor.id, start, flavor.end)
+        else:
+            timeline = self.get_timeline(flavor)
+        slot_start = availability.next_slot(
+            timeline.events(flavor.slots),
+            flavor.slots,
+            instance_count,
+            duration,
+            start,
+            end if flavor.end else None,
+        )
+        if slot_start is None:
+            return None
+        return {"start": slot_start, "end": slot_start + duration}
+
+    def flavors_free_slots(
+        self, context, flavors, start, end, instance_count=1
+    ):
+        """Get the free slots of several flavors at once
+
+        The timelines of all the flavors are read from the capacity ledger
+        in a fixed number of queries, see ledger.read_timelines.
+
+        instance_count - only return slots where this many instances fit
+
+        Returns a dict of free slots by flavor id.
+        """
+        ranges = {
+            flavor.id: self._available_range(flavor, start, end)
+            for flavor in flavors
+        }
+        timelines = ledger.read_timelines(
+            [flavor_id for flavor_id, r in ranges.items() if r is not None],
+            start,
+            end,
+        )
+        free_slots = {}
+        for flavor in flavors:
+            if ranges[flavor.id] is None:
+                free_slots[flavor.id] = []
+                continue
+            flavor_start, flavor_end = ranges[flavor.id]
+            free_slots[flavor.id] = availability.free_slots(
+                timelines[flavor.id].events(flavor.slots),
+                flavor.slots,
+                flavor_start,
+                flavor_end,
+                instance_count=instance_count,
+            )
+        return free_slots
+
+    def _available_range(self, flavor, start, end):
+        """Clamp a range to the flavor's lifetime
+
+        Returns a (start, end) tuple, or None when the flavor can't be
+        reserved at all.
+        """
+        if not flavor.active:
+            return None
 
         now = datetime.datetime.utcnow()
         if flavor.end and flavor.end < now:
-            return []
+            return None
 
         if flavor.start and flavor.start > start:
             start = flavor.start
 
         if flavor.end and flavor.end < end:
             end = flavor.end
+        return start, end
 
-        query = (
-            db.session.query(models.Reservation)
-            .filter(models.Reservation.end >= start)
-            .filter(models.Reservation.start <= end)
-            .filter(
-                models.Reservation.status.in_(
-                    (
-                        models.Reservation.ALLOCATED,
-                        models.Reservation.ACTIVE,
-                        models.Reservation.PENDING_CREATE,
-                    )
-                )
-            )
-            .filter_by(flavor_id=flavor.id)
-        )
-        if reservation:
-            query = query.filter(models.Reservation.id != reservation.id)
-        reservations = query.all()
 
-        if include_maintenance:
-            maintenance_windows = (
-                db.session.query(models.MaintenanceWindow)
-                .filter(models.MaintenanceWindow.end >= start)
-                .filter(models.MaintenanceWindow.start <= end)
-                .filter(
-                    models.MaintenanceWindow.flavors.any(
-                        models.Flavor.id == flavor.id
-                    )
-                )
-                .all()
-            )
-        else:
-            maintenance_windows = []
-
-        # the real thing begins here
-        # Pass 1: segmentation and marking
-        # out every start, end date into a list
-        used_slots = []
-        for r in reservations:
-            # Treat multi instance as just multiple slots
-            for i in range(0, r.instance_count):
-                used_slots.append([(r.start, "start"), (r.end, "end")])
-
-        # Treat each maintenance window as fully occupying all slots
-        for window in maintenance_windows:
-            for i in range(flavor.slots):
-                used_slots.append(
-                    [(window.start, "start"), (window.end, "end")]
-                )
+def get_manager():
+    """Get the process wide manager
 
-        time_list = list(chain.from_iterable(used_slots))
-        # sort on time
-        time_list.sort(key=itemgetter(0))
-        segments = []
-        current_slot = 0
-        last_point = None
-        for point, kind in time_list:
-            if last_point is not None:
-                segments.append(
-                    {"start": last_point, "end": point, "slot": current_slot}
-                )
-            # update last_point
-            last_point = point
-            # adjust current slot
-            current_slot = (
-                current_slot + 1 if kind == "start" else current_slot - 1
-            )
-        # Pass2: only keep slot >= maximum capacity, a.k.a. busy slots
-        busy_slots = [s for s in segments if s["slot"] >= flavor.slots]
-
-        if len(busy_slots) == 0:
-            return [{"start": start, "end": end}]
-        free_slots = []
-        start_free = start
-        # Pass3: remove busy slots
-        for s in busy_slots:
-            if s["start"] <= start <= s["end"]:
-                start_free = s["end"]
-            else:
-                diff = (s["start"] - start_free).total_seconds()
-                if start_free < s["start"] and diff > 60:
-                    if start_free != start:
-                        start_free += datetime.timedelta(seconds=60)
-                    free_slots.append(
-                        {
-                            "start": start_free,
-                            "end": (
-                                s["start"] - datetime.timedelta(seconds=1)
-                            ).replace(second=0),
-                        }
-                    )
-                start_free = s["end"]
-        # add the last one
-        if start_free < end:
-            if start_free != start:
-                start_free += datetime.timedelta(seconds=60)
-            free_slots.append({"start": start_free, "end": end})
+    The manager holds no request state, sharing it means the RPC and
+    Blazar clients are only built once, when first used.
+    """
+    global _MANAGER
+    if _MANAGER is None:
+        _MANAGER = Manager()
+    return _MANAGER
 
-        return free_slots
+
+def reset():
+    global _MANAGER
+    _MANAGER = None
@@ -0,0 +1,80 @@
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Add reservation archive
+
+Revision ID: a1c7e5d93f62
+Revises: f4a6c2e8b015
+Create Date: 2026-10-18 16:21:48.310257
+
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "a1c7e5d93f62"
+down_revision = "f4a6c2e8b015"
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        "reservation_archive",
+        sa.Column("id", sa.String(length=64), nullable=False),
+        sa.Column("created_at", sa.DateTime(), nullable=False),
+        sa.Column("user_id", sa.String(length=64), nullable=False),
+        sa.Column("project_id", sa.String(length=64), nullable=False),
+        sa.Column("flavor_id", sa.String(length=64), nullable=False),
+        sa.Column("lease_id", sa.String(length=64), nullable=True),
+        sa.Column("compute_flavor", sa.String(length=64), nullable=True),
+        sa.Column("status", sa.String(length=16), nullable=False),
+        sa.Column("start", sa.DateTime(), nullable=False),
+        sa.Column("end", sa.DateTime(), nullable=False),
+        sa.Column("instance_count", sa.Integer(), nullable=False),
+        sa.Column("status_reason", sa.String(length=255), nullable=True),
+        sa.Column("archived_at", sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index(
+        "ix_reservation_archive_end_id",
+        "reservation_archive",
+        ["end", "id"],
+    )
+    op.create_index(
+        "ix_reservation_archive_project_id_end",
+        "reservation_archive",
+        ["project_id", "end"],
+    )
+    op.create_index(
+        op.f("ix_reservation_archive_flavor_id"),
+        "reservation_archive",
+        ["flavor_id"],
+    )
+
+
+def downgrade():
+    op.drop_index(
+        op.f("ix_reservation_archive_flavor_id"),
+        table_name="reservation_archive",
+    )
+    op.drop_index(
+        "ix_reservation_archive_project_id_end",
+        table_name="reservation_archive",
+    )
+    op.drop_index(
+        "ix_reservation_archive_end_id", table_name="reservation_archive"
+    )
+    op.drop_table("reservation_archive")
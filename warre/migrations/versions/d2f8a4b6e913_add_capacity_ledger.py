@@ -0,0 +1,138 @@
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Add capacity ledger
+
+Revision ID: d2f8a4b6e913
+Revises: c5e1f0a9d2b7
+Create Date: 2026-10-18 11:03:27.904512
+
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = "d2f8a4b6e913"
+down_revision = "c5e1f0a9d2b7"
+branch_labels = None
+depends_on = None
+
+
+EFFECTIVE_STATES = ("ALLOCATED", "ACTIVE", "PENDING_CREATE")
+
+
+def upgrade():
+    op.create_table(
+        "capacity_ledger",
+        sa.Column("id", sa.Integer(), autoincrement=True, nullable=False),
+        sa.Column("flavor_id", sa.String(length=64), nullable=False),
+        sa.Column("reservation_id", sa.String(length=64), nullable=True),
+        sa.Column(
+            "maintenance_window_id", sa.String(length=64), nullable=True
+        ),
+        sa.Column("timestamp", sa.DateTime(), nullable=False),
+        sa.Column("delta", sa.Integer(), nullable=False),
+        sa.ForeignKeyConstraint(
+            ["flavor_id"], ["flavor.id"], ondelete="CASCADE"
+        ),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.create_index(
+        "ix_capacity_ledger_flavor_id_timestamp",
+        "capacity_ledger",
+        ["flavor_id", "timestamp"],
+    )
+    op.create_index(
+        op.f("ix_capacity_ledger_reservation_id"),
+        "capacity_ledger",
+        ["reservation_id"],
+    )
+    op.create_index(
+        op.f("ix_capacity_ledger_maintenance_window_id"),
+        "capacity_ledger",
+        ["maintenance_window_id"],
+    )
+
+    ledger = sa.table(
+        "capacity_ledger",
+        sa.column("flavor_id"),
+        sa.column("reservation_id"),
+        sa.column("maintenance_window_id"),
+        sa.column("timestamp"),
+        sa.column("delta"),
+    )
+    reservation = sa.table(
+        "reservation",
+        sa.column("id"),
+        sa.column("flavor_id"),
+        sa.column("start"),
+        sa.column("end"),
+        sa.column("status"),
+        sa.column("instance_count"),
+    )
+    window = sa.table(
+        "maintenance_window",
+        sa.column("id"),
+        sa.column("start"),
+        sa.column("end"),
+    )
+    window_flavor = sa.table(
+        "maintenance_window_flavor",
+        sa.column("maintenance_window_id"),
+        sa.column("flavor_id"),
+    )
+    reservation_cols = ["flavor_id", "reservation_id", "timestamp", "delta"]
+    window_cols = ["flavor_id", "maintenance_window_id", "timestamp", "delta"]
+    effective = reservation.c.status.in_(EFFECTIVE_STATES)
+    joined = window.join(
+        window_flavor, window_flavor.c.maintenance_window_id == window.c.id
+    )
+    for column, sign in (("start", 1), ("end", -1)):
+        op.execute(
+            ledger.insert().from_select(
+                reservation_cols,
+                sa.select(
+                    reservation.c.flavor_id,
+                    reservation.c.id,
+                    reservation.c[column],
+                    reservation.c.instance_count * sign,
+                ).where(effective),
+            )
+        )
+        op.execute(
+            ledger.insert().from_select(
+                window_cols,
+                sa.select(
+                    window_flavor.c.flavor_id,
+                    window.c.id,
+                    window.c[column],
+                    sa.literal(sign),
+                ).select_from(joined),
+            )
+        )
+
+
+def downgrade():
+    op.drop_index(
+        op.f("ix_capacity_ledger_maintenance_window_id"),
+        table_name="capacity_ledger",
+    )
+    op.drop_index(
+        op.f("ix_capacity_ledger_reservation_id"), table_name="capacity_ledger"
+    )
+    op.drop_index(
+        "ix_capacity_ledger_flavor_id_timestamp", table_name="capacity_ledger"
+    )
+    op.drop_table("capacity_ledger")
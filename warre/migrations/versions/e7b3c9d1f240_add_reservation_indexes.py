@@ -0,0 +1,51 @@
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Add reservation indexes
+
+Revision ID: e7b3c9d1f240
+Revises: d2f8a4b6e913
+Create Date: 2026-10-18 14:22:05.117342
+
+"""
+
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = "e7b3c9d1f240"
+down_revision = "d2f8a4b6e913"
+branch_labels = None
+depends_on = None
+
+
+INDEXES = [
+    (
+        "ix_reservation_flavor_id_status_start",
+        ["flavor_id", "status", "start"],
+    ),
+    ("ix_reservation_project_id_status", ["project_id", "status"]),
+    ("ix_reservation_status_end", ["status", "end"]),
+    ("ix_reservation_created_at_id", ["created_at", "id"]),
+    ("ix_reservation_lease_id", ["lease_id"]),
+]
+
+
+def upgrade():
+    for name, columns in INDEXES:
+        op.create_index(name, "reservation", columns)
+
+
+def downgrade():
+    for name, columns in INDEXES:
+        op.drop_index(name, table_name="reservation")
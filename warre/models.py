@@ -12,11 +12,17 @@
 #    under the License.
 
 import datetime
+import itertools
 import math
 
 from oslo_config import cfg
 from oslo_log import log
 from oslo_utils import uuidutils
+import sqlalchemy as sa
+from sqlalchemy.ext import compiler
+from sqlalchemy.ext import hybrid
+from sqlalchemy import orm
+from sqlalchemy.sql import expression
 
 from warre.common import exceptions
 from warre.extensions import db
@@ -26,6 +32,44 @@ CONF = cfg.CONF
 LOG = log.getLogger(__name__)
 
 
+class hours_between(expression.FunctionElement):
+    """Whole hours from start to end rounded up, as an SQL expression"""
+
+    type = sa.Integer()
+    inherit_cache = True
+    name = "hours_between"
+
+
+def _bounds(element, sql_compiler, **kw):
+    start, end = list(element.clauses)
+    return sql_compiler.process(start, **kw), sql_compiler.process(end, **kw)
+
+
+@compiler.compiles(hours_between)
+def _hours_between_default(element, sql_compiler, **kw):
+    start, end = _bounds(element, sql_compiler, **kw)
+    return (
+        f"CAST(CEIL(EXTRACT(EPOCH FROM ({end} - {start})) / 3600) AS INTEGER)"
+    )
+
+
+@compiler.compiles(hours_between, "mysql")
+def _hours_between_mysql(element, sql_compiler, **kw):
+    start, end = _bounds(element, sql_compiler, **kw)
+    return f"CEIL(TIMESTAMPDIFF(MICROSECOND, {start}, {end}) / 3600000000)"
+
+
+@compiler.compiles(hours_between, "sqlite")
+def _hours_between_sqlite(element, sql_compiler, **kw):
+    # Integer milliseconds, julianday floats are not exact. SQLite has
+    # no CEIL before 3.35, round up with integer division instead.
+    start, end = _bounds(element, sql_compiler, **kw)
+    return (
+        f"((CAST(ROUND((julianday({end}) - julianday({start})) * 86400000) "
+        "AS INTEGER) + 3599999) / 3600000)"
+    )
+
+
 class Flavor(db.Model):
     id = db.Column(db.String(64), primary_key=True)
     name = db.Column(db.String(64), nullable=False)
@@ -44,6 +88,9 @@ class Flavor(db.Model):
     end = db.Column(db.DateTime())
     category = db.Column(db.String(64))
     availability_zone = db.Column(db.String(64))
+    # Bumped whenever the flavor, its reservations, maintenance windows
+    # or project access change. Keys cached capacity timelines.
+    version = db.Column(db.Integer, nullable=False, default=0)
     projects = db.relationship(
         "FlavorProject",
         back_populates="flavor",
@@ -153,7 +200,26 @@ class Reservation(db.Model):
     ALLOCATED = "ALLOCATED"
     ACTIVE = "ACTIVE"
     COMPLETE = "COMPLETE"
+    # States in which a reservation occupies flavor capacity
+    EFFECTIVE_STATES = (ALLOCATED, ACTIVE, PENDING_CREATE)
+    # States a reservation never leaves, archived once old enough
+    FINISHED_STATES = (COMPLETE, ERROR)
 
+    __table_args__ = (
+        # Overlapping reservations of a flavor
+        db.Index(
+            "ix_reservation_flavor_id_status_start",
+            "flavor_id",
+            "status",
+            "start",
+        ),
+        # Quota usage
+        db.Index("ix_reservation_project_id_status", "project_id", "status"),
+        # Periodic tasks finding reservations that ended
+        db.Index("ix_reservation_status_end", "status", "end"),
+        # Marker pagination
+        db.Index("ix_reservation_created_at_id", "created_at", "id"),
+    )
     id = db.Column(db.String(64), primary_key=True)
     created_at = db.Column(db.DateTime(), nullable=False)
     user_id = db.Column(db.String(64), nullable=False)
@@ -162,7 +228,7 @@ class Reservation(db.Model):
         db.String(64), db.ForeignKey(Flavor.id), nullable=False
     )
     flavor = db.relationship("Flavor")
-    lease_id = db.Column(db.String(64))
+    lease_id = db.Column(db.String(64), index=True)
     compute_flavor = db.Column(db.String(64))
     status = db.Column(db.String(16), nullable=False)
     start = db.Column(db.DateTime(), nullable=False)
@@ -187,7 +253,259 @@ class Reservation(db.Model):
     def __repr__(self):
         return f"<Reservation '{self.id}')>"
 
-    @property
+    @hybrid.hybrid_property
     def total_hours(self):
         length_seconds = (self.end - self.start).total_seconds()
         return math.ceil(length_seconds / 60 / 60)
+
+    @total_hours.inplace.expression
+    @classmethod
+    def _total_hours_expression(cls):
+        return hours_between(cls.start, cls.end)
+
+
+class ReservationArchive(db.Model):
+    """Finished reservations moved out of the reservation table
+
+    Has the columns of Reservation plus when the row was archived. There
+    is no foreign key to the flavor so flavors can still be deleted.
+    """
+
+    __table_args__ = (
+        # Cursor pagination
+        db.Index("ix_reservation_archive_end_id", "end", "id"),
+        # Usage reporting per project
+        db.Index("ix_reservation_archive_project_id_end", "project_id", "end"),
+    )
+    id = db.Column(db.String(64), primary_key=True)
+    created_at = db.Column(db.DateTime(), nullable=False)
+    user_id = db.Column(db.String(64), nullable=False)
+    project_id = db.Column(db.String(64), nullable=False)
+    flavor_id = db.Column(db.String(64), nullable=False, index=True)
+    lease_id = db.Column(db.String(64))
+    compute_flavor = db.Column(db.String(64))
+    status = db.Column(db.String(16), nullable=False)
+    start = db.Column(db.DateTime(), nullable=False)
+    end = db.Column(db.DateTime(), nullable=False)
+    instance_count = db.Column(db.Integer(), nullable=False)
+    status_reason = db.Column(db.String(255))
+    archived_at = db.Column(db.DateTime(), nullable=False)
+
+    def __repr__(self):
+        return f"<ReservationArchive '{self.id}'>"
+
+
+class CapacityLedger(db.Model):
+    """Occupancy change points of a flavor
+
+    A reservation in an effective state has a +instance_count row at its
+    start and a -instance_count row at its end. A maintenance window has
+    +1/-1 rows for every flavor it covers, meaning the whole flavor is
+    unavailable.
+    """
+
+    __table_args__ = (
+        db.Index(
+            "ix_capacity_ledger_flavor_id_timestamp", "flavor_id", "timestamp"
+        ),
+    )
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    flavor_id = db.Column(
+        db.String(64),
+        db.ForeignKey(Flavor.id, ondelete="CASCADE"),
+        nullable=False,
+    )
+    reservation_id = db.Column(db.String(64), index=True)
+    maintenance_window_id = db.Column(db.String(64), index=True)
+    timestamp = db.Column(db.DateTime(), nullable=False)
+    delta = db.Column(db.Integer, nullable=False)
+
+    def __init__(
+        self,
+        flavor_id,
+        timestamp,
+        delta,
+        reservation_id=None,
+        maintenance_window_id=None,
+    ):
+        self.flavor_id = flavor_id
+        self.timestamp = timestamp
+        self.delta = delta
+        self.reservation_id = reservation_id
+        self.maintenance_window_id = maintenance_window_id
+
+    def __repr__(self):
+        return f"<CapacityLedger '{self.flavor_id}', '{self.timestamp}'>"
+
+    @classmethod
+    def for_reservation(cls, reservation):
+        if reservation.status not in Reservation.EFFECTIVE_STATES:
+            return []
+        return [
+            cls(
+                reservation.flavor_id,
+                reservation.start,
+                reservation.instance_count,
+                reservation_id=reservation.id,
+            ),
+            cls(
+                reservation.flavor_id,
+                reservation.end,
+                -reservation.instance_count,
+                reservation_id=reservation.id,
+            ),
+        ]
+
+    @classmethod
+    def for_maintenance_window(cls, window):
+        rows = []
+        for flavor in window.flavors:
+            rows.append(
+                cls(
+                    flavor.id, window.start, 1, maintenance_window_id=window.id
+                )
+            )
+            rows.append(
+                cls(flavor.id, window.end, -1, maintenance_window_id=window.id)
+            )
+        return rows
+
+
+class TaskLock(db.Model):
+    """Lease on a periodic task, held by one worker until it expires"""
+
+    name = db.Column(db.String(64), primary_key=True)
+    holder = db.Column(db.String(255), nullable=False)
+    expires = db.Column(db.DateTime(), nullable=False)
+
+    def __init__(self, name, holder, expires):
+        self.name = name
+        self.holder = holder
+        self.expires = expires
+
+    def __repr__(self):
+        return f"<TaskLock '{self.name}', '{self.holder}'>"
+
+
+class UserNotification(db.Model):
+    """A user notification waiting to be sent
+
+    Queued in the transaction that changes the reservation and sent by
+    the worker later. next_attempt is when the notification is due, it
+    is cleared once it is sent or given up on. A reservation event is
+    only queued once.
+    """
+
+    __table_args__ = (db.UniqueConstraint("reservation_id", "event"),)
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    reservation_id = db.Column(db.String(64), nullable=False)
+    event = db.Column(db.String(16), nullable=False)
+    created_at = db.Column(db.DateTime(), nullable=False)
+    next_attempt = db.Column(db.DateTime(), index=True)
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    sent_at = db.Column(db.DateTime())
+    last_error = db.Column(db.String(255))
+
+    def __init__(self, reservation_id, event):
+        self.reservation_id = reservation_id
+        self.event = event
+        self.created_at = datetime.datetime.utcnow()
+        self.next_attempt = self.created_at
+        self.attempts = 0
+
+    def __repr__(self):
+        return f"<UserNotification '{self.reservation_id}', '{self.event}'>"
+
+
+LEDGER_RESERVATION_FIELDS = (
+    "flavor_id",
+    "start",
+    "end",
+    "status",
+    "instance_count",
+)
+LEDGER_WINDOW_FIELDS = ("start", "end", "flavors")
+
+
+def _has_changes(obj, fields):
+    attrs = sa.inspect(obj).attrs
+    return any(attrs[field].history.has_changes() for field in fields)
+
+
+def _touched_flavor_ids(session):
+    flavor_ids = set()
+    dirty = [obj for obj in session.dirty if session.is_modified(obj)]
+    flavor_ids.update(obj.id for obj in dirty if isinstance(obj, Flavor))
+    for obj in itertools.chain(session.new, dirty, session.deleted):
+        if isinstance(obj, (Reservation, FlavorProject)):
+            flavor_ids.add(obj.flavor_id)
+            flavor_ids.update(
+                sa.inspect(obj).attrs.flavor_id.history.deleted or ()
+            )
+        elif isinstance(obj, MaintenanceWindow):
+            history = sa.inspect(obj).attrs.flavors.history
+            flavor_ids.update(
+                f.id for f in itertools.chain(history.sum(), obj.flavors)
+            )
+    flavor_ids.discard(None)
+    return flavor_ids
+
+
+@sa.event.listens_for(orm.Session, "before_flush")
+def _bump_flavor_versions(session, flush_context, instances):
+    with session.no_autoflush:
+        for flavor_id in _touched_flavor_ids(session):
+            flavor = session.get(Flavor, flavor_id)
+            if flavor is None or flavor in session.deleted:
+                continue
+            flavor.version = Flavor.version + 1
+
+
+@sa.event.listens_for(orm.Session, "before_flush")
+def _update_capacity_ledger(session, flush_context, instances):
+    """Keep capacity_ledger in step with reservations and windows
+
+    Runs as part of every flush so the ledger is written in the same
+    transaction as the change that caused it.
+    """
+    stale_reservations = set()
+    stale_windows = set()
+    stale_flavors = set()
+    rows = []
+    with session.no_autoflush:
+        for obj in session.new:
+            if isinstance(obj, Reservation):
+                rows.extend(CapacityLedger.for_reservation(obj))
+            elif isinstance(obj, MaintenanceWindow):
+                rows.extend(CapacityLedger.for_maintenance_window(obj))
+        for obj in session.dirty:
+            if isinstance(obj, Reservation):
+                if _has_changes(obj, LEDGER_RESERVATION_FIELDS):
+                    stale_reservations.add(obj.id)
+                    rows.extend(CapacityLedger.for_reservation(obj))
+            elif isinstance(obj, MaintenanceWindow):
+                if _has_changes(obj, LEDGER_WINDOW_FIELDS):
+                    stale_windows.add(obj.id)
+                    rows.extend(CapacityLedger.for_maintenance_window(obj))
+        for obj in session.deleted:
+            if isinstance(obj, Reservation):
+                stale_reservations.add(obj.id)
+            elif isinstance(obj, MaintenanceWindow):
+                stale_windows.add(obj.id)
+            elif isinstance(obj, Flavor):
+                stale_flavors.add(obj.id)
+
+        ledger = session.query(CapacityLedger)
+        if stale_reservations:
+            ledger.filter(
+                CapacityLedger.reservation_id.in_(stale_reservations)
+            ).delete(synchronize_session="fetch")
+        if stale_windows:
+            ledger.filter(
+                CapacityLedger.maintenance_window_id.in_(stale_windows)
+            ).delete(synchronize_session="fetch")
+        if stale_flavors:
+            ledger.filter(CapacityLedger.flavor_id.in_(stale_flavors)).delete(
+                synchronize_session="fetch"
+            )
+    session.add_all(rows)
@@ -16,14 +16,16 @@ import functools
 from oslo_config import cfg
 from oslo_log import log as logging
 import oslo_messaging as messaging
+from oslo_utils import timeutils
 from sqlalchemy import exc as s_exc
 
 from warre import app
+from warre.common import metrics
 from warre.common import notifications
 from warre.common import rpc
 from warre.extensions import db
 from warre import models
-from warre.notification import user
+from warre.notification import outbox
 
 
 CONF = cfg.CONF
@@ -59,11 +61,22 @@ class NotificationEndpoints:
                 LOG.debug("Received unhandled event %s", event_type)
                 return
             self._handle_event(ctxt, traits["lease_id"], event)
+            self._observe_lag(payload[0].get("generated"), event)
         except Exception:
             LOG.exception("Unable to handle notification: %s", payload)
 
         return messaging.NotificationResult.HANDLED
 
+    @staticmethod
+    def _observe_lag(generated, event):
+        if not generated:
+            return
+        lag = timeutils.utcnow() - timeutils.normalize_time(
+            timeutils.parse_isotime(generated)
+        )
+        metrics.LEASE_EVENT_LAG.labels(event).observe(lag.total_seconds())
+
+    @metrics.timed("handle_lease_event")
     @app_context
     def _handle_event(self, ctxt, lease_id, event):
         try:
@@ -91,7 +104,9 @@ class NotificationEndpoints:
             if status:
                 reservation.status = status
                 db.session.add(reservation)
-                db.session.commit()
+            outbox.queue(reservation, event)
+            db.session.commit()
+            if status:
                 self.notifier.info(
                     ctxt,
                     f"warre.reservation.{event}",
@@ -100,5 +115,3 @@ class NotificationEndpoints:
                 LOG.info(
                     "Updated reservation %s to %s", reservation.id, status
                 )
-
-            user.send_message(reservation, event)
@@ -0,0 +1,168 @@
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+from concurrent import futures
+import datetime
+
+from oslo_config import cfg
+from oslo_log import log as logging
+from sqlalchemy import exc as sa_exc
+
+from warre.extensions import db
+from warre import models
+from warre.notification import user
+
+
+CONF = cfg.CONF
+LOG = logging.getLogger(__name__)
+
+# Notifications sent per run of deliver
+BATCH_SIZE = 100
+# Seconds a claimed notification is left to the worker that claimed it,
+# after which another worker may send it
+CLAIM_TIME = 300
+
+Notification = models.UserNotification
+
+
+def queue(reservation, event):
+    """Queue a user notification in the current transaction
+
+    The notification is sent by the worker once the transaction is
+    committed. Does nothing when the event of the reservation has
+    already been queued, also by a concurrent transaction: the insert
+    is made in a savepoint so a duplicate only rolls that back, not the
+    changes it is queued with.
+    """
+    # Flush pending changes first, so their errors are not taken for a
+    # duplicate
+    db.session.flush()
+    notification = Notification(reservation.id, event)
+    try:
+        with db.session.begin_nested():
+            db.session.add(notification)
+    except sa_exc.IntegrityError:
+        LOG.debug("%s notification of %s already queued", event, reservation)
+        return None
+    return notification
+
+
+def _claim(now, limit):
+    """Claim due notifications so no other worker sends them
+
+    Each notification is claimed by moving its next_attempt forward,
+    only if no other worker has done so first.
+    """
+    due = (
+        db.session.query(Notification.id, Notification.next_attempt)
+        .filter(Notification.next_attempt <= now)
+        .order_by(Notification.next_attempt)
+        .limit(limit)
+        .all()
+    )
+    claimed_until = now + datetime.timedelta(seconds=CLAIM_TIME)
+    claimed = []
+    for notification_id, next_attempt in due:
+        updated = (
+            db.session.query(Notification)
+            .filter_by(id=notification_id, next_attempt=next_attempt)
+            .update(
+                {Notification.next_attempt: claimed_until},
+                synchronize_session=False,
+            )
+        )
+        if updated:
+            claimed.append(notification_id)
+    db.session.commit()
+    return claimed
+
+
+def deliver():
+    """Send the due user notifications
+
+    Up to user_notification_concurrency notifications are sent at once.
+    A failed notification is retried with an exponential backoff, and
+    given up on after user_notification_max_attempts. Notifications are
+    marked sent after they were sent, so one is sent again if the worker
+    dies in between.
+
+    Returns the number of notifications sent.
+    """
+    claimed = _claim(datetime.datetime.utcnow(), BATCH_SIZE)
+    if not claimed:
+        return 0
+
+    notifications = (
+        db.session.query(Notification)
+        .filter(Notification.id.in_(claimed))
+        .all()
+    )
+    reservations = {
+        r.id: r
+        for r in db.session.query(models.Reservation).filter(
+            models.Reservation.id.in_(
+                {n.reservation_id for n in notifications}
+            )
+        )
+    }
+    # Load the driver before sharing it between threads
+    user.get_notifier()
+
+    def send(notification):
+        reservation = reservations.get(notification.reservation_id)
+        if reservation is None:
+            return "Reservation not found"
+        try:
+            user.send_message(reservation, notification.event)
+        except Exception as e:
+            LOG.warning("Failed to send %s: %s", notification, e)
+            return str(e) or e.__class__.__name__
+        return None
+
+    with futures.ThreadPoolExecutor(
+        max_workers=min(
+            CONF.worker.user_notification_concurrency, len(notifications)
+        )
+    ) as executor:
+        errors = list(executor.map(send, notifications))
+
+    now = datetime.datetime.utcnow()
+    sent = 0
+    for notification, error in zip(notifications, errors):
+        notification.attempts += 1
+        if error is None:
+            notification.sent_at = now
+            notification.next_attempt = None
+            sent += 1
+            continue
+        notification.last_error = error[:255]
+        if (
+            notification.reservation_id not in reservations
+            or notification.attempts
+            >= CONF.worker.user_notification_max_attempts
+        ):
+            LOG.error(
+                "Giving up on %s after %s attempts: %s",
+                notification,
+                notification.attempts,
+                error,
+            )
+            notification.next_attempt = None
+        else:
+            delay = CONF.worker.user_notification_retry_delay * 2 ** (
+                notification.attempts - 1
+            )
+            notification.next_attempt = now + datetime.timedelta(seconds=delay)
+    db.session.commit()
+    LOG.info("Sent %s of %s user notifications", sent, len(notifications))
+    return sent
@@ -26,23 +26,66 @@ CONF = cfg.CONF
 LOG = logging.getLogger(__name__)
 
 
+TEMPLATE_DIR = os.path.realpath(
+    os.path.join(os.path.dirname(__file__), "../", "templates")
+)
+
+_NOTIFIER = None
+_ENVIRONMENT = None
+
+
+def get_notifier():
+    """Return the user notifier driver, loaded once per process"""
+    global _NOTIFIER
+    if _NOTIFIER is None:
+        _NOTIFIER = stevedore_driver.DriverManager(
+            namespace="warre.user.notifier",
+            name=CONF.warre.user_notifier,
+            invoke_on_load=True,
+        ).driver
+    return _NOTIFIER
+
+
+def get_environment():
+    """Return the template environment shared by all notifiers
+
+    Templates are compiled on first use and kept, the files are not
+    checked for changes.
+    """
+    global _ENVIRONMENT
+    if _ENVIRONMENT is None:
+        bytecode_cache = None
+        if CONF.warre.template_cache_dir:
+            bytecode_cache = jinja2.FileSystemBytecodeCache(
+                CONF.warre.template_cache_dir
+            )
+        LOG.debug("Using template_dir %s", TEMPLATE_DIR)
+        _ENVIRONMENT = jinja2.Environment(
+            loader=jinja2.FileSystemLoader(TEMPLATE_DIR),
+            autoescape=jinja2.select_autoescape(["tmpl", "html"]),
+            auto_reload=False,
+            bytecode_cache=bytecode_cache,
+        )
+    return _ENVIRONMENT
+
+
+def reset():
+    global _NOTIFIER, _ENVIRONMENT
+    _NOTIFIER = None
+    _ENVIRONMENT = None
+
+
 def send_message(reservation, event):
     handled_events = ["create", "start", "end", "before_end"]
     if event not in handled_events:
         LOG.error("Event %s not handled by user notifications", event)
 
-    notifier = stevedore_driver.DriverManager(
-        namespace="warre.user.notifier",
-        name=CONF.warre.user_notifier,
-        invoke_on_load=True,
-    ).driver
-
-    notifier.send_message(reservation, event)
+    get_notifier().send_message(reservation, event)
 
 
 class UserNotifierBase:
     def __init__(self):
-        ks_session = keystone.KeystoneSession().get_session()
+        ks_session = keystone.get_session()
         self.ks_client = clients.get_admin_keystoneclient(ks_session)
 
     def send_message(self, reservation, status):
@@ -50,17 +93,8 @@ class UserNotifierBase:
 
     @staticmethod
     def render_template(tmpl, context={}):
-        template_dir = os.path.realpath(
-            os.path.join(os.path.dirname(__file__), "../", "templates")
-        )
-        LOG.debug("Using template_dir %s", template_dir)
-        env = jinja2.Environment(
-            loader=jinja2.FileSystemLoader(template_dir),
-            autoescape=jinja2.select_autoescape(["tmpl", "html"]),
-        )
-        template = env.get_template(tmpl)
-        template = template.render(context)
-        return template
+        template = get_environment().get_template(tmpl)
+        return template.render(context)
 
     def get_user(self, reservation):
         user = reservation.user_id
@@ -69,9 +103,18 @@ class UserNotifierBase:
 
 
 class TaynacNotifier(UserNotifierBase):
+    def __init__(self):
+        super().__init__()
+        self._taynac = None
+
+    @property
+    def taynac(self):
+        if self._taynac is None:
+            self._taynac = clients.get_taynacclient(keystone.get_session())
+        return self._taynac
+
     def send_message(self, reservation, event):
-        k_session = keystone.KeystoneSession().get_session()
-        taynac = clients.get_taynacclient(k_session)
+        taynac = self.taynac
 
         template_name = f"{event}.tmpl"
         user = self.get_user(reservation)
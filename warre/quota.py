@@ -11,43 +11,71 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import time
+
+from oslo_config import cfg
 from oslo_limit import limit
+import sqlalchemy as sa
 
 from warre.extensions import db
 from warre import models
 
 
-EFFECTIVE_STATES = (
-    models.Reservation.ACTIVE,
-    models.Reservation.ALLOCATED,
-    models.Reservation.PENDING_CREATE,
-)
+CONF = cfg.CONF
+
+
+EFFECTIVE_STATES = models.Reservation.EFFECTIVE_STATES
+
+_ENFORCER = None
+_ENFORCER_EXPIRES = 0
 
 
 def get_enforcer():
-    return limit.Enforcer(get_usage)
+    """Get the process wide limit enforcer
+
+    The enforcer caches the limits it reads from Keystone, it is replaced
+    every limits_cache_time seconds so that limit changes are seen.
+    """
+    global _ENFORCER, _ENFORCER_EXPIRES
+    expiration_time = CONF.warre.limits_cache_time
+    if not expiration_time:
+        return limit.Enforcer(get_usage)
+
+    now = time.monotonic()
+    if _ENFORCER is None or _ENFORCER_EXPIRES <= now:
+        _ENFORCER = limit.Enforcer(get_usage)
+        _ENFORCER_EXPIRES = now + expiration_time
+    return _ENFORCER
+
+
+def reset():
+    global _ENFORCER
+    _ENFORCER = None
 
 
 def get_usage(project_id, resource_names):
-    return {x: get_usage_by_project(project_id, x) for x in resource_names}
+    """Get the usage of resources by a project
+
+    All the resources are counted by a single aggregate query.
+    """
+    reservation_count, hours = (
+        db.session.query(
+            sa.func.count(models.Reservation.id),
+            sa.func.coalesce(
+                sa.func.sum(
+                    models.Reservation.instance_count
+                    * models.Reservation.total_hours
+                ),
+                0,
+            ),
+        )
+        .filter(models.Reservation.project_id == project_id)
+        .filter(models.Reservation.status.in_(EFFECTIVE_STATES))
+        .one()
+    )
+    usage = {"reservation": reservation_count, "hours": int(hours)}
+    return {x: usage.get(x) for x in resource_names}
 
 
 def get_usage_by_project(project_id, resource):
-    if resource == "reservation":
-        return (
-            db.session.query(models.Reservation)
-            .filter_by(project_id=project_id)
-            .filter(models.Reservation.status.in_(EFFECTIVE_STATES))
-            .count()
-        )
-    if resource == "hours":
-        total = 0
-        reservations = (
-            db.session.query(models.Reservation)
-            .filter_by(project_id=project_id)
-            .filter(models.Reservation.status.in_(EFFECTIVE_STATES))
-            .all()
-        )
-        for r in reservations:
-            total += r.instance_count * r.total_hours
-        return total
+    return get_usage(project_id, [resource])[resource]
@@ -0,0 +1,110 @@
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import datetime
+
+from warre.extensions import db
+from warre import models
+from warre.tests.unit import base
+
+
+class TestArchivedReservationAPI(base.ApiTestCase):
+    def test_list(self):
+        response = self.client.get("/v1/archivedreservations/")
+        self.assert403(response)
+
+    def test_get(self):
+        response = self.client.get("/v1/archivedreservations/bogus/")
+        self.assert403(response)
+
+
+class TestAdminArchivedReservationAPI(base.ApiTestCase):
+    ROLES = ["admin"]
+
+    def setUp(self):
+        super().setUp()
+        self.flavor = self.create_flavor()
+
+    def archive(self, count, end, **kwargs):
+        ids = []
+        for i in range(count):
+            ids.append(
+                self.create_reservation(
+                    flavor_id=self.flavor.id,
+                    status=models.Reservation.COMPLETE,
+                    start=end - datetime.timedelta(days=1),
+                    end=end,
+                    **kwargs,
+                ).id
+            )
+        for reservation_id in ids:
+            values = {
+                c.name: getattr(
+                    db.session.get(models.Reservation, reservation_id), c.key
+                )
+                for c in models.Reservation.__table__.columns
+            }
+            db.session.add(
+                models.ReservationArchive(
+                    archived_at=datetime.datetime(2022, 1, 1), **values
+                )
+            )
+        db.session.commit()
+        return ids
+
+    def test_list_pages(self):
+        later = self.archive(2, datetime.datetime(2021, 2, 1))
+        earlier = self.archive(3, datetime.datetime(2021, 1, 1))
+
+        seen = []
+        url = "/v1/archivedreservations/?limit=2"
+        while url:
+            response = self.client.get(url)
+            self.assert200(response)
+            data = response.get_json()
+            self.assertNotIn("total", data)
+            seen.extend(r["id"] for r in data["results"])
+            url = data.get("next")
+        self.assertEqual(sorted(earlier) + sorted(later), seen)
+
+    def test_list_filters(self):
+        self.archive(2, datetime.datetime(2021, 1, 1))
+        mine = self.archive(1, datetime.datetime(2021, 2, 1))
+        self.archive(1, datetime.datetime(2021, 2, 1), project_id="other")
+
+        response = self.client.get(
+            "/v1/archivedreservations/?with_count=true"
+            f"&project_id={base.PROJECT_ID}"
+            "&end_after=2021-01-15T00:00:00%2B00:00"
+        )
+        self.assert200(response)
+        data = response.get_json()
+        self.assertEqual(1, data["total"])
+        self.assertEqual(mine, [r["id"] for r in data["results"]])
+        self.assertEqual(
+            "2021-02-01T00:00:00+00:00", data["results"][0]["end"]
+        )
+
+    def test_get(self):
+        reservation_id = self.archive(1, datetime.datetime(2021, 1, 1))[0]
+        response = self.client.get(
+            f"/v1/archivedreservations/{reservation_id}/"
+        )
+        self.assert200(response)
+        self.assertEqual(
+            models.Reservation.COMPLETE, response.get_json()["status"]
+        )
+
+    def test_get_missing(self):
+        response = self.client.get("/v1/archivedreservations/bogus/")
+        self.assert404(response)
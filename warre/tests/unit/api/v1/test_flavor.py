@@ -27,6 +27,47 @@ class TestFlavorAPI(base.ApiTestCase):
         results = response.get_json().get("results")
         self.assertEqual(1, len(results))
 
+    def test_flavor_list_marker(self):
+        for name, memory_mb in [("b", 1), ("a", 2), ("a", 1), ("c", 1)]:
+            self.create_flavor(name=name, memory_mb=memory_mb)
+        response = self.client.get("/v1/flavors/?limit=3&marker=")
+        self.assert200(response)
+        data = response.get_json()
+        self.assertEqual(
+            [("a", 1), ("a", 2), ("b", 1)],
+            [(f["name"], f["memory_mb"]) for f in data["results"]],
+        )
+
+        response = self.client.get(data["next"])
+        self.assert200(response)
+        data = response.get_json()
+        self.assertEqual(["c"], [f["name"] for f in data["results"]])
+        self.assertNotIn("next", data)
+
+    def test_flavor_list_marker_public_with_grants(self):
+        flavor = self.create_flavor(name="a")
+        for project_id in (base.PROJECT_ID, "p1", "p2"):
+            self.create_flavorproject(
+                flavor_id=flavor.id, project_id=project_id
+            )
+        self.create_flavor(name="b")
+        self.create_flavor(name="c")
+        response = self.client.get("/v1/flavors/?limit=2&marker=")
+        self.assert200(response)
+        data = response.get_json()
+        self.assertEqual(["a", "b"], [f["name"] for f in data["results"]])
+
+        response = self.client.get(data["next"])
+        self.assert200(response)
+        data = response.get_json()
+        self.assertEqual(["c"], [f["name"] for f in data["results"]])
+        self.assertNotIn("next", data)
+
+        response = self.client.get("/v1/flavors/?limit=2")
+        data = response.get_json()
+        self.assertEqual(2, len(data["results"]))
+        self.assertEqual(3, data["total"])
+
     def test_flavor_list_private(self):
         self.create_flavor(is_public=False)
         response = self.client.get("/v1/flavors/")
@@ -109,6 +150,64 @@ class TestFlavorAPI(base.ApiTestCase):
         response = self.client.get(f"/v1/flavors/{flavor.id}/freeslots/")
         self.assert404(response)
 
+    def test_flavor_get_etag(self):
+        flavor = self.create_flavor(is_public=True)
+        url = f"/v1/flavors/{flavor.id}/"
+        response = self.client.get(url)
+        self.assert200(response)
+        etag = response.headers["ETag"]
+
+        response = self.client.get(url, headers={"If-None-Match": etag})
+        self.assertStatus(response, 304)
+        self.assertEqual(etag, response.headers["ETag"])
+
+        flavor.description = "changed"
+        db.session.commit()
+        response = self.client.get(url, headers={"If-None-Match": etag})
+        self.assert200(response)
+        self.assertNotEqual(etag, response.headers["ETag"])
+
+    def test_flavor_list_etag(self):
+        flavor = self.create_flavor()
+        response = self.client.get("/v1/flavors/")
+        etag = response.headers["ETag"]
+        response = self.client.get(
+            "/v1/flavors/", headers={"If-None-Match": etag}
+        )
+        self.assertStatus(response, 304)
+
+        # Reservations are not part of the listing
+        self.create_reservation(
+            flavor_id=flavor.id,
+            status=models.Reservation.ALLOCATED,
+            start=datetime.datetime(2021, 2, 1),
+            end=datetime.datetime(2021, 3, 1),
+        )
+        response = self.client.get(
+            "/v1/flavors/", headers={"If-None-Match": etag}
+        )
+        self.assertStatus(response, 304)
+
+        flavor.description = "changed"
+        db.session.commit()
+        response = self.client.get(
+            "/v1/flavors/", headers={"If-None-Match": etag}
+        )
+        self.assert200(response)
+        etag = response.headers["ETag"]
+
+        response = self.client.get(
+            "/v1/flavors/?limit=1", headers={"If-None-Match": etag}
+        )
+        self.assert200(response)
+
+        self.create_flavor()
+        response = self.client.get(
+            "/v1/flavors/", headers={"If-None-Match": etag}
+        )
+        self.assert200(response)
+        self.assertEqual(2, len(response.get_json()["results"]))
+
 
 class TestAdminFlavorAPI(TestFlavorAPI):
     ROLES = ["admin"]
@@ -11,8 +11,14 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+from datetime import datetime
 from unittest import mock
 
+import freezegun
+import sqlalchemy as sa
+
+from warre.extensions import db
+from warre import models
 from warre.tests.unit import base
 
 
@@ -49,3 +55,210 @@ class TestFlavorFreeSlotAPI(base.ApiTestCase):
         results = response.get_json()
         self.assertIn(start_date, results[0]["start"])
         self.assertIn(end_date, results[0]["end"])
+
+    def test_instance_count(self):
+        self.create_reservation(
+            flavor_id=self.two_slot_flavor.id,
+            status=models.Reservation.ALLOCATED,
+            start=datetime(2021, 2, 1),
+            end=datetime(2021, 3, 1),
+        )
+        url = f"/v1/flavors/{self.two_slot_flavor.id}/freeslots/"
+        query = {"start": "2021-01-01", "end": "2021-06-01"}
+        response = self.client.get(url, query_string=query)
+        self.assertEqual(1, len(response.get_json()))
+
+        query["instance_count"] = 2
+        response = self.client.get(url, query_string=query)
+        self.assertEqual(2, len(response.get_json()))
+
+        query["instance_count"] = 3
+        response = self.client.get(url, query_string=query)
+        self.assertEqual([], response.get_json())
+
+    def test_etag(self):
+        url = f"/v1/flavors/{self.one_slot_flavor.id}/freeslots/"
+        query = {"start": "2021-02-01", "end": "2021-03-01"}
+        response = self.client.get(url, query_string=query)
+        etag = response.headers["ETag"]
+
+        with mock.patch(
+            "warre.manager.Manager.flavor_free_slots"
+        ) as mock_free_slots:
+            response = self.client.get(
+                url, query_string=query, headers={"If-None-Match": etag}
+            )
+        self.assertStatus(response, 304)
+        mock_free_slots.assert_not_called()
+
+        self.create_reservation(
+            flavor_id=self.one_slot_flavor.id,
+            status=models.Reservation.ALLOCATED,
+            start=datetime(2021, 2, 10),
+            end=datetime(2021, 2, 20),
+        )
+        response = self.client.get(
+            url, query_string=query, headers={"If-None-Match": etag}
+        )
+        self.assert200(response)
+        self.assertNotEqual(etag, response.headers["ETag"])
+        self.assertEqual(2, len(response.get_json()))
+
+    def test_etag_flavor_ended(self):
+        self.one_slot_flavor.end = datetime(2021, 6, 1)
+        db.session.commit()
+        url = f"/v1/flavors/{self.one_slot_flavor.id}/freeslots/"
+        query = {"start": "2021-02-01", "end": "2021-03-01"}
+        with freezegun.freeze_time("2021-05-01"):
+            response = self.client.get(url, query_string=query)
+        self.assertEqual(1, len(response.get_json()))
+        etag = response.headers["ETag"]
+
+        with freezegun.freeze_time("2021-07-01"):
+            response = self.client.get(
+                url, query_string=query, headers={"If-None-Match": etag}
+            )
+        self.assert200(response)
+        self.assertEqual([], response.get_json())
+
+    def test_bad_instance_count(self):
+        url = f"/v1/flavors/{self.one_slot_flavor.id}/freeslots/"
+        response = self.client.get(url, query_string={"instance_count": 0})
+        self.assert400(response)
+
+
+@mock.patch("warre.quota.get_enforcer", new=mock.Mock())
+class TestFreeSlotListAPI(base.ApiTestCase):
+    def setUp(self):
+        super().setUp()
+        self.flavor = self.create_flavor(category="gpu")
+        self.other_flavor = self.create_flavor(
+            availability_zone="other", slots=2
+        )
+        self.private_flavor = self.create_flavor(is_public=False)
+        self.create_reservation(
+            flavor_id=self.flavor.id,
+            status=models.Reservation.ALLOCATED,
+            start=datetime(2021, 2, 1),
+            end=datetime(2021, 3, 1),
+        )
+        self.query = {"start": "2021-01-01", "end": "2021-06-01"}
+
+    def test_list(self):
+        response = self.client.get("/v1/freeslots/", query_string=self.query)
+        self.assert200(response)
+        results = response.get_json()
+        self.assertEqual({self.flavor.id, self.other_flavor.id}, set(results))
+        self.assertEqual(
+            [
+                {
+                    "start": "2021-01-01T00:00:00+00:00",
+                    "end": "2021-01-31T23:59:00+00:00",
+                },
+                {
+                    "start": "2021-03-01T00:01:00+00:00",
+                    "end": "2021-06-01T00:00:00+00:00",
+                },
+            ],
+            results[self.flavor.id],
+        )
+        self.assertEqual(1, len(results[self.other_flavor.id]))
+
+    def test_list_matches_single_flavor(self):
+        response = self.client.get("/v1/freeslots/", query_string=self.query)
+        results = response.get_json()
+        for flavor in (self.flavor, self.other_flavor):
+            response = self.client.get(
+                f"/v1/flavors/{flavor.id}/freeslots/", query_string=self.query
+            )
+            self.assertEqual(response.get_json(), results[flavor.id])
+
+    def test_list_private_with_access(self):
+        self.create_flavorproject(
+            flavor_id=self.private_flavor.id, project_id=base.PROJECT_ID
+        )
+        response = self.client.get("/v1/freeslots/", query_string=self.query)
+        self.assertIn(self.private_flavor.id, response.get_json())
+
+    def test_list_flavor_once(self):
+        for project_id in (base.PROJECT_ID, "p1", "p2"):
+            self.create_flavorproject(
+                flavor_id=self.flavor.id, project_id=project_id
+            )
+        with mock.patch(
+            "warre.manager.Manager.flavors_free_slots", return_value={}
+        ) as mock_free_slots:
+            self.client.get("/v1/freeslots/", query_string=self.query)
+        flavors = mock_free_slots.call_args[0][1]
+        self.assertEqual(
+            sorted([self.flavor.id, self.other_flavor.id]),
+            sorted(flavor.id for flavor in flavors),
+        )
+
+    def test_filter(self):
+        response = self.client.get(
+            "/v1/freeslots/", query_string={"category": "gpu"}
+        )
+        self.assertEqual([self.flavor.id], list(response.get_json()))
+        response = self.client.get(
+            "/v1/freeslots/", query_string={"availability_zone": "other"}
+        )
+        self.assertEqual([self.other_flavor.id], list(response.get_json()))
+
+    def test_constant_queries(self):
+        statements = []
+
+        def count(conn, cursor, statement, *args):
+            statements.append(statement)
+
+        engine = db.engine
+        sa.event.listen(engine, "before_cursor_execute", count)
+        self.addCleanup(
+            sa.event.remove, engine, "before_cursor_execute", count
+        )
+        self.client.get("/v1/freeslots/", query_string=self.query)
+        few = len(statements)
+
+        for i in range(5):
+            flavor = self.create_flavor(name=f"test.{i}")
+            self.create_reservation(
+                flavor_id=flavor.id,
+                status=models.Reservation.ALLOCATED,
+                start=datetime(2021, 2, 1),
+                end=datetime(2021, 3, 1),
+            )
+        statements.clear()
+        self.client.get("/v1/freeslots/", query_string=self.query)
+        self.assertEqual(few, len(statements))
+
+    def test_list_etag(self):
+        response = self.client.get("/v1/freeslots/", query_string=self.query)
+        etag = response.headers["ETag"]
+        response = self.client.get(
+            "/v1/freeslots/",
+            query_string=self.query,
+            headers={"If-None-Match": etag},
+        )
+        self.assertStatus(response, 304)
+
+        self.create_reservation(
+            flavor_id=self.other_flavor.id,
+            status=models.Reservation.ALLOCATED,
+            start=datetime(2021, 2, 1),
+            end=datetime(2021, 3, 1),
+            instance_count=2,
+        )
+        response = self.client.get(
+            "/v1/freeslots/",
+            query_string=self.query,
+            headers={"If-None-Match": etag},
+        )
+        self.assert200(response)
+        self.assertEqual(2, len(response.get_json()[self.other_flavor.id]))
+
+    def test_list_instance_count(self):
+        query = dict(self.query, instance_count=2)
+        response = self.client.get("/v1/freeslots/", query_string=query)
+        results = response.get_json()
+        self.assertEqual([], results[self.flavor.id])
+        self.assertEqual(1, len(results[self.other_flavor.id]))
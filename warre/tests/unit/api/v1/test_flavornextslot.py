@@ -0,0 +1,109 @@
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+from datetime import datetime
+from unittest import mock
+
+from freezegun import freeze_time
+
+from warre import models
+from warre.tests.unit import base
+
+
+@freeze_time("2021-01-01")
+@mock.patch("warre.quota.get_enforcer", new=mock.Mock())
+class TestFlavorNextSlotAPI(base.ApiTestCase):
+    def setUp(self):
+        super().setUp()
+        self.flavor = self.create_flavor(slots=2, max_length_hours=48)
+        self.create_reservation(
+            flavor_id=self.flavor.id,
+            status=models.Reservation.ALLOCATED,
+            start=datetime(2021, 1, 2),
+            end=datetime(2021, 1, 3),
+        )
+        self.create_maintenance_window(
+            start=datetime(2021, 1, 4),
+            end=datetime(2021, 1, 5),
+            flavors=[self.flavor],
+        )
+        self.url = f"/v1/flavors/{self.flavor.id}/nextslot/"
+
+    def test_next_slot(self):
+        response = self.client.get(
+            self.url, query_string={"duration_hours": 24}
+        )
+        self.assert200(response)
+        self.assertEqual(
+            {
+                "start": "2021-01-01T00:00:00+00:00",
+                "end": "2021-01-02T00:00:00+00:00",
+            },
+            response.get_json(),
+        )
+
+    def test_next_slot_instances(self):
+        response = self.client.get(
+            self.url,
+            query_string={"duration_hours": 24, "instance_count": 2},
+        )
+        self.assert200(response)
+        self.assertEqual(
+            "2021-01-05T00:01:00+00:00", response.get_json()["start"]
+        )
+
+    def test_next_slot_not_before(self):
+        response = self.client.get(
+            self.url,
+            query_string={
+                "duration_hours": 24,
+                "not_before": "2021-01-04T12:00:00+00:00",
+            },
+        )
+        self.assert200(response)
+        self.assertEqual(
+            "2021-01-05T00:01:00+00:00", response.get_json()["start"]
+        )
+
+    def test_next_slot_too_long(self):
+        response = self.client.get(
+            self.url, query_string={"duration_hours": 49}
+        )
+        self.assert400(response)
+
+    def test_next_slot_none(self):
+        response = self.client.get(
+            self.url,
+            query_string={"duration_hours": 24, "instance_count": 3},
+        )
+        self.assert404(response)
+
+    def test_next_slot_flavor_end(self):
+        flavor = self.create_flavor(end=datetime(2021, 1, 2, 12))
+        url = f"/v1/flavors/{flavor.id}/nextslot/"
+        response = self.client.get(url, query_string={"duration_hours": 24})
+        self.assert200(response)
+        response = self.client.get(url, query_string={"duration_hours": 48})
+        self.assert404(response)
+
+    def test_next_slot_requires_duration(self):
+        response = self.client.get(self.url)
+        self.assert400(response)
+
+    def test_next_slot_private_no_access(self):
+        flavor = self.create_flavor(is_public=False)
+        response = self.client.get(
+            f"/v1/flavors/{flavor.id}/nextslot/",
+            query_string={"duration_hours": 1},
+        )
+        self.assert404(response)
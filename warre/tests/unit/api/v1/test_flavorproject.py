@@ -41,6 +41,20 @@ class TestFlavorProjectAPI(base.ApiTestCase):
         self.assertEqual("fp-project-id", api_fp.get("project_id"))
         self.assertEqual(self.flavor.id, api_fp.get("flavor"))
 
+    def test_list_flavorprojects_query_count(self):
+        for i in range(5):
+            self.create_flavorproject(
+                project_id=f"project-{i}", flavor_id=self.create_flavor().id
+            )
+        for url in (
+            "/v1/flavorprojects/?limit=1",
+            "/v1/flavorprojects/?limit=5",
+            "/v1/flavorprojects/?limit=5&marker=",
+        ):
+            with self.assertMaxQueries(2):
+                response = self.client.get(url)
+            self.assert200(response)
+
     def test_list_flavorprojects_filter_project(self):
         fp = models.FlavorProject(
             project_id="fp-project-id", flavor_id=self.flavor.id
@@ -0,0 +1,124 @@
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+from datetime import datetime
+
+from freezegun import freeze_time
+
+from warre import models
+from warre.tests.unit import base
+
+
+@freeze_time("2021-01-01")
+class TestFlavorUtilizationAPI(base.ApiTestCase):
+    ROLES = ["admin"]
+
+    def setUp(self):
+        super().setUp()
+        self.flavor = self.create_flavor(slots=2)
+        self.create_reservation(
+            flavor_id=self.flavor.id,
+            status=models.Reservation.ALLOCATED,
+            start=datetime(2021, 1, 1, 6),
+            end=datetime(2021, 1, 2, 12),
+        )
+        self.create_maintenance_window(
+            start=datetime(2021, 1, 3),
+            end=datetime(2021, 1, 4),
+            flavors=[self.flavor],
+        )
+        self.url = f"/v1/flavors/{self.flavor.id}/utilization/"
+        self.query = {"start": "2021-01-01", "end": "2021-01-05"}
+
+    def test_step(self):
+        response = self.client.get(self.url, query_string=self.query)
+        self.assert200(response)
+        self.assertEqual(
+            [
+                {"start": "2021-01-01T00:00:00+00:00", "occupied": 0},
+                {"start": "2021-01-01T06:00:00+00:00", "occupied": 1},
+                {"start": "2021-01-02T12:00:00+00:00", "occupied": 0},
+                {"start": "2021-01-03T00:00:00+00:00", "occupied": 2},
+                {"start": "2021-01-04T00:00:00+00:00", "occupied": 0},
+            ],
+            response.get_json(),
+        )
+
+    def test_day(self):
+        response = self.client.get(
+            self.url, query_string={**self.query, "resolution": "day"}
+        )
+        self.assert200(response)
+        self.assertEqual(
+            [
+                {
+                    "start": "2021-01-01T00:00:00+00:00",
+                    "peak": 1,
+                    "mean": 0.75,
+                },
+                {"start": "2021-01-02T00:00:00+00:00", "peak": 1, "mean": 0.5},
+                {"start": "2021-01-03T00:00:00+00:00", "peak": 2, "mean": 2.0},
+                {"start": "2021-01-04T00:00:00+00:00", "peak": 0, "mean": 0.0},
+            ],
+            response.get_json(),
+        )
+
+    def test_hour(self):
+        response = self.client.get(
+            self.url, query_string={**self.query, "resolution": "hour"}
+        )
+        self.assert200(response)
+        data = response.get_json()
+        self.assertEqual(96, len(data))
+        self.assertEqual(0, data[5]["peak"])
+        self.assertEqual(1, data[6]["peak"])
+
+    def test_bad_resolution(self):
+        response = self.client.get(
+            self.url, query_string={**self.query, "resolution": "minute"}
+        )
+        self.assert400(response)
+
+    def test_bad_range(self):
+        response = self.client.get(
+            self.url,
+            query_string={"start": "2021-01-05", "end": "2021-01-01"},
+        )
+        self.assert400(response)
+
+    def test_not_found(self):
+        response = self.client.get("/v1/flavors/bogus/utilization/")
+        self.assert404(response)
+
+
+class TestFlavorUtilizationUserAPI(TestFlavorUtilizationAPI):
+    ROLES = ["member"]
+
+    def test_step(self):
+        response = self.client.get(self.url, query_string=self.query)
+        self.assert403(response)
+
+    def test_day(self):
+        pass
+
+    def test_hour(self):
+        pass
+
+    def test_bad_resolution(self):
+        pass
+
+    def test_bad_range(self):
+        pass
+
+    def test_not_found(self):
+        pass
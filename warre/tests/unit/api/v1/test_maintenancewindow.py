@@ -48,6 +48,23 @@ class TestMaintenanceWindowAPI(base.ApiTestCase):
         self.assertEqual(1, len(results[0]["flavors"]))
         self.assertEqual(self.flavor.id, results[0]["flavors"][0]["id"])
 
+    def test_list_query_count(self):
+        for i in range(5):
+            self.create_maintenance_window(
+                start=datetime(2026, 5, 1),
+                end=datetime(2026, 5, 2),
+                flavors=[self.flavor, self.create_flavor()],
+            )
+        # Flavors are loaded in one query whatever the page size
+        for url in (
+            "/v1/maintenancewindows/?limit=1",
+            "/v1/maintenancewindows/?limit=5",
+            "/v1/maintenancewindows/?limit=5&marker=",
+        ):
+            with self.assertMaxQueries(3):
+                response = self.client.get(url)
+            self.assert200(response)
+
     @freeze_time("2026-04-15")
     def test_create(self):
         data = {
@@ -14,6 +14,8 @@
 import datetime
 from unittest import mock
 
+from oslo_limit import exception as limit_exceptions
+
 from warre.extensions import db
 from warre import models
 from warre import quota
@@ -64,6 +66,69 @@ class TestReservationAPI(base.ApiTestCase):
         results = response.get_json().get("results")
         self.assertEqual(2, len(results))
 
+    def test_list_reservations_marker(self):
+        created = []
+        for i in range(5):
+            created.append(
+                self.create_reservation(
+                    flavor_id=self.flavor.id,
+                    start=datetime.datetime(2021, 1, 1),
+                    end=datetime.datetime(2021, 1, 2),
+                ).id
+            )
+        # Same created_at, so the id breaks the tie
+        db.session.query(models.Reservation).update(
+            {"created_at": datetime.datetime(2021, 1, 1)}
+        )
+        db.session.commit()
+
+        seen = []
+        url = "/v1/reservations/?limit=2&marker="
+        while url:
+            response = self.client.get(url)
+            self.assert200(response)
+            data = response.get_json()
+            self.assertNotIn("total", data)
+            seen.extend(r["id"] for r in data["results"])
+            url = data.get("next")
+        self.assertEqual(sorted(created), seen)
+
+    def test_list_reservations_marker_with_count(self):
+        for i in range(3):
+            self.create_reservation(
+                flavor_id=self.flavor.id,
+                start=datetime.datetime(2021, 1, 1),
+                end=datetime.datetime(2021, 1, 2),
+            )
+        response = self.client.get(
+            "/v1/reservations/?limit=2&marker=&with_count=true"
+        )
+        self.assert200(response)
+        data = response.get_json()
+        self.assertEqual(3, data["total"])
+        self.assertIn("with_count=true", data["next"])
+
+    def test_list_reservations_query_count(self):
+        for i in range(5):
+            self.create_reservation(
+                flavor_id=self.create_flavor().id,
+                start=datetime.datetime(2021, 1, 1),
+                end=datetime.datetime(2021, 1, 2),
+            )
+        # Flavors are joined in whatever the page size
+        for url in (
+            "/v1/reservations/?limit=1",
+            "/v1/reservations/?limit=5",
+            "/v1/reservations/?limit=5&marker=",
+        ):
+            with self.assertMaxQueries(2):
+                response = self.client.get(url)
+            self.assert200(response)
+
+    def test_list_reservations_bad_marker(self):
+        response = self.client.get("/v1/reservations/?marker=bogus")
+        self.assert400(response)
+
     def test_list_reservations_non_project(self):
         self.create_reservation(
             flavor_id=self.flavor.id,
@@ -110,8 +175,9 @@ class TestReservationAPI(base.ApiTestCase):
         )
 
     def test_create_reservation_multiple_instances(self):
+        flavor = self.create_flavor(slots=2)
         data = {
-            "flavor_id": self.flavor.id,
+            "flavor_id": flavor.id,
             "start": "2020-01-01T00:00:00+00:00",
             "end": "2020-01-01T01:00:00+00:00",
             "instance_count": 2,
@@ -120,23 +186,52 @@ class TestReservationAPI(base.ApiTestCase):
         self.assert200(response)
         self.assertEqual(2, response.get_json().get("instance_count"))
 
+    def test_create_reservation_multiple_instances_no_capacity(self):
+        data = {
+            "flavor_id": self.flavor.id,
+            "start": "2020-01-01T00:00:00+00:00",
+            "end": "2020-01-01T01:00:00+00:00",
+            "instance_count": 2,
+        }
+        response = self.client.post("/v1/reservations/", json=data)
+        self.assert400(response)
+        self.assertEqual(
+            "No capacity", response.get_json().get("error_message")
+        )
+
     def test_create_reservation_hours_quota_includes_instance_count(self):
         enforcer = quota.get_enforcer.return_value
         enforcer.reset_mock()
+        flavor = self.create_flavor(slots=3)
         data = {
-            "flavor_id": self.flavor.id,
+            "flavor_id": flavor.id,
             "start": "2020-01-01T00:00:00+00:00",
             "end": "2020-01-01T04:00:00+00:00",
             "instance_count": 3,
         }
         response = self.client.post("/v1/reservations/", json=data)
         self.assert200(response)
-        # total_hours=4, instance_count=3 -> 12 hours enforced
-        hours_calls = [
-            c for c in enforcer.enforce.call_args_list if "hours" in c.args[1]
-        ]
-        self.assertEqual(1, len(hours_calls))
-        self.assertEqual(12, hours_calls[0].args[1]["hours"])
+        # total_hours=4, instance_count=3 -> 12 hours enforced, in the
+        # same check as the reservation count
+        enforcer.enforce.assert_called_once_with(
+            base.PROJECT_ID, {"reservation": 1, "hours": 12}
+        )
+
+    def test_create_reservation_over_limit(self):
+        enforcer = quota.get_enforcer.return_value
+        enforcer.enforce.side_effect = limit_exceptions.ProjectOverLimit(
+            base.PROJECT_ID,
+            [limit_exceptions.OverLimitInfo("hours", 10, 8, 4)],
+        )
+        self.addCleanup(setattr, enforcer.enforce, "side_effect", None)
+        data = {
+            "flavor_id": self.flavor.id,
+            "start": "2020-01-01T00:00:00+00:00",
+            "end": "2020-01-01T04:00:00+00:00",
+        }
+        response = self.client.post("/v1/reservations/", json=data)
+        self.assertStatus(response, 413)
+        self.assertEqual(0, db.session.query(models.Reservation).count())
 
     def test_create_reservation_noinput(self):
         data = {}
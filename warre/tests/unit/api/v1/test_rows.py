@@ -0,0 +1,91 @@
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+from datetime import datetime
+import json
+
+from warre.api.v1.schemas import flavor as flavor_schemas
+from warre.api.v1.schemas import maintenancewindow as window_schemas
+from warre.api.v1.schemas import reservation as reservation_schemas
+from warre.api.v1.schemas import rows
+from warre.extensions import db
+from warre import models
+from warre.tests.unit import base
+
+
+class TestRowSchema(base.TestCase):
+    def setUp(self):
+        super().setUp()
+        self.flavor = self.create_flavor(
+            extra_specs={"resources:VGPU": "1"},
+            start=datetime(2021, 1, 1),
+            category="gpu",
+        )
+        self.other_flavor = self.create_flavor(name="other", active=False)
+        for i in range(3):
+            self.create_reservation(
+                flavor_id=self.flavor.id,
+                start=datetime(2021, 2, 1 + i),
+                end=datetime(2021, 3, 1, 12, 30),
+                status=models.Reservation.ALLOCATED,
+                instance_count=i + 1,
+            )
+        self.create_maintenance_window(
+            start=datetime(2021, 4, 1),
+            end=datetime(2021, 4, 2),
+            note="Power work",
+            flavors=[self.flavor, self.other_flavor],
+        )
+        self.create_maintenance_window(
+            start=datetime(2021, 5, 1), end=datetime(2021, 5, 2)
+        )
+
+    def assertSameDump(self, schema, row_schema, model):
+        query = db.session.query(model).order_by(model.id)
+        expected = schema.dump(query.all())
+        results = row_schema.dump(row_schema.select(query).all())
+        self.assertEqual(
+            json.dumps(expected, indent=2), json.dumps(results, indent=2)
+        )
+
+    def test_flavors(self):
+        self.assertSameDump(
+            flavor_schemas.flavors, flavor_schemas.flavorrows, models.Flavor
+        )
+
+    def test_reservations(self):
+        self.assertSameDump(
+            reservation_schemas.reservations,
+            reservation_schemas.reservationrows,
+            models.Reservation,
+        )
+
+    def test_maintenance_windows(self):
+        self.assertSameDump(
+            window_schemas.maintenancewindows,
+            window_schemas.maintenancewindowrows,
+            models.MaintenanceWindow,
+        )
+
+    def test_empty(self):
+        row_schema = window_schemas.maintenancewindowrows
+        self.assertEqual([], row_schema.dump([]))
+
+    def test_nested_too_deep(self):
+        self.assertRaises(
+            ValueError,
+            rows.RowSchema,
+            reservation_schemas.reservations,
+            models.Reservation,
+            "parent__",
+        )
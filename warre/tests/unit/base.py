@@ -11,6 +11,7 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import contextlib
 from unittest import mock
 
 import flask_testing
@@ -18,10 +19,15 @@ from oslo_config import cfg
 from oslo_context import context
 
 from warre import app
+from warre.common import cache
 from warre.common import keystone
+from warre.common import profiling
 from warre import extensions
 from warre.extensions import db
+from warre import manager
 from warre import models
+from warre.notification import user
+from warre import quota
 
 
 PROJECT_ID = "ksprojectid1"
@@ -53,8 +59,24 @@ class TestCase(flask_testing.TestCase):
         db.session.remove()
         db.drop_all()
         cfg.CONF.reset()
+        cache.reset()
+        keystone.reset()
+        manager.reset()
+        quota.reset()
+        user.reset()
         extensions.api.resources = []
 
+    @contextlib.contextmanager
+    def assertMaxQueries(self, maximum):
+        """Fail when the block runs more than maximum SQL statements"""
+        with profiling.collect() as collector:
+            yield collector
+        if collector.count > maximum:
+            self.fail(
+                f"Expected at most {maximum} queries, got {collector.count}:\n"
+                + "\n".join(repr(q) for q in collector.queries)
+            )
+
     def create_flavor(
         self,
         name="test.small",
@@ -0,0 +1,94 @@
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+from unittest import mock
+
+from oslo_config import cfg
+
+from warre.common import cache
+from warre.tests.unit import base
+
+
+CONF = cfg.CONF
+
+
+class TestMemoryCache(base.TestCase):
+    def test_get_set(self):
+        c = cache.MemoryCache(max_entries=2, expiration_time=60)
+        self.assertIsNone(c.get("a"))
+        c.set("a", 1)
+        self.assertEqual(1, c.get("a"))
+
+    def test_lru_eviction(self):
+        c = cache.MemoryCache(max_entries=2, expiration_time=60)
+        c.set("a", 1)
+        c.set("b", 2)
+        c.get("a")
+        c.set("c", 3)
+        self.assertEqual(1, c.get("a"))
+        self.assertIsNone(c.get("b"))
+        self.assertEqual(3, c.get("c"))
+
+    def test_delete(self):
+        c = cache.MemoryCache(max_entries=2, expiration_time=60)
+        c.set("a", 1)
+        c.delete("a")
+        c.delete("b")
+        self.assertIsNone(c.get("a"))
+
+    def test_stats(self):
+        c = cache.MemoryCache(max_entries=2, expiration_time=60)
+        self.assertEqual(
+            {"hits": 0, "misses": 0, "hit_rate": 0.0, "entries": 0},
+            c.stats(),
+        )
+        c.set("a", 1)
+        c.get("a")
+        c.get("a")
+        c.get("a")
+        c.get("b")
+        self.assertEqual(
+            {"hits": 3, "misses": 1, "hit_rate": 0.75, "entries": 1},
+            c.stats(),
+        )
+
+    @mock.patch("warre.common.cache.time")
+    def test_expiry(self, mock_time):
+        mock_time.monotonic.return_value = 100
+        c = cache.MemoryCache(max_entries=2, expiration_time=60)
+        c.set("a", 1)
+        mock_time.monotonic.return_value = 161
+        self.assertIsNone(c.get("a"))
+
+
+class TestGetCache(base.TestCase):
+    def test_memory(self):
+        self.assertIsInstance(cache.get_cache(), cache.MemoryCache)
+        self.assertIs(cache.get_cache(), cache.get_cache())
+
+    def test_none(self):
+        CONF.set_override("backend", "none", group="capacity_cache")
+        self.assertIsInstance(cache.get_cache(), cache.NullCache)
+
+    @mock.patch("warre.common.cache.memcache")
+    def test_memcached(self, mock_memcache):
+        CONF.set_override("backend", "memcached", group="capacity_cache")
+        c = cache.get_cache()
+        self.assertIsInstance(c, cache.MemcachedCache)
+        mock_memcache.Client.assert_called_once_with(["localhost:11211"])
+        c.set("a", 1)
+        mock_memcache.Client.return_value.set.assert_called_once_with(
+            "a", 1, time=3600
+        )
+        mock_memcache.Client.return_value.get.side_effect = Exception
+        self.assertIsNone(c.get("a"))
@@ -0,0 +1,41 @@
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+from unittest import mock
+
+from warre.common import keystone
+from warre.tests.unit import base
+
+
+@mock.patch("warre.common.keystone.ks_loading")
+class TestGetSession(base.TestCase):
+    def test_get_session_shared(self, mock_loading):
+        session = keystone.get_session()
+        self.assertIs(session, keystone.get_session())
+        mock_loading.load_session_from_conf_options.assert_called_once()
+
+    def test_get_session_per_section(self, mock_loading):
+        mock_loading.load_session_from_conf_options.side_effect = (
+            lambda *args, **kwargs: mock.Mock()
+        )
+        self.assertIsNot(
+            keystone.get_session(), keystone.get_session("other_auth")
+        )
+
+    def test_reset(self, mock_loading):
+        keystone.get_session()
+        keystone.reset()
+        keystone.get_session()
+        self.assertEqual(
+            2, mock_loading.load_session_from_conf_options.call_count
+        )
@@ -0,0 +1,76 @@
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import os
+import tempfile
+from unittest import mock
+
+import prometheus_client
+
+from warre.common import metrics
+from warre.tests.unit import base
+
+
+def sample(name, **labels):
+    return prometheus_client.REGISTRY.get_sample_value(name, labels) or 0
+
+
+class TestTimed(base.TestCase):
+    def test_timed(self):
+        @metrics.timed("test_op")
+        def op(fail=False):
+            if fail:
+                raise ValueError()
+            return "done"
+
+        name = "warre_operation_duration_seconds_count"
+        success = sample(name, operation="test_op", outcome="success")
+        error = sample(name, operation="test_op", outcome="error")
+
+        self.assertEqual("done", op())
+        self.assertRaises(ValueError, op, fail=True)
+
+        self.assertEqual(
+            success + 1, sample(name, operation="test_op", outcome="success")
+        )
+        self.assertEqual(
+            error + 1, sample(name, operation="test_op", outcome="error")
+        )
+
+    def test_multiprocess_registry(self):
+        self.assertIs(prometheus_client.REGISTRY, metrics.get_registry())
+        with tempfile.TemporaryDirectory() as tmp:
+            with mock.patch.dict(
+                os.environ, {"PROMETHEUS_MULTIPROC_DIR": tmp}
+            ):
+                registry = metrics.get_registry()
+        self.assertIsNot(prometheus_client.REGISTRY, registry)
+
+
+class TestMetricsAPI(base.ApiTestCase):
+    def test_metrics(self):
+        name = "warre_api_request_duration_seconds_count"
+        labels = {
+            "resource": "api.flavorlist",
+            "method": "GET",
+            "status": "200",
+        }
+        before = sample(name, **labels)
+        self.assert200(self.client.get("/v1/flavors/"))
+        self.assertEqual(before + 1, sample(name, **labels))
+
+        response = self.client.get("/metrics")
+        self.assert200(response)
+        self.assertIn(
+            b"warre_api_request_duration_seconds_bucket", response.data
+        )
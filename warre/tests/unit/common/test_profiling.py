@@ -0,0 +1,90 @@
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+from oslo_config import cfg
+
+from warre.common import profiling
+from warre.extensions import db
+from warre import models
+from warre.tests.unit import base
+
+
+CONF = cfg.CONF
+
+
+class TestCollect(base.TestCase):
+    def test_collect(self):
+        self.create_flavor()
+        with profiling.collect() as collector:
+            db.session.query(models.Flavor).all()
+            with profiling.collect() as inner:
+                db.session.query(models.Flavor).count()
+            db.session.query(models.Reservation).all()
+
+        self.assertEqual(1, inner.count)
+        self.assertEqual(2, collector.count)
+        query = collector.queries[0]
+        self.assertIn("FROM flavor", query.statement)
+        self.assertIn("test_profiling.py", query.caller)
+        self.assertIn("in test_collect", query.caller)
+        self.assertGreaterEqual(collector.duration, query.duration)
+
+        # Not collecting any more
+        db.session.query(models.Flavor).all()
+        self.assertEqual(2, collector.count)
+
+    def test_assert_max_queries(self):
+        with self.assertMaxQueries(1):
+            db.session.query(models.Flavor).all()
+        with self.assertRaisesRegex(AssertionError, "at most 1 queries"):
+            with self.assertMaxQueries(1):
+                db.session.query(models.Flavor).all()
+                db.session.query(models.Flavor).all()
+
+
+class TestProfilingAPI(base.ApiTestCase):
+    def test_not_profiled(self):
+        response = self.client.get("/v1/flavors/")
+        self.assert200(response)
+        self.assertNotIn(profiling.SUMMARY_HEADER, response.headers)
+
+    def test_header_needs_admin(self):
+        response = self.client.get(
+            "/v1/flavors/", headers={profiling.PROFILE_HEADER: "true"}
+        )
+        self.assert200(response)
+        self.assertNotIn(profiling.SUMMARY_HEADER, response.headers)
+
+    def test_config(self):
+        CONF.set_override("profile_sql", True, group="database")
+        with self.assertLogs("warre.common.profiling", level="INFO") as cm:
+            response = self.client.get("/v1/flavors/")
+        self.assert200(response)
+        self.assertRegex(
+            response.headers[profiling.SUMMARY_HEADER],
+            r"^count=\d+; time=[\d.]+ms$",
+        )
+        self.assertIn("GET /v1/flavors/", cm.output[0])
+        self.assertIn("warre/api/v1/resources/", cm.output[0])
+
+
+class TestAdminProfilingAPI(base.ApiTestCase):
+    ROLES = ["admin"]
+
+    def test_header(self):
+        self.create_flavor()
+        response = self.client.get(
+            "/v1/flavors/", headers={profiling.PROFILE_HEADER: "true"}
+        )
+        self.assert200(response)
+        self.assertIn(profiling.SUMMARY_HEADER, response.headers)
@@ -14,44 +14,46 @@
 from datetime import datetime
 from unittest import mock
 
+import prometheus_client
+
 from warre.extensions import db
 from warre import models
 from warre.notification import endpoints
 from warre.tests.unit import base
 
 
-@mock.patch("warre.notification.endpoints.user")
 @mock.patch("warre.common.rpc.get_notifier")
 @mock.patch("warre.app.create_app")
 class TestEndpoints(base.TestCase):
-    def test_sample_start(self, mock_app, mock_get_notifier, mock_user):
+    def test_sample_start(self, mock_app, mock_get_notifier):
+        lag = "warre_lease_event_lag_seconds_count"
+        before = self.sample(lag, event="start")
         self._test_sample("lease.event.start_lease", models.Reservation.ACTIVE)
+        self.assertEqual(before + 1, self.sample(lag, event="start"))
         notifier = mock_get_notifier.return_value
         notifier.info.assert_called_once_with(
             self.context, "warre.reservation.start", mock.ANY
         )
-        mock_user.send_message.assert_called_once_with(mock.ANY, "start")
+        self.assertEqual(["start"], self.queued())
 
-    def test_sample_end(self, mock_app, mock_get_notifier, mock_user):
+    def test_sample_end(self, mock_app, mock_get_notifier):
         self._test_sample("lease.event.end_lease", models.Reservation.COMPLETE)
         notifier = mock_get_notifier.return_value
         notifier.info.assert_called_once_with(
             self.context, "warre.reservation.end", mock.ANY
         )
-        mock_user.send_message.assert_called_once_with(mock.ANY, "end")
+        self.assertEqual(["end"], self.queued())
 
-    def test_sample_before_end(self, mock_app, mock_get_notifier, mock_user):
+    def test_sample_before_end(self, mock_app, mock_get_notifier):
         self._test_sample(
             "lease.event.before_end_lease", models.Reservation.ALLOCATED
         )
 
         notifier = mock_get_notifier.return_value
         notifier.info.assert_not_called()
-        mock_user.send_message.assert_called_once_with(mock.ANY, "before_end")
+        self.assertEqual(["before_end"], self.queued())
 
-    def test_sample_unknown_lease(
-        self, mock_app, mock_get_notifier, mock_user
-    ):
+    def test_sample_unknown_lease(self, mock_app, mock_get_notifier):
         with self.assertLogs(
             "warre.notification.endpoints", level="WARNING"
         ) as cm:
@@ -63,11 +65,17 @@ class TestEndpoints(base.TestCase):
 
         notifier = mock_get_notifier.return_value
         notifier.info.assert_not_called()
-        mock_user.send_message.assert_not_called()
+        self.assertEqual([], self.queued())
         self.assertEqual(1, len(cm.records))
         self.assertEqual("WARNING", cm.records[0].levelname)
         self.assertIn("No reservation with lease ID", cm.output[0])
 
+    def sample(self, name, **labels):
+        return prometheus_client.REGISTRY.get_sample_value(name, labels) or 0
+
+    def queued(self):
+        return [n.event for n in db.session.query(models.UserNotification)]
+
     def _test_sample(self, event, status, lease_id="test-lease-id"):
         flavor = self.create_flavor()
         reservation = self.create_reservation(
@@ -0,0 +1,122 @@
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+from datetime import datetime
+from unittest import mock
+
+from freezegun import freeze_time
+from oslo_config import cfg
+
+from warre.extensions import db
+from warre import models
+from warre.notification import outbox
+from warre.tests.unit import base
+
+
+CONF = cfg.CONF
+
+
+@mock.patch("warre.notification.user.send_message")
+@mock.patch("warre.notification.user.get_notifier", new=mock.Mock())
+class TestOutbox(base.TestCase):
+    def setUp(self):
+        super().setUp()
+        self.flavor = self.create_flavor()
+        self.reservation = self.create_reservation(
+            flavor_id=self.flavor.id,
+            status=models.Reservation.ALLOCATED,
+            start=datetime(2021, 2, 1),
+            end=datetime(2021, 3, 1),
+        )
+
+    def queue(self, event="start"):
+        notification = outbox.queue(self.reservation, event)
+        db.session.commit()
+        return notification
+
+    def test_queue_once(self, mock_send):
+        self.assertIsNotNone(self.queue("start"))
+        self.assertIsNone(self.queue("start"))
+        self.assertIsNotNone(self.queue("end"))
+        self.assertEqual(2, db.session.query(models.UserNotification).count())
+
+    def test_queue_duplicate_keeps_transaction(self, mock_send):
+        # As when a concurrent transaction queued the event first
+        self.queue("start")
+        self.reservation.status = models.Reservation.ACTIVE
+        self.assertIsNone(outbox.queue(self.reservation, "start"))
+        db.session.commit()
+
+        db.session.expire_all()
+        self.assertEqual(models.Reservation.ACTIVE, self.reservation.status)
+        self.assertEqual(1, db.session.query(models.UserNotification).count())
+
+    @freeze_time("2021-01-27")
+    def test_deliver(self, mock_send):
+        notification = self.queue()
+
+        self.assertEqual(1, outbox.deliver())
+        mock_send.assert_called_once_with(self.reservation, "start")
+        self.assertEqual(datetime(2021, 1, 27), notification.sent_at)
+        self.assertIsNone(notification.next_attempt)
+        self.assertEqual(1, notification.attempts)
+
+        self.assertEqual(0, outbox.deliver())
+        mock_send.assert_called_once()
+
+    def test_deliver_retry(self, mock_send):
+        CONF.set_override("user_notification_max_attempts", 3, "worker")
+        mock_send.side_effect = Exception("Taynac is down")
+        with freeze_time("2021-01-27 00:00:00"):
+            notification = self.queue()
+            self.assertEqual(0, outbox.deliver())
+        self.assertEqual("Taynac is down", notification.last_error)
+        self.assertEqual(
+            datetime(2021, 1, 27, 0, 1), notification.next_attempt
+        )
+
+        # Backoff doubles
+        with freeze_time("2021-01-27 00:01:00"):
+            outbox.deliver()
+        self.assertEqual(
+            datetime(2021, 1, 27, 0, 3), notification.next_attempt
+        )
+
+        with freeze_time("2021-01-27 00:03:00"):
+            outbox.deliver()
+        self.assertEqual(3, notification.attempts)
+        self.assertIsNone(notification.next_attempt)
+        self.assertIsNone(notification.sent_at)
+        self.assertEqual(3, mock_send.call_count)
+
+    def test_deliver_claimed(self, mock_send):
+        with freeze_time("2021-01-27 00:00:00"):
+            self.queue()
+            self.assertEqual(1, len(outbox._claim(datetime.utcnow(), 10)))
+            # Claimed by another worker
+            self.assertEqual(0, outbox.deliver())
+        mock_send.assert_not_called()
+
+        # The other worker died
+        with freeze_time("2021-01-27 00:05:00"):
+            self.assertEqual(1, outbox.deliver())
+
+    def test_deliver_missing_reservation(self, mock_send):
+        notification = models.UserNotification("gone", "start")
+        db.session.add(notification)
+        db.session.commit()
+
+        self.assertEqual(0, outbox.deliver())
+        mock_send.assert_not_called()
+        self.assertIsNone(notification.next_attempt)
+        self.assertEqual("Reservation not found", notification.last_error)
@@ -12,6 +12,7 @@
 #    under the License.
 
 from datetime import datetime
+import tempfile
 from unittest import mock
 
 from oslo_config import cfg
@@ -23,6 +24,40 @@ from warre.tests.unit import base
 CONF = cfg.CONF
 
 
+class TestSendMessage(base.TestCase):
+    @mock.patch("warre.notification.user.stevedore_driver.DriverManager")
+    def test_driver_loaded_once(self, mock_manager):
+        driver = mock_manager.return_value.driver
+        reservation = mock.Mock()
+        user.send_message(reservation, "start")
+        user.send_message(reservation, "end")
+
+        mock_manager.assert_called_once_with(
+            namespace="warre.user.notifier",
+            name="taynac",
+            invoke_on_load=True,
+        )
+        driver.send_message.assert_has_calls(
+            [mock.call(reservation, "start"), mock.call(reservation, "end")]
+        )
+
+    def test_environment_shared(self):
+        env = user.get_environment()
+        self.assertIs(env, user.get_environment())
+        self.assertIs(
+            env.get_template("start.tmpl"), env.get_template("start.tmpl")
+        )
+        self.assertIsNone(env.bytecode_cache)
+
+    def test_environment_bytecode_cache(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        cache_dir = tmp.name
+        CONF.set_override("template_cache_dir", cache_dir, group="warre")
+        env = user.get_environment()
+        self.assertEqual(cache_dir, env.bytecode_cache.directory)
+
+
 class TestUserNotifierBase(base.TestCase):
     def setUp(self, *args, **kwargs):
         super().setUp(*args, **kwargs)
@@ -77,3 +112,16 @@ class TestTaynacNotifier(TestUserNotifierBase):
             )
 
             self.assertEqual("23", ticket_id)
+
+    @mock.patch("warre.common.clients.get_taynacclient")
+    def test_send_message_reuses_client(self, mock_client):
+        notifier = user.TaynacNotifier()
+        taynac = mock_client.return_value
+        taynac.messages.send.return_value = mock.Mock(backend_id="23")
+
+        with mock.patch.object(notifier, "get_user"):
+            notifier.send_message(self.reservation, "create")
+            notifier.send_message(self.reservation, "start")
+
+        mock_client.assert_called_once()
+        self.assertEqual(2, taynac.messages.send.call_count)
@@ -0,0 +1,454 @@
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import collections
+from datetime import datetime
+from datetime import timedelta
+from itertools import chain
+from operator import itemgetter
+import random
+import unittest
+from unittest import mock
+
+from warre import availability
+from warre.tests.unit import base
+
+
+Interval = collections.namedtuple(
+    "Interval", ["start", "end", "instance_count", "id"], defaults=[1, "r1"]
+)
+
+
+def reference_free_slots(slots, reservations, windows, start, end):
+    """The per-instance free slot algorithm availability replaced"""
+    used_slots = []
+    for r in reservations:
+        for i in range(0, r.instance_count):
+            used_slots.append([(r.start, "start"), (r.end, "end")])
+    for window in windows:
+        for i in range(slots):
+            used_slots.append([(window.start, "start"), (window.end, "end")])
+
+    time_list = list(chain.from_iterable(used_slots))
+    time_list.sort(key=itemgetter(0))
+    segments = []
+    current_slot = 0
+    last_point = None
+    for point, kind in time_list:
+        if last_point is not None:
+            segments.append(
+                {"start": last_point, "end": point, "slot": current_slot}
+            )
+        last_point = point
+        current_slot = (
+            current_slot + 1 if kind == "start" else current_slot - 1
+        )
+    busy_slots = [s for s in segments if s["slot"] >= slots]
+
+    if len(busy_slots) == 0:
+        return [{"start": start, "end": end}]
+    free_slots = []
+    start_free = start
+    for s in busy_slots:
+        if s["start"] <= start <= s["end"]:
+            start_free = s["end"]
+        else:
+            diff = (s["start"] - start_free).total_seconds()
+            if start_free < s["start"] and diff > 60:
+                if start_free != start:
+                    start_free += timedelta(seconds=60)
+                free_slots.append(
+                    {
+                        "start": start_free,
+                        "end": (s["start"] - timedelta(seconds=1)).replace(
+                            second=0
+                        ),
+                    }
+                )
+            start_free = s["end"]
+    if start_free < end:
+        if start_free != start:
+            start_free += timedelta(seconds=60)
+        free_slots.append({"start": start_free, "end": end})
+    return free_slots
+
+
+class TestAvailability(base.TestCase):
+    def free_slots(self, slots, reservations, windows, start, end):
+        events = availability.build_events(reservations, windows, slots)
+        return availability.free_slots(events, slots, start, end)
+
+    def test_no_events(self):
+        start = datetime(2021, 1, 1)
+        end = datetime(2022, 1, 1)
+        self.assertEqual(
+            [{"start": start, "end": end}],
+            self.free_slots(1, [], [], start, end),
+        )
+
+    def test_build_events_weighted(self):
+        reservations = [
+            Interval(datetime(2021, 2, 1), datetime(2021, 3, 1), 3),
+        ]
+        windows = [Interval(datetime(2021, 1, 1), datetime(2021, 1, 2))]
+        events = availability.build_events(reservations, windows, 5)
+        self.assertEqual(
+            [
+                (datetime(2021, 1, 1), 5),
+                (datetime(2021, 1, 2), -5),
+                (datetime(2021, 2, 1), 3),
+                (datetime(2021, 3, 1), -3),
+            ],
+            events,
+        )
+
+    def test_multi_instance_fills_flavor(self):
+        reservations = [
+            Interval(datetime(2021, 2, 1), datetime(2021, 3, 1), 2),
+        ]
+        start = datetime(2021, 1, 1)
+        end = datetime(2022, 1, 1)
+        slots = self.free_slots(2, reservations, [], start, end)
+        self.assertEqual(
+            [
+                {"start": start, "end": datetime(2021, 1, 31, 23, 59)},
+                {"start": datetime(2021, 3, 1, 0, 1), "end": end},
+            ],
+            slots,
+        )
+
+    def test_busy_before_range(self):
+        reservations = [
+            Interval(datetime(2020, 1, 1), datetime(2021, 3, 1)),
+        ]
+        start = datetime(2021, 1, 1)
+        end = datetime(2022, 1, 1)
+        slots = self.free_slots(1, reservations, [], start, end)
+        self.assertEqual(
+            [{"start": datetime(2021, 3, 1, 0, 1), "end": end}], slots
+        )
+
+    def test_busy_segment_before_range(self):
+        start = datetime(2021, 1, 1)
+        end = datetime(2021, 1, 11)
+        reservations = [
+            Interval(start - timedelta(hours=10), start + timedelta(hours=5)),
+            Interval(start - timedelta(hours=10), start - timedelta(hours=1)),
+        ]
+        # The per-minute algorithm reported free time from before start
+        # when given a reservation that ended before it. The manager only
+        # passed it reservations overlapping the range so this never
+        # showed, but the ledger timeline has them all.
+        self.assertEqual(
+            [{"start": start - timedelta(minutes=59), "end": end}],
+            reference_free_slots(2, reservations, [], start, end),
+        )
+        self.assertEqual(
+            [{"start": start, "end": end}],
+            self.free_slots(2, reservations, [], start, end),
+        )
+
+    def test_randomized_matches_reference(self):
+        rng = random.Random(1234)
+        start = datetime(2021, 1, 1)
+        end = datetime(2021, 1, 11)
+        for i in range(500):
+            slots = rng.randint(1, 6)
+            intervals = []
+            for j in range(rng.randint(0, 12)):
+                # Coarse hour boundaries so that events often coincide,
+                # some reservations start and end before the range
+                r_start = start + timedelta(hours=rng.randint(-240, 240))
+                r_end = r_start + timedelta(hours=rng.randint(1, 96))
+                intervals.append(
+                    Interval(r_start, r_end, rng.randint(1, slots), f"r{j}")
+                )
+            windows = []
+            for j in range(rng.randint(0, 2)):
+                w_start = start + timedelta(hours=rng.randint(-96, 240))
+                w_end = w_start + timedelta(hours=rng.randint(1, 48))
+                windows.append(Interval(w_start, w_end))
+
+            # The reference was given only what overlaps the range, as
+            # Manager.flavor_free_slots used to filter it, the engine is
+            # given everything like the ledger timeline
+            overlapping = [
+                r for r in intervals if r.end >= start and r.start <= end
+            ]
+            overlapping_windows = [
+                w for w in windows if w.end >= start and w.start <= end
+            ]
+
+            self.assertEqual(
+                reference_free_slots(
+                    slots, overlapping, overlapping_windows, start, end
+                ),
+                self.free_slots(slots, intervals, windows, start, end),
+                f"Mismatch for slots={slots} reservations={intervals} "
+                f"windows={windows}",
+            )
+
+    def test_timeline_unfiltered_matches_filtered(self):
+        rng = random.Random(4321)
+        start = datetime(2021, 1, 1)
+        end = datetime(2021, 1, 11)
+        for i in range(300):
+            slots = rng.randint(1, 4)
+            intervals = []
+            for j in range(rng.randint(0, 12)):
+                r_start = start + timedelta(hours=rng.randint(-240, 480))
+                r_end = r_start + timedelta(hours=rng.randint(1, 96))
+                intervals.append(
+                    Interval(r_start, r_end, rng.randint(1, slots), f"r{j}")
+                )
+            overlapping = [
+                r for r in intervals if r.end >= start and r.start <= end
+            ]
+            timeline = availability.Timeline.from_intervals(intervals, [])
+
+            self.assertEqual(
+                self.free_slots(slots, overlapping, [], start, end),
+                availability.free_slots(
+                    timeline.events(slots), slots, start, end
+                ),
+            )
+
+    def test_timeline_events_exclude(self):
+        timeline = availability.Timeline.from_intervals(
+            [
+                Interval(datetime(2021, 2, 1), datetime(2021, 3, 1), 1, "a"),
+                Interval(datetime(2021, 2, 5), datetime(2021, 3, 5), 2, "b"),
+            ],
+            [Interval(datetime(2021, 1, 1), datetime(2021, 1, 2))],
+        )
+        self.assertEqual(
+            [
+                (datetime(2021, 1, 1), 3),
+                (datetime(2021, 1, 2), -3),
+                (datetime(2021, 2, 5), 2),
+                (datetime(2021, 3, 5), -2),
+            ],
+            list(timeline.events(3, exclude="a")),
+        )
+        self.assertEqual(
+            [
+                (datetime(2021, 2, 1), 1),
+                (datetime(2021, 3, 1), -1),
+            ],
+            list(timeline.events(3, exclude="b", include_maintenance=False)),
+        )
+
+    def test_next_slot(self):
+        reservations = [
+            Interval(datetime(2021, 1, 2), datetime(2021, 1, 3), 2, "a"),
+            Interval(datetime(2021, 1, 4), datetime(2021, 1, 5), 1, "b"),
+        ]
+        events = availability.build_events(reservations, [], 2)
+        start = datetime(2021, 1, 1)
+        end = datetime(2021, 2, 1)
+        day = timedelta(days=1)
+
+        self.assertEqual(
+            start, availability.next_slot(events, 2, 1, day / 2, start, end)
+        )
+        self.assertEqual(
+            datetime(2021, 1, 3, 0, 1),
+            availability.next_slot(events, 2, 1, 2 * day, start, end),
+        )
+        self.assertEqual(
+            datetime(2021, 1, 5, 0, 1),
+            availability.next_slot(events, 2, 2, 2 * day, start, end),
+        )
+        self.assertIsNone(
+            availability.next_slot(events, 2, 3, day, start, end)
+        )
+        self.assertIsNone(
+            availability.next_slot(events, 2, 2, 30 * day, start, end)
+        )
+        self.assertEqual(
+            datetime(2021, 1, 5, 0, 1),
+            availability.next_slot(events, 2, 2, 30 * day, start),
+        )
+
+    def test_next_slot_matches_free_slots(self):
+        rng = random.Random(2468)
+        start = datetime(2021, 1, 1)
+        end = datetime(2021, 1, 21)
+        for i in range(500):
+            slots = rng.randint(1, 4)
+            instance_count = rng.randint(1, slots)
+            duration = timedelta(hours=rng.randint(1, 72))
+            intervals = []
+            for j in range(rng.randint(0, 12)):
+                r_start = start + timedelta(hours=rng.randint(-48, 480))
+                r_end = r_start + timedelta(hours=rng.randint(1, 96))
+                intervals.append(
+                    Interval(r_start, r_end, rng.randint(1, slots), f"r{j}")
+                )
+            windows = []
+            for j in range(rng.randint(0, 2)):
+                w_start = start + timedelta(hours=rng.randint(-24, 480))
+                w_end = w_start + timedelta(hours=rng.randint(1, 48))
+                windows.append(Interval(w_start, w_end))
+            events = availability.build_events(intervals, windows, slots)
+
+            # Free slots with room for all the instances
+            threshold = slots - instance_count + 1
+            expected = [
+                s["start"]
+                for s in availability.free_slots(events, threshold, start, end)
+                if s["end"] - s["start"] >= duration
+            ]
+            self.assertEqual(
+                expected[0] if expected else None,
+                availability.next_slot(
+                    events, slots, instance_count, duration, start, end
+                ),
+                f"Mismatch for slots={slots} instances={instance_count} "
+                f"duration={duration} reservations={intervals} "
+                f"windows={windows}",
+            )
+
+    def test_instance_count(self):
+        reservations = [
+            Interval(datetime(2021, 2, 1), datetime(2021, 3, 1), 2, "a"),
+        ]
+        events = availability.build_events(reservations, [], 3)
+        start = datetime(2021, 1, 1)
+        end = datetime(2022, 1, 1)
+        self.assertEqual(
+            [{"start": start, "end": end}],
+            availability.free_slots(events, 3, start, end, instance_count=1),
+        )
+        self.assertEqual(
+            [
+                {"start": start, "end": datetime(2021, 1, 31, 23, 59)},
+                {"start": datetime(2021, 3, 1, 0, 1), "end": end},
+            ],
+            availability.free_slots(events, 3, start, end, instance_count=2),
+        )
+        self.assertEqual(
+            [],
+            availability.free_slots(events, 3, start, end, instance_count=4),
+        )
+
+    def test_instance_count_matches_reference(self):
+        rng = random.Random(1357)
+        start = datetime(2021, 1, 1)
+        end = datetime(2021, 1, 11)
+        for i in range(300):
+            slots = rng.randint(1, 6)
+            instance_count = rng.randint(1, slots)
+            intervals = []
+            for j in range(rng.randint(0, 12)):
+                r_start = start + timedelta(hours=rng.randint(-48, 240))
+                r_end = r_start + timedelta(hours=rng.randint(1, 96))
+                intervals.append(
+                    Interval(r_start, r_end, rng.randint(1, slots), f"r{j}")
+                )
+            intervals = [
+                r for r in intervals if r.end >= start and r.start <= end
+            ]
+            events = availability.build_events(intervals, [], slots)
+
+            # Fitting N instances in S slots is fitting one in S - N + 1
+            self.assertEqual(
+                reference_free_slots(
+                    slots - instance_count + 1, intervals, [], start, end
+                ),
+                availability.free_slots(
+                    events, slots, start, end, instance_count=instance_count
+                ),
+            )
+
+    def test_occupancy(self):
+        reservations = [
+            Interval(datetime(2020, 12, 1), datetime(2021, 1, 3), 1, "a"),
+            Interval(datetime(2021, 1, 2), datetime(2021, 1, 3), 2, "b"),
+            Interval(datetime(2021, 1, 3), datetime(2021, 1, 4), 3, "c"),
+            Interval(datetime(2021, 2, 1), datetime(2021, 2, 2), 1, "d"),
+        ]
+        events = availability.build_events(reservations, [], 4)
+        self.assertEqual(
+            [
+                (datetime(2021, 1, 1), 1),
+                (datetime(2021, 1, 2), 3),
+                (datetime(2021, 1, 4), 0),
+            ],
+            list(
+                availability.occupancy(
+                    events, datetime(2021, 1, 1), datetime(2021, 1, 10)
+                )
+            ),
+        )
+        self.assertEqual(
+            [(datetime(2021, 1, 5), 0)],
+            list(
+                availability.occupancy(
+                    events, datetime(2021, 1, 5), datetime(2021, 1, 10)
+                )
+            ),
+        )
+
+    def test_buckets(self):
+        start = datetime(2021, 1, 1)
+        steps = [
+            (start, 1),
+            (datetime(2021, 1, 1, 0, 30), 3),
+            (datetime(2021, 1, 1, 1), 2),
+            (datetime(2021, 1, 1, 2, 15), 0),
+        ]
+        self.assertEqual(
+            [
+                (start, 3, 2.0),
+                (datetime(2021, 1, 1, 1), 2, 2.0),
+                (datetime(2021, 1, 1, 2), 2, 1.0),
+            ],
+            list(
+                availability.buckets(
+                    steps,
+                    start,
+                    datetime(2021, 1, 1, 2, 30),
+                    timedelta(hours=1),
+                )
+            ),
+        )
+
+    @unittest.skipIf(availability.np is None, "numpy is not installed")
+    def test_buckets_vectorized_matches(self):
+        rng = random.Random(8642)
+        start = datetime(2021, 1, 1)
+        for i in range(200):
+            end = start + timedelta(
+                hours=rng.randint(1, 300), minutes=rng.choice([0, 30])
+            )
+            intervals = []
+            for j in range(rng.randint(0, 12)):
+                r_start = start + timedelta(hours=rng.randint(-48, 320))
+                r_end = r_start + timedelta(hours=rng.randint(1, 96))
+                intervals.append(
+                    Interval(r_start, r_end, rng.randint(1, 3), f"r{j}")
+                )
+            events = availability.build_events(intervals, [], 3)
+            steps = list(availability.occupancy(events, start, end))
+            width = timedelta(hours=rng.choice([1, 5, 24]))
+
+            with mock.patch.object(availability, "VECTORIZE_BUCKETS", 10**9):
+                expected = list(availability.buckets(steps, start, end, width))
+            with mock.patch.object(availability, "VECTORIZE_BUCKETS", 0):
+                actual = list(availability.buckets(steps, start, end, width))
+            self.assertEqual(
+                [b[:2] for b in expected], [b[:2] for b in actual]
+            )
+            for e, a in zip(expected, actual):
+                self.assertAlmostEqual(e[2], a[2])
@@ -0,0 +1,262 @@
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+from datetime import datetime
+from datetime import timedelta
+import random
+
+from warre import availability
+from warre.cmd import manage
+from warre.extensions import db
+from warre import ledger
+from warre import models
+from warre.tests.unit import base
+
+
+class TestLedger(base.TestCase):
+    def setUp(self):
+        super().setUp()
+        self.flavor = self.create_flavor(slots=4)
+
+    def rows(self):
+        return [
+            (r.reservation_id, r.maintenance_window_id, r.timestamp, r.delta)
+            for r in db.session.query(models.CapacityLedger).order_by(
+                models.CapacityLedger.timestamp, models.CapacityLedger.id
+            )
+        ]
+
+    def test_reservation_lifecycle(self):
+        reservation = self.create_reservation(
+            flavor_id=self.flavor.id,
+            status=models.Reservation.ALLOCATED,
+            start=datetime(2021, 2, 1),
+            end=datetime(2021, 3, 1),
+            instance_count=2,
+        )
+        self.assertEqual(
+            [
+                (reservation.id, None, datetime(2021, 2, 1), 2),
+                (reservation.id, None, datetime(2021, 3, 1), -2),
+            ],
+            self.rows(),
+        )
+
+        reservation.end = datetime(2021, 3, 10)
+        db.session.commit()
+        self.assertEqual(
+            [
+                (reservation.id, None, datetime(2021, 2, 1), 2),
+                (reservation.id, None, datetime(2021, 3, 10), -2),
+            ],
+            self.rows(),
+        )
+
+        reservation.status = models.Reservation.COMPLETE
+        db.session.commit()
+        self.assertEqual([], self.rows())
+
+        reservation.status = models.Reservation.ACTIVE
+        db.session.commit()
+        self.assertEqual(2, len(self.rows()))
+
+        db.session.delete(reservation)
+        db.session.commit()
+        self.assertEqual([], self.rows())
+
+    def test_ineffective_reservation(self):
+        self.create_reservation(
+            flavor_id=self.flavor.id,
+            status=models.Reservation.ERROR,
+            start=datetime(2021, 2, 1),
+            end=datetime(2021, 3, 1),
+        )
+        self.assertEqual([], self.rows())
+
+    def test_unrelated_change(self):
+        reservation = self.create_reservation(
+            flavor_id=self.flavor.id,
+            status=models.Reservation.ALLOCATED,
+            start=datetime(2021, 2, 1),
+            end=datetime(2021, 3, 1),
+        )
+        ids = [r.id for r in db.session.query(models.CapacityLedger)]
+        reservation.lease_id = "lease"
+        db.session.commit()
+        self.assertEqual(
+            ids, [r.id for r in db.session.query(models.CapacityLedger)]
+        )
+
+    def test_maintenance_window_lifecycle(self):
+        other_flavor = self.create_flavor()
+        window = self.create_maintenance_window(
+            start=datetime(2021, 5, 1),
+            end=datetime(2021, 6, 1),
+            flavors=[self.flavor, other_flavor],
+        )
+        self.assertEqual(4, len(self.rows()))
+
+        window.flavors = [other_flavor]
+        window.end = datetime(2021, 6, 2)
+        db.session.commit()
+        rows = db.session.query(models.CapacityLedger).all()
+        self.assertEqual({other_flavor.id}, {r.flavor_id for r in rows})
+        self.assertEqual(
+            [datetime(2021, 5, 1), datetime(2021, 6, 2)],
+            sorted(r.timestamp for r in rows),
+        )
+
+        db.session.delete(other_flavor)
+        db.session.commit()
+        self.assertEqual([], self.rows())
+
+        window.flavors = [self.flavor]
+        db.session.commit()
+        self.assertEqual(2, len(self.rows()))
+
+        db.session.delete(window)
+        db.session.commit()
+        self.assertEqual([], self.rows())
+
+    def test_read_timeline_range(self):
+        before = self.create_reservation(
+            flavor_id=self.flavor.id,
+            status=models.Reservation.ACTIVE,
+            start=datetime(2020, 12, 1),
+            end=datetime(2021, 2, 1),
+            instance_count=2,
+        )
+        inside = self.create_reservation(
+            flavor_id=self.flavor.id,
+            status=models.Reservation.ALLOCATED,
+            start=datetime(2021, 1, 10),
+            end=datetime(2021, 1, 20),
+        )
+        after = self.create_reservation(
+            flavor_id=self.flavor.id,
+            status=models.Reservation.ALLOCATED,
+            start=datetime(2021, 6, 1),
+            end=datetime(2021, 7, 1),
+        )
+        self.create_maintenance_window(
+            start=datetime(2020, 12, 20),
+            end=datetime(2021, 1, 5),
+            flavors=[self.flavor],
+        )
+        start = datetime(2021, 1, 1)
+        end = datetime(2021, 1, 25)
+
+        timeline = ledger.read_timeline(self.flavor.id, start, end)
+        self.assertEqual(2, timeline.reserved)
+        self.assertEqual(1, timeline.blocked)
+        self.assertEqual(
+            [
+                (datetime(2021, 1, 5), -1, None),
+                (datetime(2021, 1, 10), 1, inside.id),
+                (datetime(2021, 1, 20), -1, inside.id),
+                (datetime(2021, 2, 1), -2, before.id),
+            ],
+            timeline.entries,
+        )
+
+        timeline = ledger.read_timeline(
+            self.flavor.id,
+            start,
+            end,
+            exclude=before.id,
+            include_maintenance=False,
+        )
+        self.assertEqual(0, timeline.reserved)
+        self.assertEqual(0, timeline.blocked)
+        self.assertEqual(
+            [
+                (datetime(2021, 1, 10), 1, inside.id),
+                (datetime(2021, 1, 20), -1, inside.id),
+                (datetime(2021, 6, 1), 1, after.id),
+            ],
+            timeline.entries,
+        )
+
+    def test_read_timeline_matches_full(self):
+        rng = random.Random(42)
+        origin = datetime(2021, 1, 1)
+        for i in range(40):
+            self.create_reservation(
+                flavor_id=self.flavor.id,
+                status=models.Reservation.ALLOCATED,
+                start=origin + timedelta(hours=rng.randint(0, 500)),
+                end=origin + timedelta(hours=rng.randint(501, 900)),
+                instance_count=rng.randint(1, 2),
+            )
+        full = ledger.read_timeline(self.flavor.id)
+        for i in range(50):
+            start = origin + timedelta(hours=rng.randint(-50, 900))
+            end = start + timedelta(hours=rng.randint(1, 300))
+            ranged = ledger.read_timeline(self.flavor.id, start, end)
+            self.assertEqual(
+                availability.free_slots(
+                    full.events(self.flavor.slots), 4, start, end
+                ),
+                availability.free_slots(
+                    ranged.events(self.flavor.slots), 4, start, end
+                ),
+            )
+
+    def test_rebuild_and_verify(self):
+        self.create_reservation(
+            flavor_id=self.flavor.id,
+            status=models.Reservation.ALLOCATED,
+            start=datetime(2021, 2, 1),
+            end=datetime(2021, 3, 1),
+        )
+        self.create_maintenance_window(
+            start=datetime(2021, 5, 1),
+            end=datetime(2021, 6, 1),
+            flavors=[self.flavor],
+        )
+        self.assertEqual(([], []), ledger.verify())
+
+        rows = self.rows()
+        db.session.query(models.CapacityLedger).delete()
+        db.session.commit()
+        missing, unexpected = ledger.verify()
+        self.assertEqual(4, len(missing))
+        self.assertEqual([], unexpected)
+
+        version = self.flavor.version
+        self.assertEqual(4, ledger.rebuild())
+        self.assertEqual(rows, self.rows())
+        self.assertEqual(([], []), ledger.verify())
+        db.session.refresh(self.flavor)
+        self.assertEqual(version + 1, self.flavor.version)
+
+    def test_verify_ledger_command(self):
+        runner = self.app.test_cli_runner()
+        self.create_reservation(
+            flavor_id=self.flavor.id,
+            status=models.Reservation.ALLOCATED,
+            start=datetime(2021, 2, 1),
+            end=datetime(2021, 3, 1),
+        )
+        result = runner.invoke(manage.verify_ledger)
+        self.assertEqual(0, result.exit_code, result.output)
+
+        db.session.query(models.CapacityLedger).delete()
+        db.session.commit()
+        result = runner.invoke(manage.verify_ledger)
+        self.assertEqual(1, result.exit_code)
+        self.assertIn("2 missing", result.output)
+
+        result = runner.invoke(manage.rebuild_ledger)
+        self.assertEqual(0, result.exit_code, result.output)
+        self.assertIn("consistent", result.output)
@@ -12,17 +12,29 @@
 #    under the License.
 
 from datetime import datetime
+from datetime import timedelta
+import os
+import shutil
+import tempfile
+import threading
 from unittest import mock
 
 from freezegun import freeze_time
+from oslo_config import cfg
+from sqlalchemy import pool
 
+from warre import app
 from warre.common import exceptions
 from warre.extensions import db
+from warre import ledger
 from warre import manager
 from warre import models
 from warre.tests.unit import base
 
 
+CONF = cfg.CONF
+
+
 class TestManager(base.TestCase):
     def setUp(self):
         super().setUp()
@@ -219,6 +231,30 @@ class TestManager(base.TestCase):
         ):
             mgr.create_reservation(self.context, reservation2)
 
+    def test_create_reservation_not_enough_slots(self):
+        flavor = self.create_flavor(slots=5)
+        self.create_reservation(
+            flavor_id=flavor.id,
+            start=datetime(2020, 1, 1),
+            end=datetime(2020, 1, 2),
+            status=models.Reservation.ALLOCATED,
+            instance_count=4,
+        )
+        mgr = manager.Manager()
+        reservation = models.Reservation(
+            flavor_id=flavor.id,
+            start=datetime(2020, 1, 1),
+            end=datetime(2020, 1, 2),
+            instance_count=2,
+        )
+        with self.assertRaisesRegex(
+            exceptions.InvalidReservation, "No capacity"
+        ):
+            mgr.create_reservation(self.context, reservation)
+
+        reservation.instance_count = 1
+        mgr.create_reservation(self.context, reservation)
+
     @mock.patch("warre.common.blazar.BlazarClient")
     def test_delete_reservation(self, mock_blazar):
         blazar_client = mock_blazar.return_value
@@ -309,10 +345,54 @@ class TestManager(base.TestCase):
         with self.assertRaisesRegex(
             exceptions.InvalidReservation, "Failed to extend lease"
         ):
-            reservation = mgr.extend_reservation(
-                self.context, reservation, new_end
+            mgr.extend_reservation(self.context, reservation, new_end)
+
+        db.session.expire_all()
+        self.assertEqual(datetime(2021, 1, 2), reservation.end)
+        timeline = ledger.read_timeline(flavor.id)
+        self.assertEqual(
+            [datetime(2021, 1, 1), datetime(2021, 1, 2)],
+            [entry[0] for entry in timeline.entries],
+        )
+
+    @mock.patch("warre.common.blazar.BlazarClient")
+    def test_extend_reservation_commits_before_blazar(self, mock_blazar):
+        blazar_client = mock_blazar.return_value
+        flavor = self.create_flavor()
+        reservation = self.create_reservation(
+            status=models.Reservation.ACTIVE,
+            flavor_id=flavor.id,
+            start=datetime(2021, 1, 1),
+            end=datetime(2021, 1, 2),
+        )
+        reservation.lease_id = "foobar"
+        db.session.commit()
+        version = flavor.version
+        new_end = datetime(2021, 1, 3)
+
+        def update_lease(lease_id, end_date):
+            # Nothing is left to commit, so no row lock is held
+            self.assertFalse(db.session().in_transaction())
+            self.assertGreater(
+                db.session.query(models.Flavor.version)
+                .filter_by(id=flavor.id)
+                .scalar(),
+                version,
+            )
+            self.assertEqual(
+                new_end,
+                db.session.query(models.Reservation.end)
+                .filter_by(id=reservation.id)
+                .scalar(),
             )
 
+        blazar_client.update_lease.side_effect = update_lease
+        mgr = manager.Manager()
+        mgr.extend_reservation(self.context, reservation, new_end)
+        blazar_client.update_lease.assert_called_once_with(
+            "foobar", end_date=new_end
+        )
+
     def test_extend_reservation_no_lease(self):
         flavor = self.create_flavor()
         reservation = self.create_reservation(
@@ -329,6 +409,36 @@ class TestManager(base.TestCase):
                 self.context, reservation, new_end
             )
 
+    @mock.patch("warre.common.blazar.BlazarClient")
+    def test_extend_reservation_multi_instance(self, mock_blazar):
+        flavor = self.create_flavor(slots=3)
+        reservation = self.create_reservation(
+            status=models.Reservation.ACTIVE,
+            flavor_id=flavor.id,
+            start=datetime(2021, 1, 1),
+            end=datetime(2021, 1, 2),
+            instance_count=2,
+        )
+        reservation.lease_id = "foobar"
+        self.create_reservation(
+            status=models.Reservation.ALLOCATED,
+            flavor_id=flavor.id,
+            start=datetime(2021, 1, 3),
+            end=datetime(2021, 1, 4),
+            instance_count=2,
+        )
+        mgr = manager.Manager()
+        with self.assertRaisesRegex(
+            exceptions.InvalidReservation, "No capacity"
+        ):
+            mgr.extend_reservation(
+                self.context, reservation, datetime(2021, 1, 3, 12)
+            )
+        reservation = mgr.extend_reservation(
+            self.context, reservation, datetime(2021, 1, 2, 12)
+        )
+        self.assertEqual(datetime(2021, 1, 2, 12), reservation.end)
+
     def test_extend_reservation_flavor_end(self):
         flavor = self.create_flavor(end=datetime(2021, 1, 5))
         reservation = self.create_reservation(
@@ -425,6 +535,26 @@ class TestManager(base.TestCase):
             mgr.delete_flavor(self.context, self.flavor)
 
 
+class TestGetManager(base.TestCase):
+    @mock.patch("warre.common.blazar.BlazarClient")
+    @mock.patch("warre.worker.api.WorkerAPI")
+    def test_shared_and_lazy(self, mock_worker, mock_blazar):
+        mgr = manager.get_manager()
+        self.assertIs(mgr, manager.get_manager())
+        mock_worker.assert_not_called()
+        mock_blazar.assert_not_called()
+
+        self.assertIs(mock_worker.return_value, mgr.worker_api)
+        self.assertIs(mock_blazar.return_value, mgr.blazar)
+        mgr.worker_api
+        mgr.blazar
+        mock_worker.assert_called_once_with()
+        mock_blazar.assert_called_once_with()
+
+        manager.reset()
+        self.assertIsNot(mgr, manager.get_manager())
+
+
 @freeze_time("2020-01-26")
 class TestFlavorFreeSlots(base.TestCase):
     def setUp(self):
@@ -822,6 +952,106 @@ class TestFlavorFreeSlots(base.TestCase):
         self.assertEqual(end, slots[0]["end"])
 
 
+@freeze_time("2020-01-26")
+class TestFlavorTimelineCache(base.TestCase):
+    def setUp(self):
+        super().setUp()
+        self.flavor = self.create_flavor()
+        self.mgr = manager.Manager()
+        self.start = datetime(2021, 1, 1)
+        self.end = datetime(2022, 1, 1)
+
+    def free_slots(self):
+        return self.mgr.flavor_free_slots(
+            self.context, self.flavor, self.start, self.end
+        )
+
+    def test_timeline_cached(self):
+        self.free_slots()
+        with mock.patch.object(self.mgr, "_load_timeline") as mock_load:
+            self.free_slots()
+            mock_load.assert_not_called()
+
+    def test_range_read_without_cache(self):
+        CONF.set_override("backend", "none", group="capacity_cache")
+        self.create_reservation(
+            flavor_id=self.flavor.id,
+            status=models.Reservation.ALLOCATED,
+            start=datetime(2021, 2, 1),
+            end=datetime(2021, 3, 1),
+        )
+        with mock.patch.object(self.mgr, "_load_timeline") as mock_load:
+            self.assertEqual(2, len(self.free_slots()))
+            mock_load.assert_not_called()
+
+    def test_reservation_create_bumps_version(self):
+        version = self.flavor.version
+        self.assertEqual(1, len(self.free_slots()))
+        self.create_reservation(
+            flavor_id=self.flavor.id,
+            status=models.Reservation.ALLOCATED,
+            start=datetime(2021, 2, 1),
+            end=datetime(2021, 3, 1),
+        )
+        self.assertEqual(version + 1, self.flavor.version)
+        self.assertEqual(2, len(self.free_slots()))
+
+    def test_reservation_status_change_bumps_version(self):
+        reservation = self.create_reservation(
+            flavor_id=self.flavor.id,
+            status=models.Reservation.ALLOCATED,
+            start=datetime(2021, 2, 1),
+            end=datetime(2021, 3, 1),
+        )
+        self.assertEqual(2, len(self.free_slots()))
+        reservation.status = models.Reservation.ERROR
+        db.session.commit()
+        self.assertEqual(1, len(self.free_slots()))
+
+    def test_reservation_delete_bumps_version(self):
+        reservation = self.create_reservation(
+            flavor_id=self.flavor.id,
+            status=models.Reservation.ALLOCATED,
+            start=datetime(2021, 2, 1),
+            end=datetime(2021, 3, 1),
+        )
+        self.assertEqual(2, len(self.free_slots()))
+        db.session.delete(reservation)
+        db.session.commit()
+        self.assertEqual(1, len(self.free_slots()))
+
+    def test_maintenance_window_changes_bump_version(self):
+        other_flavor = self.create_flavor()
+        window = self.create_maintenance_window(
+            start=datetime(2021, 5, 1),
+            end=datetime(2021, 6, 1),
+            flavors=[self.flavor],
+        )
+        self.assertEqual(2, len(self.free_slots()))
+
+        window.flavors = [other_flavor]
+        db.session.commit()
+        self.assertEqual(1, len(self.free_slots()))
+
+        window.flavors = [self.flavor, other_flavor]
+        db.session.commit()
+        self.assertEqual(2, len(self.free_slots()))
+
+        db.session.delete(window)
+        db.session.commit()
+        self.assertEqual(1, len(self.free_slots()))
+
+    def test_unrelated_write_keeps_version(self):
+        version = self.flavor.version
+        other_flavor = self.create_flavor()
+        self.create_reservation(
+            flavor_id=other_flavor.id,
+            start=datetime(2021, 2, 1),
+            end=datetime(2021, 3, 1),
+        )
+        self.assertEqual(version, self.flavor.version)
+
+
 @mock.patch("warre.worker.api.WorkerAPI")
 class TestCreateReservationMaintenanceWindow(base.TestCase):
     def setUp(self):
@@ -939,3 +1169,226 @@ class TestCreateReservationMaintenanceWindow(base.TestCase):
             mgr.create_reservation(
                 self.context, reservation, bypass_maintenance=True
             )
+
+
+@mock.patch("warre.worker.api.WorkerAPI")
+class TestReservationAdmission(base.TestCase):
+    def setUp(self):
+        super().setUp()
+        self.flavor = self.create_flavor()
+        self.mgr = manager.Manager()
+
+    def new_reservation(self, flavor_id=None):
+        return models.Reservation(
+            flavor_id=flavor_id or self.flavor.id,
+            start=datetime(2021, 1, 1),
+            end=datetime(2021, 1, 2),
+        )
+
+    def test_claim_flavor(self, mock_worker):
+        version = self.flavor.version
+        self.assertTrue(self.mgr._claim_flavor(self.flavor, version))
+        self.assertFalse(self.mgr._claim_flavor(self.flavor, version))
+        db.session.commit()
+        self.assertEqual(version + 1, self.flavor.version)
+
+    def test_create_retries_after_conflict(self, mock_worker):
+        with mock.patch.object(
+            self.mgr, "_claim_flavor", side_effect=[False, True]
+        ) as mock_claim:
+            self.mgr.create_reservation(self.context, self.new_reservation())
+        self.assertEqual(2, mock_claim.call_count)
+
+    def test_create_gives_up(self, mock_worker):
+        CONF.set_override("admission_attempts", 3, group="warre")
+        with mock.patch.object(
+            self.mgr, "_claim_flavor", return_value=False
+        ) as mock_claim:
+            with self.assertRaisesRegex(
+                exceptions.InvalidReservation, "Flavor is busy"
+            ):
+                self.mgr.create_reservation(
+                    self.context, self.new_reservation()
+                )
+        self.assertEqual(3, mock_claim.call_count)
+        self.assertEqual(0, db.session.query(models.Reservation).count())
+
+
+@mock.patch("warre.common.blazar.BlazarClient", new=mock.Mock())
+@mock.patch("warre.worker.api.WorkerAPI", new=mock.Mock())
+class TestConcurrentAdmission(base.TestCase):
+    """Admission against a file database shared by several threads"""
+
+    WORKERS = 20
+
+    def create_app(self):
+        self.db_dir = tempfile.mkdtemp()
+        path = os.path.join(self.db_dir, "warre.db")
+        return app.create_app(
+            {
+                "SECRET_KEY": "secret",
+                "TESTING": True,
+                "SQLALCHEMY_DATABASE_URI": f"sqlite:///{path}",
+                # A connection per session so the threads really race
+                "SQLALCHEMY_ENGINE_OPTIONS": {
+                    "poolclass": pool.NullPool,
+                    "connect_args": {"timeout": 30},
+                },
+                "SQLALCHEMY_TRACK_MODIFICATIONS": False,
+            },
+            conf_file="warre/tests/etc/warre.conf",
+        )
+
+    def tearDown(self):
+        super().tearDown()
+        shutil.rmtree(self.db_dir)
+
+    def create_in_parallel(self, flavor_ids):
+        barrier = threading.Barrier(len(flavor_ids), timeout=30)
+        results = [None] * len(flavor_ids)
+
+        def create(i, flavor_id):
+            with self.app.app_context():
+                mgr = manager.Manager()
+                reservation = models.Reservation(
+                    flavor_id=flavor_id,
+                    start=datetime(2021, 1, 1),
+                    end=datetime(2021, 1, 2),
+                )
+                barrier.wait()
+                try:
+                    mgr.create_reservation(self.context, reservation)
+                    results[i] = "created"
+                except exceptions.InvalidReservation as e:
+                    results[i] = str(e)
+                finally:
+                    db.session.remove()
+
+        threads = [
+            threading.Thread(target=create, args=(i, flavor_id))
+            for i, flavor_id in enumerate(flavor_ids)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return results
+
+    def test_no_overbooking(self):
+        CONF.set_override(
+            "admission_attempts", self.WORKERS + 1, group="warre"
+        )
+        flavor = self.create_flavor(slots=1)
+
+        results = self.create_in_parallel([flavor.id] * self.WORKERS)
+
+        self.assertEqual(1, results.count("created"), results)
+        self.assertEqual(self.WORKERS - 1, results.count("No capacity"))
+        self.assertEqual(
+            1,
+            db.session.query(models.Reservation)
+            .filter_by(flavor_id=flavor.id)
+            .count(),
+        )
+
+    def test_other_flavors_admitted(self):
+        flavor_ids = [
+            self.create_flavor(name=f"test.{i}", slots=1).id
+            for i in range(self.WORKERS)
+        ]
+
+        results = self.create_in_parallel(flavor_ids)
+
+        self.assertEqual(["created"] * self.WORKERS, results)
+
+
+@freeze_time("2021-01-01")
+class TestFlavorsFreeSlots(base.TestCase):
+    def test_matches_flavor_free_slots(self):
+        flavors = [
+            self.create_flavor(slots=1),
+            self.create_flavor(slots=2, start=datetime(2021, 1, 15)),
+            self.create_flavor(slots=1, end=datetime(2021, 4, 1)),
+            self.create_flavor(active=False),
+            self.create_flavor(end=datetime(2020, 12, 1)),
+        ]
+        for flavor in flavors[:3]:
+            self.create_reservation(
+                flavor_id=flavor.id,
+                status=models.Reservation.ALLOCATED,
+                start=datetime(2021, 2, 1),
+                end=datetime(2021, 3, 1),
+            )
+        self.create_maintenance_window(
+            start=datetime(2021, 1, 10),
+            end=datetime(2021, 1, 20),
+            flavors=flavors[:2],
+        )
+        mgr = manager.Manager()
+        start = datetime(2021, 1, 5)
+        end = datetime(2021, 6, 1)
+
+        free_slots = mgr.flavors_free_slots(self.context, flavors, start, end)
+
+        self.assertEqual({f.id for f in flavors}, set(free_slots))
+        for flavor in flavors:
+            self.assertEqual(
+                mgr.flavor_free_slots(self.context, flavor, start, end),
+                free_slots[flavor.id],
+            )
+        self.assertEqual([], free_slots[flavors[3].id])
+        self.assertEqual([], free_slots[flavors[4].id])
+
+
+@freeze_time("2021-01-01")
+@mock.patch("warre.worker.api.WorkerAPI")
+class TestFlavorNextSlot(base.TestCase):
+    def setUp(self):
+        super().setUp()
+        self.flavor = self.create_flavor(slots=1)
+        self.mgr = manager.Manager()
+
+    def test_next_slot_is_admitted(self, mock_worker):
+        self.create_reservation(
+            flavor_id=self.flavor.id,
+            status=models.Reservation.ALLOCATED,
+            start=datetime(2021, 1, 1, 12),
+            end=datetime(2021, 1, 3),
+        )
+        self.create_maintenance_window(
+            start=datetime(2021, 1, 4),
+            end=datetime(2021, 1, 5),
+            flavors=[self.flavor],
+        )
+        duration = timedelta(days=1)
+        for expected in (
+            datetime(2021, 1, 5, 0, 1),
+            datetime(2021, 1, 6, 0, 2),
+        ):
+            slot = self.mgr.flavor_next_slot(
+                self.context, self.flavor, duration
+            )
+            self.assertEqual(
+                {"start": expected, "end": expected + duration}, slot
+            )
+            reservation = models.Reservation(
+                flavor_id=self.flavor.id, start=slot["start"], end=slot["end"]
+            )
+            self.mgr.create_reservation(self.context, reservation)
+
+    def test_next_slot_too_long(self, mock_worker):
+        with self.assertRaisesRegex(exceptions.InvalidReservation, "too long"):
+            self.mgr.flavor_next_slot(
+                self.context,
+                self.flavor,
+                timedelta(hours=self.flavor.max_length_hours + 1),
+            )
+
+    def test_next_slot_inactive(self, mock_worker):
+        self.flavor.active = False
+        db.session.commit()
+        self.assertIsNone(
+            self.mgr.flavor_next_slot(
+                self.context, self.flavor, timedelta(hours=1)
+            )
+        )
@@ -14,8 +14,12 @@
 from datetime import datetime
 
 from freezegun import freeze_time
+import sqlalchemy as sa
 
+from warre.api.v1.resources import maintenancewindow
+from warre.extensions import db
 from warre import models
+from warre import quota
 from warre.tests.unit import base
 
 
@@ -39,3 +43,82 @@ class TestModels(base.TestCase):
         self.assertEqual(504, flavor.max_length_hours)
         self.assertTrue(flavor.active)
         self.assertTrue(flavor.is_public)
+
+
+class TestReservationIndexes(base.TestCase):
+    """Check the hot reservation queries are planned with an index
+
+    Statements are captured as the application emits them and run
+    through EXPLAIN QUERY PLAN on the test SQLite database.
+    """
+
+    def capture(self, func, *args):
+        statements = []
+
+        def before_cursor_execute(conn, cursor, statement, params, *args):
+            statements.append((statement, params))
+
+        sa.event.listen(
+            db.engine, "before_cursor_execute", before_cursor_execute
+        )
+        try:
+            func(*args)
+        finally:
+            sa.event.remove(
+                db.engine, "before_cursor_execute", before_cursor_execute
+            )
+        self.assertEqual(1, len(statements))
+        return statements[0]
+
+    def assertUsesIndex(self, index, statement, params=()):
+        plan = db.session.connection().exec_driver_sql(
+            f"EXPLAIN QUERY PLAN {statement}", params
+        )
+        details = " ".join(row[-1] for row in plan)
+        self.assertIn(f"INDEX {index}", details)
+
+    def assertQueryUsesIndex(self, index, query):
+        compiled = query.statement.compile(
+            db.engine, compile_kwargs={"literal_binds": True}
+        )
+        self.assertUsesIndex(index, str(compiled))
+
+    def test_quota_usage(self):
+        self.assertUsesIndex(
+            "ix_reservation_project_id_status",
+            *self.capture(quota.get_usage_by_project, "p1", "reservation"),
+        )
+
+    def test_conflicting_reservation(self):
+        self.assertUsesIndex(
+            "ix_reservation_flavor_id_status_start",
+            *self.capture(
+                maintenancewindow._has_conflicting_reservation,
+                datetime(2021, 1, 1),
+                datetime(2021, 1, 2),
+                ["f1"],
+            ),
+        )
+
+    def test_lease_lookup(self):
+        self.assertQueryUsesIndex(
+            "ix_reservation_lease_id",
+            db.session.query(models.Reservation).filter_by(lease_id="l1"),
+        )
+
+    def test_finished_reservations(self):
+        self.assertQueryUsesIndex(
+            "ix_reservation_status_end",
+            db.session.query(models.Reservation)
+            .filter_by(status=models.Reservation.COMPLETE)
+            .filter(models.Reservation.end < datetime(2021, 1, 1)),
+        )
+
+    def test_marker_pagination(self):
+        self.assertQueryUsesIndex(
+            "ix_reservation_created_at_id",
+            db.session.query(models.Reservation)
+            .filter(models.Reservation.created_at > datetime(2021, 1, 1))
+            .order_by(models.Reservation.created_at, models.Reservation.id)
+            .limit(10),
+        )
@@ -12,12 +12,23 @@
 #    under the License.
 
 from datetime import datetime
+from datetime import timedelta
+import random
+from unittest import mock
 
+from oslo_config import cfg
+import sqlalchemy as sa
+from sqlalchemy.dialects import mysql
+
+from warre.extensions import db
 from warre import models
 from warre import quota
 from warre.tests.unit import base
 
 
+CONF = cfg.CONF
+
+
 class TestQuota(base.TestCase):
     def setUp(self):
         super().setUp()
@@ -89,3 +100,82 @@ class TestQuota(base.TestCase):
         )
         usage = quota.get_usage_by_project(base.PROJECT_ID, "hours")
         self.assertEqual(14, usage)
+
+    def test_get_usage_single_query(self):
+        self.create_reservation(
+            status=models.Reservation.ACTIVE,
+            flavor_id=self.flavor.id,
+            start=datetime(2021, 3, 2, 10, 0, 0),
+            end=datetime(2021, 3, 2, 13, 30, 0),
+            instance_count=2,
+        )
+        statements = []
+
+        def before_cursor_execute(conn, cursor, statement, *args):
+            statements.append(statement)
+
+        sa.event.listen(
+            db.engine, "before_cursor_execute", before_cursor_execute
+        )
+        self.addCleanup(
+            sa.event.remove,
+            db.engine,
+            "before_cursor_execute",
+            before_cursor_execute,
+        )
+        usage = quota.get_usage(base.PROJECT_ID, ["reservation", "hours"])
+        self.assertEqual({"reservation": 1, "hours": 8}, usage)
+        self.assertEqual(1, len(statements))
+
+    def test_total_hours_sql_matches_python(self):
+        rng = random.Random(97531)
+        for i in range(200):
+            start = datetime(2021, 1, 1) + timedelta(
+                minutes=rng.randint(0, 10000)
+            )
+            end = start + timedelta(
+                hours=rng.randint(0, 100),
+                minutes=rng.choice([0, 0, 1, 30, 59]),
+                seconds=rng.choice([0, 0, 1, 59]),
+                milliseconds=rng.choice([0, 0, 1, 999]),
+            )
+            self.create_reservation(
+                flavor_id=self.flavor.id, start=start, end=end
+            )
+        reservations = db.session.query(
+            models.Reservation, models.Reservation.total_hours
+        )
+        for reservation, hours in reservations:
+            self.assertEqual(reservation.total_hours, hours, reservation.end)
+
+    def test_total_hours_mysql(self):
+        statement = sa.select(models.Reservation.total_hours)
+        self.assertIn(
+            "CEIL(TIMESTAMPDIFF(MICROSECOND, reservation.start, "
+            "reservation.end) / 3600000000)",
+            str(statement.compile(dialect=mysql.dialect())),
+        )
+
+
+@mock.patch("warre.quota.limit.Enforcer")
+class TestGetEnforcer(base.TestCase):
+    def test_cached(self, mock_enforcer):
+        enforcer = quota.get_enforcer()
+        self.assertIs(enforcer, quota.get_enforcer())
+        mock_enforcer.assert_called_once_with(quota.get_usage)
+
+    @mock.patch("warre.quota.time.monotonic")
+    def test_expires(self, mock_monotonic, mock_enforcer):
+        mock_enforcer.side_effect = lambda usage: mock.Mock()
+        mock_monotonic.return_value = 1000
+        enforcer = quota.get_enforcer()
+        mock_monotonic.return_value = 1299
+        self.assertIs(enforcer, quota.get_enforcer())
+        mock_monotonic.return_value = 1300
+        self.assertIsNot(enforcer, quota.get_enforcer())
+
+    def test_no_cache(self, mock_enforcer):
+        CONF.set_override("limits_cache_time", 0, group="warre")
+        quota.get_enforcer()
+        quota.get_enforcer()
+        self.assertEqual(2, mock_enforcer.call_count)
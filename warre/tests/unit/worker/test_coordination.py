@@ -0,0 +1,139 @@
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+from datetime import datetime
+from datetime import timedelta
+import time
+from unittest import mock
+
+from freezegun import freeze_time
+from oslo_config import cfg
+
+from warre.tests.unit import base
+from warre.worker import coordination
+from warre.worker import periodic
+
+
+CONF = cfg.CONF
+
+
+class TestCoordination(base.TestCase):
+    def test_acquire(self):
+        with freeze_time("2021-01-01 00:00:00"):
+            self.assertTrue(coordination.acquire("task", 60, holder="w1"))
+            self.assertFalse(coordination.acquire("task", 60, holder="w2"))
+            self.assertTrue(coordination.acquire("other", 60, holder="w2"))
+
+        # Renewed by its holder
+        with freeze_time("2021-01-01 00:00:30"):
+            self.assertTrue(coordination.acquire("task", 60, holder="w1"))
+        with freeze_time("2021-01-01 00:01:20"):
+            self.assertFalse(coordination.acquire("task", 60, holder="w2"))
+
+    def test_takeover_after_expiry(self):
+        with freeze_time("2021-01-01 00:00:00"):
+            self.assertTrue(coordination.acquire("task", 60, holder="w1"))
+        # w1 died, its lock expires
+        with freeze_time("2021-01-01 00:01:00"):
+            self.assertTrue(coordination.acquire("task", 60, holder="w2"))
+            self.assertFalse(coordination.acquire("task", 60, holder="w1"))
+
+    def test_release(self):
+        with freeze_time("2021-01-01 00:00:00"):
+            self.assertTrue(coordination.acquire("task", 60, holder="w1"))
+        with freeze_time("2021-01-01 00:00:40"):
+            # Renewed during a long run
+            self.assertTrue(coordination.acquire("task", 60, holder="w1"))
+        with freeze_time("2021-01-01 00:01:10"):
+            self.assertFalse(coordination.acquire("task", 60, holder="w2"))
+            # Only its holder releases a lock
+            coordination.release("task", datetime(2021, 1, 1), holder="w2")
+            self.assertFalse(coordination.acquire("task", 60, holder="w2"))
+
+            coordination.release("task", datetime(2021, 1, 1), holder="w1")
+            self.assertTrue(coordination.acquire("task", 60, holder="w2"))
+
+    @mock.patch("warre.worker.coordination.os.getpid", return_value=42)
+    def test_default_holder(self, mock_getpid):
+        CONF.set_override("host", "worker1")
+        self.assertEqual("worker1:42", coordination.get_holder())
+        self.assertTrue(coordination.acquire("task", 60))
+        self.assertTrue(coordination.acquire("task", 60))
+        self.assertFalse(coordination.acquire("task", 60, holder="w2"))
+
+
+class TestCoordinatedPeriodicTask(base.TestCase):
+    def setUp(self):
+        super().setUp()
+        self.manager = mock.Mock()
+        self.service = periodic.PeriodicTaskService(1, CONF, self.manager)
+
+    def test_runs_with_lock(self):
+        self.manager.acquire_task_lock.return_value = True
+        self.service.notify_exists()
+        self.manager.acquire_task_lock.assert_called_once_with(
+            "notify_exists", CONF.worker.periodic_task_interval
+        )
+        self.manager.notify_exists.assert_called_once_with()
+
+    @freeze_time("2021-01-01")
+    def test_released_after_run(self):
+        self.manager.acquire_task_lock.return_value = True
+        self.manager.notify_exists.side_effect = ValueError
+        self.assertRaises(ValueError, self.service.notify_exists)
+        self.manager.release_task_lock.assert_called_once_with(
+            "notify_exists",
+            datetime(2021, 1, 1)
+            + timedelta(seconds=CONF.worker.periodic_task_interval),
+        )
+
+    def test_skipped_without_lock(self):
+        self.manager.acquire_task_lock.return_value = False
+        self.service.clean_old_reservations()
+        self.manager.clean_old_reservations.assert_not_called()
+
+    def test_long_run_not_overlapped(self):
+        CONF.set_override("periodic_task_interval", 1, group="worker")
+        app = self.app
+
+        class LockingManager:
+            def acquire_task_lock(self, name, duration):
+                with app.app_context():
+                    return coordination.acquire(name, duration, holder="w1")
+
+            def release_task_lock(self, name, until):
+                with app.app_context():
+                    coordination.release(name, until, holder="w1")
+
+            def clean_old_reservations(self):
+                # Runs past its interval, the lock is renewed meanwhile
+                time.sleep(1.6)
+                with app.app_context():
+                    self.acquired = coordination.acquire(
+                        "clean_old_reservations", 1, holder="w2"
+                    )
+
+        manager = LockingManager()
+        self.service.manager = manager
+        self.service.clean_old_reservations()
+        self.assertFalse(manager.acquired)
+        # Released once done, the run went past its interval
+        self.assertTrue(
+            coordination.acquire("clean_old_reservations", 1, holder="w2")
+        )
+
+    def test_coordination_disabled(self):
+        CONF.set_override("periodic_task_coordination", False, group="worker")
+        self.service.clean_old_maintenance_windows()
+        self.manager.acquire_task_lock.assert_not_called()
+        self.manager.clean_old_maintenance_windows.assert_called_once_with()
@@ -15,6 +15,8 @@ import datetime
 from unittest import mock
 
 from freezegun import freeze_time
+from oslo_config import cfg
+import prometheus_client
 
 from warre.common import notifications
 from warre.extensions import db
@@ -23,11 +25,13 @@ from warre.tests.unit import base
 from warre.worker import manager as worker_manager
 
 
+CONF = cfg.CONF
+
+
 @mock.patch("warre.app.create_app")
 class TestManager(base.TestCase):
-    @mock.patch("warre.worker.manager.user")
     @mock.patch("warre.common.blazar.BlazarClient")
-    def test_create_lease(self, mock_blazar, mock_user, mock_app):
+    def test_create_lease(self, mock_blazar, mock_app):
         blazar_client = mock_blazar.return_value
         flavor = self.create_flavor()
         reservation = self.create_reservation(
@@ -52,13 +56,12 @@ class TestManager(base.TestCase):
             self.assertEqual("fake-lease-id", reservation.lease_id)
             self.assertEqual("fake-nova-flavor", reservation.compute_flavor)
             self.assertEqual("ALLOCATED", reservation.status)
-            mock_user.send_message.assert_called_once_with(
-                reservation, "create"
-            )
+            notification = db.session.query(models.UserNotification).one()
+            self.assertEqual(reservation.id, notification.reservation_id)
+            self.assertEqual("create", notification.event)
 
-    @mock.patch("warre.worker.manager.user")
     @mock.patch("warre.common.blazar.BlazarClient")
-    def test_create_lease_error(self, mock_blazar, mock_user, mock_app):
+    def test_create_lease_error(self, mock_blazar, mock_app):
         blazar_client = mock_blazar.return_value
         flavor = self.create_flavor()
         reservation = self.create_reservation(
@@ -79,7 +82,9 @@ class TestManager(base.TestCase):
             self.assertIsNone(reservation.lease_id)
             self.assertEqual("ERROR", reservation.status)
             self.assertEqual("Bad ERROR", reservation.status_reason)
-            mock_user.send_message.assert_not_called()
+            self.assertEqual(
+                0, db.session.query(models.UserNotification).count()
+            )
 
     @freeze_time("2021-01-27")
     def test_clean_old_reservations(self, mock_app):
@@ -96,20 +101,90 @@ class TestManager(base.TestCase):
             start=datetime.datetime(2021, 1, 10),
             end=datetime.datetime(2021, 1, 20),
         )
-        self.create_reservation(
+        old = self.create_reservation(
             flavor_id=flavor.id,
             status="COMPLETE",
             start=datetime.datetime(2021, 1, 3),
             end=datetime.datetime(2021, 1, 19),
         )
+        failed = self.create_reservation(
+            flavor_id=flavor.id,
+            status="ERROR",
+            start=datetime.datetime(2021, 1, 3),
+            end=datetime.datetime(2021, 1, 19),
+        )
+        failed.status_reason = "No capacity"
+        db.session.add(models.UserNotification(failed.id, "end"))
+        db.session.commit()
+        failed_id = failed.id
+        archived_ids = {old.id, failed_id}
 
         reservations = db.session.query(models.Reservation).all()
-        self.assertEqual(3, len(reservations))
+        self.assertEqual(4, len(reservations))
         manager = worker_manager.Manager()
-        manager.clean_old_reservations()
+        self.assertEqual(2, manager.clean_old_reservations())
         reservations = db.session.query(models.Reservation).all()
         self.assertEqual(2, len(reservations))
 
+        self.assertEqual(0, db.session.query(models.UserNotification).count())
+        archived = {
+            r.id: r for r in db.session.query(models.ReservationArchive)
+        }
+        self.assertEqual(archived_ids, set(archived))
+        self.assertEqual("No capacity", archived[failed_id].status_reason)
+        self.assertEqual(flavor.id, archived[failed_id].flavor_id)
+        self.assertEqual(
+            datetime.datetime(2021, 1, 19), archived[failed_id].end
+        )
+        self.assertEqual(
+            datetime.datetime(2021, 1, 27), archived[failed_id].archived_at
+        )
+
+    @freeze_time("2021-01-27")
+    def test_clean_old_reservations_batched(self, mock_app):
+        CONF.set_override("cleanup_batch_size", 2, group="worker")
+        flavor = self.create_flavor()
+        for i in range(5):
+            self.create_reservation(
+                flavor_id=flavor.id,
+                status="COMPLETE",
+                start=datetime.datetime(2021, 1, 3),
+                end=datetime.datetime(2021, 1, 19),
+            )
+        active = self.create_reservation(
+            flavor_id=flavor.id,
+            status="ACTIVE",
+            start=datetime.datetime(2021, 1, 3),
+            end=datetime.datetime(2021, 1, 19),
+        )
+
+        manager = worker_manager.Manager()
+        with (
+            mock.patch.object(
+                db.session, "commit", wraps=db.session.commit
+            ) as mock_commit,
+            mock.patch.object(worker_manager, "LOG") as mock_log,
+        ):
+            self.assertEqual(5, manager.clean_old_reservations())
+        self.assertEqual(3, mock_commit.call_count)
+        self.assertEqual(
+            ("Archived", 5, "old reservations"),
+            mock_log.info.call_args[0][1:4],
+        )
+        self.assertEqual(
+            5, db.session.query(models.ReservationArchive).count()
+        )
+        self.assertEqual(
+            [active.id], [r.id for r in db.session.query(models.Reservation)]
+        )
+        self.assertEqual(
+            {active.id},
+            {
+                row.reservation_id
+                for row in db.session.query(models.CapacityLedger)
+            },
+        )
+
     @freeze_time("2021-01-27")
     def test_clean_old_maintenance_windows(self, mock_app):
         flavor = self.create_flavor()
@@ -129,6 +204,7 @@ class TestManager(base.TestCase):
             flavors=[flavor],
         )
 
+        finished_id = finished.id
         self.assertEqual(3, db.session.query(models.MaintenanceWindow).count())
         manager = worker_manager.Manager()
         manager.clean_old_maintenance_windows()
@@ -137,7 +213,46 @@ class TestManager(base.TestCase):
             w.id for w in db.session.query(models.MaintenanceWindow).all()
         }
         self.assertEqual({ongoing.id, future.id}, remaining_ids)
-        self.assertNotIn(finished.id, remaining_ids)
+        self.assertNotIn(finished_id, remaining_ids)
+
+    @freeze_time("2021-01-27")
+    def test_clean_old_maintenance_windows_batched(self, mock_app):
+        CONF.set_override("cleanup_batch_size", 2, group="worker")
+        flavor = self.create_flavor()
+        other_flavor = self.create_flavor()
+        for i in range(3):
+            self.create_maintenance_window(
+                start=datetime.datetime(2021, 1, 10),
+                end=datetime.datetime(2021, 1, 20),
+                flavors=[flavor, other_flavor],
+            )
+        ongoing = self.create_maintenance_window(
+            start=datetime.datetime(2021, 1, 25),
+            end=datetime.datetime(2021, 1, 30),
+            flavors=[flavor],
+        )
+        version = flavor.version
+
+        manager = worker_manager.Manager()
+        self.assertEqual(3, manager.clean_old_maintenance_windows())
+
+        self.assertEqual(
+            [ongoing.id],
+            [w.id for w in db.session.query(models.MaintenanceWindow)],
+        )
+        window_flavors = db.session.execute(
+            models.maintenance_window_flavor.select()
+        ).all()
+        self.assertEqual([(ongoing.id, flavor.id)], window_flavors)
+        self.assertEqual(
+            {ongoing.id},
+            {
+                row.maintenance_window_id
+                for row in db.session.query(models.CapacityLedger)
+            },
+        )
+        db.session.refresh(flavor)
+        self.assertEqual(version + 2, flavor.version)
 
     @freeze_time("2021-01-27")
     @mock.patch("warre.common.rpc.get_notifier")
@@ -259,7 +374,7 @@ class TestManager(base.TestCase):
             start=datetime.datetime(2021, 1, 11),
             end=datetime.datetime(2021, 1, 30),
         )
-        res2.compute_flavor = "compute-flavor-id"
+        res2.compute_flavor = "compute-flavor-id-2"
 
         nova_client = mock_nova.return_value
         nova_client.servers.list.side_effect = Exception("Unknown Error")
@@ -321,3 +436,174 @@ class TestManager(base.TestCase):
                 ),
             ]
         )
+
+    @freeze_time("2021-01-27")
+    @mock.patch("warre.common.clients.get_novaclient")
+    @mock.patch("warre.common.rpc.get_notifier")
+    def test_notify_exists_query_count(
+        self, mock_get_notifier, mock_nova, mock_app
+    ):
+        for i in range(5):
+            self.create_reservation(
+                flavor_id=self.create_flavor().id,
+                status="ACTIVE",
+                start=datetime.datetime(2021, 1, 10),
+                end=datetime.datetime(2021, 1, 30),
+            )
+        manager = worker_manager.Manager()
+        db.session.expunge_all()
+
+        # Flavors are joined in, not read per reservation
+        with self.assertMaxQueries(2):
+            manager.notify_exists()
+        self.assertEqual(5, mock_get_notifier.return_value.info.call_count)
+
+    @freeze_time("2021-01-27")
+    @mock.patch("warre.common.clients.get_novaclient")
+    @mock.patch("warre.common.rpc.get_notifier")
+    def test_notify_exists_lookups_grouped(
+        self, mock_get_notifier, mock_nova, mock_app
+    ):
+        notifier = mock_get_notifier.return_value
+        flavor = self.create_flavor()
+        reservations = []
+        for project_id, compute_flavor in [
+            ("p1", "cf1"),
+            ("p1", "cf1"),
+            ("p1", "cf2"),
+            ("p2", "cf1"),
+            ("p2", None),
+        ]:
+            res = self.create_reservation(
+                flavor_id=flavor.id,
+                status="ACTIVE",
+                start=datetime.datetime(2021, 1, 10),
+                end=datetime.datetime(2021, 1, 30),
+            )
+            res.project_id = project_id
+            res.compute_flavor = compute_flavor
+            reservations.append(res)
+        db.session.commit()
+
+        def servers_list(search_opts):
+            in_use = {("p1", "cf1"), ("p2", "cf1")}
+            key = (search_opts["tenant_id"], search_opts["flavor"])
+            return [mock.Mock()] if key in in_use else []
+
+        nova_client = mock_nova.return_value
+        nova_client.servers.list.side_effect = servers_list
+        manager = worker_manager.Manager()
+        manager.notify_exists()
+
+        self.assertEqual(3, nova_client.servers.list.call_count)
+        in_use = [
+            c.args[2]["id"]
+            for c in notifier.info.call_args_list
+            if c.args[1] == "warre.reservation.in_use"
+        ]
+        self.assertEqual(
+            sorted(
+                [reservations[0].id, reservations[1].id, reservations[3].id]
+            ),
+            sorted(in_use),
+        )
+        self.assertEqual(8, notifier.info.call_count)
+
+
+@mock.patch("warre.app.create_app")
+@mock.patch("warre.worker.manager.clients")
+@mock.patch("warre.worker.manager.keystone")
+@mock.patch("warre.worker.manager.loading")
+class TestBotSession(base.TestCase):
+    def test_cached_per_project(
+        self, mock_loading, mock_keystone, mock_clients, mock_app
+    ):
+        manager = worker_manager.Manager()
+        session = manager.get_bot_session("p1")
+        self.assertIs(session, manager.get_bot_session("p1"))
+        self.assertIsNot(session, manager.get_bot_session("p2"))
+
+        grant = mock_clients.get_admin_keystoneclient.return_value.roles.grant
+        self.assertEqual(2, grant.call_count)
+        self.assertEqual(
+            2,
+            mock_loading.get_plugin_loader.return_value.load_from_options.call_count,
+        )
+        stats = manager.cache_stats()["bot_sessions"]
+        self.assertEqual(1, stats["hits"])
+        self.assertEqual(2, stats["misses"])
+        self.assertAlmostEqual(1 / 3, stats["hit_rate"])
+
+    def test_metrics(
+        self, mock_loading, mock_keystone, mock_clients, mock_app
+    ):
+        def lookups(cache, result):
+            return (
+                prometheus_client.REGISTRY.get_sample_value(
+                    "warre_cache_lookups_total",
+                    {"cache": cache, "result": result},
+                )
+                or 0
+            )
+
+        before = {
+            (cache, result): lookups(cache, result)
+            for cache in ("bot_sessions", "bot_grants")
+            for result in ("hit", "miss")
+        }
+        CONF.set_override("bot_session_cache_size", 1, group="warre")
+        manager = worker_manager.Manager()
+        manager.get_bot_session("p1")
+        manager.get_bot_session("p1")
+        manager.get_bot_session("p2")
+        manager.get_bot_session("p1")
+        self.assertEqual(
+            {
+                ("bot_sessions", "hit"): 1,
+                ("bot_sessions", "miss"): 3,
+                ("bot_grants", "hit"): 1,
+                ("bot_grants", "miss"): 2,
+            },
+            {key: lookups(*key) - value for key, value in before.items()},
+        )
+
+    def test_lru_eviction(
+        self, mock_loading, mock_keystone, mock_clients, mock_app
+    ):
+        CONF.set_override("bot_session_cache_size", 1, group="warre")
+        manager = worker_manager.Manager()
+        session = manager.get_bot_session("p1")
+        manager.get_bot_session("p2")
+        self.assertIsNot(session, manager.get_bot_session("p1"))
+
+        # The role grant is still known, only the session is rebuilt
+        grant = mock_clients.get_admin_keystoneclient.return_value.roles.grant
+        self.assertEqual(2, grant.call_count)
+        self.assertEqual(1, manager.cache_stats()["bot_grants"]["hits"])
+
+    @mock.patch("warre.common.blazar.BlazarClient")
+    def test_forgotten_on_lease_error(
+        self,
+        mock_blazar,
+        mock_loading,
+        mock_keystone,
+        mock_clients,
+        mock_app,
+    ):
+        mock_blazar.return_value.create_lease.side_effect = Exception("403")
+        flavor = self.create_flavor()
+        reservation = self.create_reservation(
+            flavor_id=flavor.id,
+            start=datetime.datetime(2021, 1, 1),
+            end=datetime.datetime(2021, 1, 2),
+        )
+        manager = worker_manager.Manager()
+        session = manager.get_bot_session(reservation.project_id)
+
+        manager.create_lease(reservation.id)
+
+        self.assertIsNot(
+            session, manager.get_bot_session(reservation.project_id)
+        )
+        grant = mock_clients.get_admin_keystoneclient.return_value.roles.grant
+        self.assertEqual(2, grant.call_count)
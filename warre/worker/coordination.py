@@ -0,0 +1,92 @@
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import datetime
+import os
+
+from oslo_config import cfg
+from oslo_log import log as logging
+import sqlalchemy as sa
+from sqlalchemy import exc as sa_exc
+
+from warre.extensions import db
+from warre import models
+
+
+CONF = cfg.CONF
+LOG = logging.getLogger(__name__)
+
+
+def get_holder():
+    """Identify this worker process across all hosts"""
+    return f"{CONF.host}:{os.getpid()}"
+
+
+def acquire(name, duration, holder=None):
+    """Try to take the lock of a task for a number of seconds
+
+    The lock is a row in the task_lock table. It is taken when it is
+    free, expired or already held by holder, in which case it is
+    renewed. When the holder dies another worker takes it over once it
+    expires. Expiry uses the worker clocks, they are expected to be in
+    sync.
+
+    Returns True when the lock is held by holder.
+    """
+    holder = holder or get_holder()
+    now = datetime.datetime.utcnow()
+    expires = now + datetime.timedelta(seconds=duration)
+
+    updated = (
+        db.session.query(models.TaskLock)
+        .filter(models.TaskLock.name == name)
+        .filter(
+            sa.or_(
+                models.TaskLock.expires <= now,
+                models.TaskLock.holder == holder,
+            )
+        )
+        .update(
+            {
+                models.TaskLock.holder: holder,
+                models.TaskLock.expires: expires,
+            },
+            synchronize_session=False,
+        )
+    )
+    if updated:
+        db.session.commit()
+        return True
+
+    db.session.add(models.TaskLock(name, holder, expires))
+    try:
+        db.session.commit()
+    except sa_exc.IntegrityError:
+        # Held by another worker
+        db.session.rollback()
+        return False
+    return True
+
+
+def release(name, until, holder=None):
+    """Make the lock of a task held by holder expire at a given time
+
+    Releasing a lock at the end of the interval its run started in, not
+    at once, keeps the task to one run per interval across workers. A
+    run that took longer frees the lock straight away.
+    """
+    holder = holder or get_holder()
+    db.session.query(models.TaskLock).filter_by(
+        name=name, holder=holder
+    ).update({models.TaskLock.expires: until}, synchronize_session=False)
+    db.session.commit()
@@ -11,24 +11,31 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+from concurrent import futures
 import datetime
 import functools
+import time
 
 from keystoneauth1 import loading
 from keystoneauth1 import session
 from oslo_config import cfg
 from oslo_context import context
 from oslo_log import log as logging
+import sqlalchemy as sa
+from sqlalchemy import orm
 
 from warre import app
 from warre.common import blazar
+from warre.common import cache
 from warre.common import clients
 from warre.common import keystone
+from warre.common import metrics
 from warre.common import notifications
 from warre.common import rpc
 from warre.extensions import db
 from warre import models
-from warre.notification import user
+from warre.notification import outbox
+from warre.worker import coordination
 
 
 CONF = cfg.CONF
@@ -48,7 +55,18 @@ class Manager:
     def __init__(self):
         self.app = app.create_app(init_config=False)
         self.notifier = rpc.get_notifier()
+        self.bot_sessions = cache.MemoryCache(
+            CONF.warre.bot_session_cache_size,
+            CONF.warre.bot_session_cache_time,
+            name="bot_sessions",
+        )
+        self.bot_grants = cache.MemoryCache(
+            CONF.warre.bot_grant_cache_size,
+            CONF.warre.bot_grant_cache_time,
+            name="bot_grants",
+        )
 
+    @metrics.timed("create_lease")
     @app_context
     def create_lease(self, reservation_id):
         LOG.info("Creating Blazar lease for %s", reservation_id)
@@ -67,6 +85,8 @@ class Manager:
             LOG.exception(
                 "Failed to create lease for reservation %s", reservation.id
             )
+            # The bot's access may have been revoked, start afresh next time
+            self.forget_bot_session(reservation.project_id)
         else:
             reservation.lease_id = lease["id"]
             reservation.compute_flavor = lease.get("reservations")[0].get(
@@ -74,21 +94,45 @@ class Manager:
             )
             reservation.status = models.Reservation.ALLOCATED
             LOG.info("Created Blazar lease with ID %s", reservation.lease_id)
+            outbox.queue(reservation, "create")
         db.session.add(reservation)
         db.session.commit()
-        if reservation.status == models.Reservation.ALLOCATED:
-            user.send_message(reservation, "create")
 
     def ensure_bot_access(self, project_id):
-        k_session = keystone.KeystoneSession().get_session()
+        if self.bot_grants.get(project_id):
+            return
+        k_session = keystone.get_session()
         client = clients.get_admin_keystoneclient(k_session)
         client.roles.grant(
             user=CONF.warre.bot_user_id,
             project=project_id,
             role=CONF.warre.bot_role_id,
         )
+        self.bot_grants.set(project_id, True)
 
     def get_bot_session(self, project_id):
+        """Get a session for the bot user scoped to a project
+
+        Sessions are cached per project and reuse their token, which
+        keystoneauth renews when it expires.
+        """
+        bot_session = self.bot_sessions.get(project_id)
+        if bot_session is None:
+            bot_session = self._new_bot_session(project_id)
+            self.bot_sessions.set(project_id, bot_session)
+        return bot_session
+
+    def forget_bot_session(self, project_id):
+        self.bot_sessions.delete(project_id)
+        self.bot_grants.delete(project_id)
+
+    def cache_stats(self):
+        return {
+            "bot_sessions": self.bot_sessions.stats(),
+            "bot_grants": self.bot_grants.stats(),
+        }
+
+    def _new_bot_session(self, project_id):
         self.ensure_bot_access(project_id)
         loader = loading.get_plugin_loader("password")
         auth = loader.load_from_options(
@@ -101,86 +145,209 @@ class Manager:
         )
         return session.Session(auth=auth)
 
+    @app_context
+    def acquire_task_lock(self, name, duration):
+        return coordination.acquire(name, duration)
+
+    @app_context
+    def release_task_lock(self, name, until):
+        coordination.release(name, until)
+
+    def _remove_in_batches(self, action, what, ids_query, remove):
+        """Remove rows a batch at a time, committing after each batch
+
+        action - what remove does to the rows for the log, like "Deleted"
+        ids_query - query of the ids of the rows to remove
+        remove - called with a batch of ids to remove those rows
+        """
+        batch_size = CONF.worker.cleanup_batch_size
+        started = time.monotonic()
+        total = 0
+        while True:
+            ids = [row[0] for row in ids_query.limit(batch_size)]
+            if not ids:
+                break
+            remove(ids)
+            db.session.commit()
+            total += len(ids)
+            LOG.info("%s %s %s so far", action, total, what)
+            if len(ids) < batch_size:
+                break
+        elapsed = time.monotonic() - started
+        LOG.info(
+            "%s %s %s in %.2fs (%.0f/s)",
+            action,
+            total,
+            what,
+            elapsed,
+            total / elapsed if elapsed else 0,
+        )
+        return total
+
     @app_context
     def clean_old_reservations(self):
-        LOG.info("Cleaning old reservations")
+        """Move reservations finished over a week ago to the archive"""
+        LOG.info("Archiving old reservations")
         now = datetime.datetime.utcnow()
         week_ago = now - datetime.timedelta(days=7)
-        reservations = (
-            db.session.query(models.Reservation)
-            .filter_by(status=models.Reservation.COMPLETE)
-            .filter(models.Reservation.end < week_ago)
-            .all()
+        Reservation = models.Reservation
+        ids_query = (
+            db.session.query(Reservation.id)
+            .filter(Reservation.status.in_(Reservation.FINISHED_STATES))
+            .filter(Reservation.end < week_ago)
+            .order_by(Reservation.id)
+        )
+        columns = list(Reservation.__table__.columns)
+        archive = models.ReservationArchive.__table__
+
+        def archive_batch(ids):
+            db.session.execute(
+                archive.insert().from_select(
+                    [c.name for c in columns] + ["archived_at"],
+                    sa.select(*columns, sa.literal(now)).where(
+                        Reservation.id.in_(ids)
+                    ),
+                )
+            )
+            # Bulk deletes skip the flush hooks, finished reservations
+            # have no ledger rows but clear any left behind
+            db.session.query(models.CapacityLedger).filter(
+                models.CapacityLedger.reservation_id.in_(ids)
+            ).delete(synchronize_session=False)
+            db.session.query(models.UserNotification).filter(
+                models.UserNotification.reservation_id.in_(ids)
+            ).delete(synchronize_session=False)
+            db.session.query(Reservation).filter(
+                Reservation.id.in_(ids)
+            ).delete(synchronize_session=False)
+
+        return self._remove_in_batches(
+            "Archived", "old reservations", ids_query, archive_batch
         )
-        for reservation in reservations:
-            LOG.info("Deleting finished reservation %s", reservation)
-            db.session.delete(reservation)
-        db.session.commit()
 
     @app_context
     def clean_old_maintenance_windows(self):
         LOG.info("Cleaning finished maintenance windows")
         now = datetime.datetime.utcnow()
-        windows = (
-            db.session.query(models.MaintenanceWindow)
+        ids_query = (
+            db.session.query(models.MaintenanceWindow.id)
             .filter(models.MaintenanceWindow.end < now)
-            .all()
+            .order_by(models.MaintenanceWindow.id)
+        )
+        window_flavor = models.maintenance_window_flavor
+
+        def delete(ids):
+            in_windows = window_flavor.c.maintenance_window_id.in_(ids)
+            flavor_ids = db.session.scalars(
+                sa.select(window_flavor.c.flavor_id)
+                .where(in_windows)
+                .distinct()
+            ).all()
+            db.session.execute(window_flavor.delete().where(in_windows))
+            db.session.query(models.CapacityLedger).filter(
+                models.CapacityLedger.maintenance_window_id.in_(ids)
+            ).delete(synchronize_session=False)
+            db.session.query(models.MaintenanceWindow).filter(
+                models.MaintenanceWindow.id.in_(ids)
+            ).delete(synchronize_session=False)
+            # The ledger of these flavors changed, invalidate any cached
+            # timeline
+            if flavor_ids:
+                db.session.query(models.Flavor).filter(
+                    models.Flavor.id.in_(flavor_ids)
+                ).update(
+                    {models.Flavor.version: models.Flavor.version + 1},
+                    synchronize_session=False,
+                )
+
+        return self._remove_in_batches(
+            "Deleted", "finished maintenance windows", ids_query, delete
         )
-        for window in windows:
-            LOG.info("Deleting finished maintenance window %s", window.id)
-            db.session.delete(window)
-        db.session.commit()
 
+    @app_context
+    def deliver_user_notifications(self):
+        return outbox.deliver()
+
+    @metrics.timed("notify_exists")
     @app_context
     def notify_exists(self):
-        reservations = (
-            db.session.query(models.Reservation)
-            .filter_by(status=models.Reservation.ACTIVE)
-            .all()
+        active = db.session.query(models.Reservation).filter_by(
+            status=models.Reservation.ACTIVE
         )
+        ended = active.filter(
+            models.Reservation.end < datetime.datetime.utcnow()
+        ).all()
+        for reservation in ended:
+            LOG.warning(
+                "Reservation %s has ended but still active, marking as "
+                "COMPLETE",
+                reservation,
+            )
+            reservation.status = models.Reservation.COMPLETE
+        db.session.commit()
 
         ctxt = context.RequestContext()
-        k_session = keystone.KeystoneSession().get_session()
-        nova = clients.get_novaclient(k_session)
+        reservations = active.options(
+            orm.joinedload(models.Reservation.flavor)
+        ).all()
+        in_use = self._find_in_use(reservations)
         for reservation in reservations:
-            if reservation.end < datetime.datetime.utcnow():
-                LOG.warning(
-                    "Reservation %s has ended but still "
-                    "active, marking as COMPLETE",
-                    reservation,
+            if (reservation.project_id, reservation.compute_flavor) in in_use:
+                LOG.debug("Sending in_use notification for %s", reservation)
+                self.notifier.info(
+                    ctxt,
+                    "warre.reservation.in_use",
+                    notifications.format_reservation(reservation),
                 )
-                reservation.status = models.Reservation.COMPLETE
-                db.session.add(reservation)
-                db.session.commit()
-                continue
-            if reservation.compute_flavor:
-                opts = {
-                    "all_tenants": True,
-                    "tenant_id": reservation.project_id,
-                    "flavor": reservation.compute_flavor,
-                }
-                try:
-                    instances = nova.servers.list(search_opts=opts)
-                except Exception as e:
-                    LOG.warning(
-                        "Failed to list instances for reservation %s, "
-                        "skipping in_use notification: %s",
-                        reservation.id,
-                        e,
-                    )
-                    instances = []
-                if instances:
-                    LOG.debug(
-                        "Sending in_use notification for %s", reservation
-                    )
-                    self.notifier.info(
-                        ctxt,
-                        "warre.reservation.in_use",
-                        notifications.format_reservation(reservation),
-                    )
             LOG.debug("Sending exists notification for %s", reservation)
             self.notifier.info(
                 ctxt,
                 "warre.reservation.exists",
                 notifications.format_reservation(reservation),
             )
+
+    def _find_in_use(self, reservations):
+        """Find the reservations that have instances running
+
+        Nova is asked once per project and compute flavor, with up to
+        nova_lookup_concurrency lookups at a time.
+
+        Returns a set of (project_id, compute_flavor) tuples with
+        instances, failed lookups are left out.
+        """
+        keys = {
+            (r.project_id, r.compute_flavor)
+            for r in reservations
+            if r.compute_flavor
+        }
+        if not keys:
+            return set()
+
+        k_session = keystone.get_session()
+        nova = clients.get_novaclient(k_session)
+
+        def lookup(key):
+            project_id, compute_flavor = key
+            opts = {
+                "all_tenants": True,
+                "tenant_id": project_id,
+                "flavor": compute_flavor,
+            }
+            try:
+                return bool(nova.servers.list(search_opts=opts))
+            except Exception as e:
+                LOG.warning(
+                    "Failed to list instances of flavor %s in project %s, "
+                    "skipping in_use notification: %s",
+                    compute_flavor,
+                    project_id,
+                    e,
+                )
+                return False
+
+        keys = sorted(keys)
+        with futures.ThreadPoolExecutor(
+            max_workers=CONF.worker.nova_lookup_concurrency
+        ) as executor:
+            found = executor.map(lookup, keys)
+            return {key for key, in_use in zip(keys, found) if in_use}
@@ -11,6 +11,8 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import datetime
+import functools
 import threading
 
 import cotyledon
@@ -23,6 +25,52 @@ CONF = cfg.CONF
 LOG = logging.getLogger(__name__)
 
 
+def _renew_task_lock(manager, name, duration, stop):
+    while not stop.wait(duration / 2):
+        if not manager.acquire_task_lock(name, duration):
+            LOG.warning("Lost the lock of %s while running it", name)
+
+
+def coordinated(f):
+    """Only run a periodic task in the worker holding its lock
+
+    The lock is held for an interval, so whichever worker gets to the
+    task first runs it and the others skip it until the next interval.
+    It is renewed while the task runs, so a run longer than the interval
+    is not started again by another worker, and released when it ends.
+    """
+
+    @functools.wraps(f)
+    def decorated(self, *args, **kwargs):
+        if not CONF.worker.periodic_task_coordination:
+            return f(self, *args, **kwargs)
+
+        name = f.__name__
+        interval = CONF.worker.periodic_task_interval
+        started = datetime.datetime.utcnow()
+        if not self.manager.acquire_task_lock(name, interval):
+            LOG.debug("Skipping %s, run by another worker", name)
+            return
+
+        stop = threading.Event()
+        renewer = threading.Thread(
+            target=_renew_task_lock,
+            args=(self.manager, name, interval, stop),
+            daemon=True,
+        )
+        renewer.start()
+        try:
+            return f(self, *args, **kwargs)
+        finally:
+            stop.set()
+            renewer.join()
+            self.manager.release_task_lock(
+                name, started + datetime.timedelta(seconds=interval)
+            )
+
+    return decorated
+
+
 class PeriodicTaskService(cotyledon.Service):
     def __init__(self, worker_id, conf, manager):
         super().__init__(worker_id)
@@ -34,16 +82,19 @@ class PeriodicTaskService(cotyledon.Service):
         self.manager = manager
 
     @periodics.periodic(CONF.worker.periodic_task_interval)
+    @coordinated
     def clean_old_reservations(self):
         LOG.info("Running periodic task clean_old_reservations")
         self.manager.clean_old_reservations()
 
     @periodics.periodic(CONF.worker.periodic_task_interval)
+    @coordinated
     def clean_old_maintenance_windows(self):
         LOG.info("Running periodic task clean_old_maintenance_windows")
         self.manager.clean_old_maintenance_windows()
 
     @periodics.periodic(CONF.worker.periodic_task_interval)
+    @coordinated
     def notify_exists(self):
         """Send reservation exists notifications
 
@@ -52,6 +103,11 @@ class PeriodicTaskService(cotyledon.Service):
         LOG.info("Sending reservation exists notifications")
         self.manager.notify_exists()
 
+    @periodics.periodic(CONF.worker.user_notification_interval)
+    def deliver_user_notifications(self):
+        # Not coordinated, workers claim the notifications they send
+        self.manager.deliver_user_notifications()
+
     def run(self):
         LOG.info("Starting periodic task thread...")
 
@@ -59,6 +115,7 @@ class PeriodicTaskService(cotyledon.Service):
             (self.clean_old_reservations, (), {}),
             (self.clean_old_maintenance_windows, (), {}),
             (self.notify_exists, (), {}),
+            (self.deliver_user_notifications, (), {}),
         ]
         self.worker = periodics.PeriodicWorker(callables)
         self.t = threading.Thread(target=self.worker.start, daemon=True)